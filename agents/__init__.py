@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 from .agent import Agent
 from .dummyAgent import DummyAgent
+from .celfAgent import CELFAgent
+from .aviAgent import AVIAgent
 
 __all__ = [
     "Agent",
     "DummyAgent",
+    "CELFAgent",
+    "AVIAgent",
 ]
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from agents.agent import Agent
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+from diffusion_models import SpreadEstimator
+
+
+# bias, influenced fraction, out degree of the influenced nodes, seed flag, out degree of the seed, remaining budget, affordable nodes
+N_FEATURES = 7
+
+
+def _features(tables : dict, n_influenced : np.array, active_degree : np.array, seed_degree : np.array, budget : np.array):
+    """Features of the post-decision states, i.e. the states right after choosing the seed and paying it.
+    The arguments are broadcast together.
+
+    Args:
+        tables (dict): static arrays built by AVIAgent
+        n_influenced (np.array): number of influenced nodes
+        active_degree (np.array): total out degree of the influenced nodes
+        seed_degree (np.array): out degree of the seed, -1 for no seed
+        budget (np.array): budget left after paying the seed
+
+    Returns:
+        np.array: features, with a last axis of size N_FEATURES
+    """
+    n_nodes = len(tables['sorted_cost'])
+    n_affordable = np.searchsorted(tables['sorted_cost'], budget, side='right')
+    columns = np.broadcast_arrays(
+        1.0,
+        n_influenced / n_nodes,
+        active_degree / tables['n_edges'],
+        seed_degree >= 0,
+        np.maximum(seed_degree, 0) / tables['mean_degree'],
+        budget / tables['initial_budget'],
+        n_affordable / n_nodes
+    )
+    return np.stack(columns, axis=-1).astype(np.float64)
+
+
+def _options(tables : dict, budget : np.array, n_influenced : np.array, active_degree : np.array, rng : object = None):
+    """Candidate actions of a batch of states: no seed (first column), the nodes with the largest out degree per
+    unit cost, and one node drawn in each of the evenly spaced cost strata of the affordable ones.
+    The influenced candidates are not masked.
+
+    Args:
+        tables (dict): static arrays built by AVIAgent
+        budget (np.array): remaining budget of each state
+        n_influenced (np.array): number of influenced nodes of each state
+        active_degree (np.array): total out degree of the influenced nodes of each state
+        rng (object, optional): numpy generator of the strata draws. Defaults to the global numpy state.
+
+    Returns:
+        np.array: candidate nodes, -1 for no seed, shape (n_states, n_options)
+        np.array: cost of the candidates
+        np.array: affordable candidates
+        np.array: features of the post-decision states, shape (n_states, n_options, N_FEATURES)
+    """
+    rng = np.random if rng is None else rng
+    n_states = len(budget)
+    n_strata = tables['n_strata']
+    # affordable prefix of the nodes sorted by cost
+    n_affordable = np.searchsorted(tables['sorted_cost'], budget, side='right')
+    # one node drawn in each cost stratum
+    strata = (np.arange(n_strata) + rng.random_sample((n_states, n_strata))) / n_strata
+    positions = np.minimum((n_affordable[:, None] * strata).astype(np.int64), len(tables['sorted_cost']) - 1)
+    nodes = np.concatenate([
+        np.full((n_states, 1), -1, dtype=np.int64),
+        np.broadcast_to(tables['top'], (n_states, len(tables['top']))),
+        tables['cost_order'][positions]
+    ], axis=1)
+    seed = nodes >= 0
+    cost = np.where(seed, tables['cost'][nodes], 0.0)
+    valid = cost <= budget[:, None]
+    valid[:, 0] = True
+    features = _features(
+        tables,
+        n_influenced[:, None],
+        active_degree[:, None],
+        np.where(seed, tables['out_degree'][nodes], -1.0),
+        budget[:, None] - cost
+    )
+    return nodes, cost, valid, features
+
+
+def _q_values(weights : np.array, cost : np.array, valid : np.array, features : np.array):
+    """Value of each candidate action: its reward (minus its cost, the influence is rewarded at the next step)
+    plus the value of the post-decision state
+
+    Args:
+        weights (np.array): weights of the value function at the time of the states
+        cost (np.array): cost of the candidates
+        valid (np.array): candidates which can be chosen
+        features (np.array): features of the post-decision states
+
+    Returns:
+        np.array: values, -inf for the invalid candidates
+    """
+    return np.where(valid, features @ weights - cost, -np.inf)
+
+
+def _sample_transitions(task : tuple, model : object):
+    """Simulate a chunk of episodes in lockstep with an epsilon greedy policy on the value function, recording
+    the post-decision state of each step and the candidate actions of the next state
+
+    Args:
+        task (tuple): (seed state, n_episodes, weights, epsilon, tables)
+        model (object): influence model
+
+    Returns:
+        dict: 'features' (T, n_episodes, N_FEATURES) of the chosen post-decision states, 'next_features',
+            'next_cost' and 'next_valid' of the candidates of the following states, 'increment' of the reward
+            of the influence between two steps, and the 'returns' of the episodes
+    """
+    seed_state, n_episodes, weights, epsilon, tables = task
+    # the task draws from its own generator, the numpy state of the process is left untouched
+    rng = np.random.RandomState(seed_state)
+    model.diffusion_rng = rng
+    time_horizon = weights.shape[0]
+    rows = np.arange(n_episodes)
+    batch = model.new_batch(n_episodes)
+    state = batch['state']
+    budget = np.full(n_episodes, tables['initial_budget'], dtype=np.float64)
+    times = np.zeros(n_episodes, dtype=np.int64)
+    old_n_influenced = np.zeros(n_episodes, dtype=np.int64)
+    returns = np.zeros(n_episodes, dtype=np.float64)
+    features, next_features, next_cost, next_valid, increment = [], [], [], [], []
+    for step in range(time_horizon):
+        n_influenced = state.sum(axis=1)
+        active_degree = state @ tables['out_degree']
+        nodes, cost, valid, options = _options(tables, budget, n_influenced, active_degree, rng)
+        valid[:, 1:] &= ~state[rows[:, None], nodes[:, 1:]]
+        gain = tables['l'] * (n_influenced - old_n_influenced)
+        if step > 0:
+            next_features.append(options)
+            next_cost.append(cost)
+            next_valid.append(valid)
+            increment.append(gain)
+        # greedy choice, or a uniform choice among the valid candidates
+        choice = np.argmax(_q_values(weights[step], cost, valid, options), axis=1)
+        explore = rng.random_sample(n_episodes) < epsilon
+        random_choice = np.argmax(np.where(valid, rng.random_sample(valid.shape), -1.0), axis=1)
+        choice = np.where(explore, random_choice, choice)
+        features.append(options[rows, choice])
+        seeds = np.zeros_like(state)
+        chosen = nodes[rows, choice]
+        seeds[rows[chosen >= 0], chosen[chosen >= 0]] = True
+        returns += gain - cost[rows, choice]
+        old_n_influenced = n_influenced
+        model.apply_influence_batch(batch, seeds, times)
+        budget = budget - cost[rows, choice]
+        times += 1
+    return {
+        'features': np.stack(features),
+        'next_features': np.stack(next_features) if next_features else np.zeros((0, n_episodes, 1, N_FEATURES)),
+        'next_cost': np.stack(next_cost) if next_cost else np.zeros((0, n_episodes, 1)),
+        'next_valid': np.stack(next_valid) if next_valid else np.zeros((0, n_episodes, 1), dtype=bool),
+        'increment': np.stack(increment) if increment else np.zeros((0, n_episodes)),
+        'returns': returns
+    }
+
+
+class AVIAgent(Agent):
+
+    def __init__(self, env : DynamicSocialNetwork, settings : dict, n_options : int = 16, batch_size : int = 256,
+                 epsilon : float = 0.2, ridge : float = 1e-3, memory : int = 4096, n_workers : int = 0,
+                 chunk_size : int = 64, seed : int = None):
+        """Base function for instantiating the approximate value iteration agent.
+        The value of the post-decision states (after choosing the seed, before the diffusion) is linear in
+        N_FEATURES features of the state, with one weight vector per time step. learn() simulates batches of
+        episodes in lockstep, and fits the weights backward in time on Bellman targets computed over all
+        the sampled successor states at once. At each step the agent picks the best of n_options candidates.
+
+        Args:
+            env (DynamicSocialNetwork): environment in which the agent acts
+            settings (dict): dictionary with settings parameters
+            n_options (int, optional): number of candidate nodes per state. Defaults to 16.
+            batch_size (int, optional): number of episodes simulated between two fits. Defaults to 256.
+            epsilon (float, optional): probability of a random candidate while simulating. Defaults to 0.2.
+            ridge (float, optional): ridge regularization of the fit. Defaults to 1e-3.
+            memory (int, optional): number of the last simulated episodes used in the fit. Defaults to 4096.
+            n_workers (int, optional): number of processes simulating the episodes, see SpreadEstimator. Defaults to 0.
+            chunk_size (int, optional): number of episodes simulated by a worker task. Defaults to 64.
+            seed (int, optional): root seed of the simulations. Defaults to settings['seed'].
+        """
+        super(AVIAgent, self).__init__(env, settings)
+        self.name = 'AVI'
+        # set pointer to env
+        self.env = env
+        self.batch_size = batch_size
+        self.epsilon = epsilon
+        self.ridge = ridge
+        self.memory = memory
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+        self.seed_sequence = np.random.SeedSequence(settings.get('seed', 0) if seed is None else seed)
+        graph = env.social_net.graph
+        out_degree = graph.out_degree().astype(np.float64)
+        cost = graph.cost.astype(np.float64)
+        cost_order = np.argsort(cost, kind='stable')
+        n_top = min(n_options // 2, graph.n_nodes)
+        # static arrays of the candidates and features, sent to the workers
+        self.tables = {
+            'cost': cost,
+            'out_degree': out_degree,
+            'cost_order': cost_order,
+            'sorted_cost': cost[cost_order],
+            'top': np.argsort(-out_degree / np.maximum(cost, 1e-12), kind='stable')[:n_top],
+            'n_strata': n_options - n_top,
+            'n_edges': max(graph.n_edges, 1),
+            'mean_degree': max(graph.n_edges / max(graph.n_nodes, 1), 1e-12),
+            'initial_budget': max(env.initial_budget, 1e-12),
+            'l': env.l
+        }
+        self.weights = np.zeros((env.time_horizon, N_FEATURES), dtype=np.float64)
+        self.samples = []
+        # mean return of the simulated episodes of each batch
+        self.history = []
+
+    def get_action(self, state : np.array):
+        """Choose the candidate node maximizing its reward plus the value of the post-decision state
+
+        Args:
+            state (np.array): graph nodes set of the influenced nodes and remaining budget
+
+        Returns:
+            list: chosen node, empty if no seed is worth its cost
+        """
+        influenced = self.env.social_net.active_nodes()
+        budget = np.array([self.env.budget], dtype=np.float64)
+        step = min(self.env.current_time, self.env.time_horizon - 1)
+        nodes, cost, valid, options = _options(
+            self.tables,
+            budget,
+            np.array([len(influenced)]),
+            np.array([self.tables['out_degree'][influenced].sum()])
+        )
+        valid[0, 1:] &= ~np.isin(nodes[0, 1:], influenced)
+        choice = int(np.argmax(_q_values(self.weights[step], cost, valid, options)[0]))
+        if nodes[0, choice] < 0:
+            return []
+        return [int(nodes[0, choice])]
+
+    def _fit(self):
+        """Function to fit the weights backward in time, by ridge regression on the Bellman targets of the
+        stored transitions: the reward of the influence up to the next step plus the best candidate value
+        """
+        samples = {
+            name: np.concatenate([sample[name] for sample in self.samples], axis=1)
+            for name in ['features', 'next_features', 'next_cost', 'next_valid', 'increment']
+        }
+        time_horizon = self.weights.shape[0]
+        regularization = self.ridge * np.eye(N_FEATURES)
+        regularization[0, 0] = 0
+        weights = np.zeros_like(self.weights)
+        # no reward follows the last step
+        for step in range(time_horizon - 2, -1, -1):
+            q_values = _q_values(weights[step + 1], samples['next_cost'][step], samples['next_valid'][step], samples['next_features'][step])
+            targets = samples['increment'][step] + q_values.max(axis=1)
+            features = samples['features'][step]
+            weights[step] = np.linalg.solve(
+                features.T @ features / len(targets) + regularization,
+                features.T @ targets / len(targets)
+            )
+        self.weights = weights
+
+    def learn(self, epochs : int = 1000):
+        """Function to learn the value function, simulating epochs episodes in batches of batch_size episodes
+        and fitting the weights after each batch. The first batch follows a uniform random policy.
+
+        Args:
+            epochs (int, optional): number of episodes simulated during the learning process. Defaults to 1000.
+        """
+        with SpreadEstimator(self.env.social_net, n_workers=self.n_workers, chunk_size=self.chunk_size) as estimator:
+            for start in range(0, epochs, self.batch_size):
+                n_episodes = min(self.batch_size, epochs - start)
+                epsilon = 1.0 if not self.samples else self.epsilon
+                sizes = [min(self.chunk_size, n_episodes - i) for i in range(0, n_episodes, self.chunk_size)]
+                tasks = [
+                    (child.generate_state(4), size, self.weights, epsilon, self.tables)
+                    for child, size in zip(self.seed_sequence.spawn(len(sizes)), sizes)
+                ]
+                results = estimator.map(_sample_transitions, tasks)
+                self.samples.extend(results)
+                # keep the last memory episodes
+                while sum(sample['returns'].shape[0] for sample in self.samples[1:]) >= self.memory:
+                    self.samples.pop(0)
+                self.history.append(float(np.mean(np.concatenate([result['returns'] for result in results]))))
+                self._fit()
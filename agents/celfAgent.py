@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+import heapq
+import numpy as np
+from agents.agent import Agent
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+from diffusion_models import RISIndex, SpreadEstimator
+
+
+class RISOracle(object):
+
+    def __init__(self, env : DynamicSocialNetwork, **kwargs):
+        """Spread oracle answering from a reverse reachable sets index (ICM and LTM only)
+
+        Args:
+            env (DynamicSocialNetwork): environment in which the agent acts
+            kwargs: parameters of RISIndex
+        """
+        self.index = RISIndex(env.social_net, **kwargs)
+
+    def update_state(self, state : set):
+        """Function to condition the oracle on the influenced nodes
+
+        Args:
+            state (set): graph nodes set of the influenced nodes
+        """
+        self.index.update_state(state)
+
+    def spread(self, nodes : list):
+        """Estimated number of influenced nodes when seeding the given nodes from the current state
+
+        Args:
+            nodes (list): seed nodes
+
+        Returns:
+            float: expected spread
+        """
+        return self.index.coverage(nodes)
+
+    def close(self):
+        """Stop the sampling workers of the index
+        """
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class MonteCarloOracle(object):
+
+    def __init__(self, env : DynamicSocialNetwork, n_simulations : int = 200, **kwargs):
+        """Spread oracle answering with Monte Carlo simulations over the remaining time horizon
+
+        Args:
+            env (DynamicSocialNetwork): environment in which the agent acts
+            n_simulations (int, optional): number of simulations per query. Defaults to 200.
+            kwargs: parameters of SpreadEstimator
+        """
+        self.env = env
+        self.n_simulations = n_simulations
+        self.estimator = SpreadEstimator(env.social_net, **kwargs)
+        self.initial_batch = None
+
+    def update_state(self, state : set):
+        """Function to condition the oracle on the influenced nodes
+
+        Args:
+            state (set): graph nodes set of the influenced nodes
+        """
+        self.initial_batch = self.env.social_net.current_batch()
+
+    def spread(self, nodes : list):
+        """Estimated number of influenced nodes when seeding the given nodes from the current state
+
+        Args:
+            nodes (list): seed nodes
+
+        Returns:
+            float: expected spread
+        """
+        return self.estimator.estimate(
+            nodes,
+            n_steps=max(self.env.time_horizon - self.env.current_time, 1),
+            n_simulations=self.n_simulations,
+            initial_batch=self.initial_batch,
+            current_time=self.env.current_time
+        )['mean']
+
+    def close(self):
+        """Stop the workers and release the shared memory of the estimator
+        """
+        self.estimator.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CELFAgent(Agent):
+
+    def __init__(self, env : DynamicSocialNetwork, settings : dict, oracle : object = None, seeds_per_step : int = 1,
+                 n_workers : int = None):
+        """Base function for instantiating the budgeted CELF++ agent.
+        The agent keeps a priority queue of upper bounds of the gain per unit cost of each node, and re-evaluates
+        them lazily with the spread oracle. The queue is carried across the steps: the influenced nodes only decrease
+        the gains, so the old values stay valid upper bounds.
+
+        Args:
+            env (DynamicSocialNetwork): environment in which the agent acts
+            settings (dict): dictionary with settings parameters
+            oracle (object, optional): spread oracle. Defaults to RISOracle for ICM and LTM, MonteCarloOracle otherwise.
+            seeds_per_step (int, optional): maximum number of nodes chosen at each step. Defaults to 1.
+            n_workers (int, optional): number of processes of the default oracle, 0 to run it in this process. Defaults to the number of cpus.
+        """
+        super(CELFAgent, self).__init__(env, settings)
+        self.name = 'CELF++'
+        # set pointer to env
+        self.env = env
+        self.seeds_per_step = seeds_per_step
+        self.cost = env.social_net.graph.cost
+        # the oracle given by the caller is closed by the caller
+        self.own_oracle = oracle is None
+        if oracle is None:
+            if settings['influence_model']['type'] in ['ICM', 'LTM']:
+                oracle = RISOracle(env, k=self.max_seeds(settings['budget']), n_workers=n_workers)
+            else:
+                oracle = MonteCarloOracle(env, n_workers=n_workers)
+        self.oracle = oracle
+        # oracle calls done, and the ones plain greedy would have done
+        self.oracle_calls = 0
+        self.greedy_calls = 0
+        self.heap = None
+        self.epoch = 0
+
+    def max_seeds(self, budget : float):
+        """Maximum number of seeds chosen in an episode: seeds_per_step at each step, as long as the budget affords them
+
+        Args:
+            budget (float): initial budget
+
+        Returns:
+            int: number of seeds
+        """
+        affordable = int(np.searchsorted(np.cumsum(np.sort(self.cost)), budget, side='right'))
+        return max(1, min(self.seeds_per_step * self.env.time_horizon, affordable))
+
+    def _gain(self, nodes : list, base : float):
+        """Marginal gain of the given seed nodes with respect to the spread base
+
+        Args:
+            nodes (list): seed nodes
+            base (float): spread of the already chosen seeds
+
+        Returns:
+            float: marginal gain
+        """
+        self.oracle_calls += 1
+        return self.oracle.spread(nodes) - base
+
+    def _priority(self, gain : float, node : int):
+        """Priority of a node in the queue: the opposite of its gain per unit cost
+
+        Args:
+            gain (float): marginal gain of the node
+            node (int): node index
+
+        Returns:
+            float: priority
+        """
+        return -gain / max(self.cost[node], 1e-12)
+
+    def _init_heap(self, influenced : set):
+        """Function to build the queue evaluating every uninfluenced node once
+
+        Args:
+            influenced (set): graph nodes set of the influenced nodes
+        """
+        base = self.oracle.spread([])
+        self.heap = []
+        for node in range(len(self.cost)):
+            if node in influenced:
+                continue
+            gain = self._gain([node], base)
+            # entry: (-gain per cost, node, gain, prev_best, gain with prev_best, epoch, number of seeds)
+            self.heap.append((self._priority(gain, node), node, gain, None, gain, self.epoch, 0))
+        heapq.heapify(self.heap)
+
+    def get_action(self, state : np.array):
+        """Choose the nodes with the largest marginal gain per unit cost among the affordable ones, with CELF++ lazy evaluations
+
+        Args:
+            state (np.array): graph nodes set of the influenced nodes and remaining budget
+
+        Returns:
+            list: chosen nodes
+        """
+        nodes_state, budget = state
+        self.epoch += 1
+        self.oracle.update_state(nodes_state)
+        if self.heap is None:
+            self._init_heap(nodes_state)
+        seeds = []
+        base = self.oracle.spread(seeds)
+        # best node evaluated in the current iteration, and last node chosen
+        cur_best, cur_best_gain, last_seed = None, -np.inf, None
+        while self.heap and len(seeds) < self.seeds_per_step:
+            _, node, gain, prev_best, gain_prev, epoch, n_seeds = heapq.heappop(self.heap)
+            # discard the influenced nodes and the ones the budget can no longer afford
+            if node in nodes_state or self.cost[node] > budget:
+                continue
+            if epoch == self.epoch and n_seeds == len(seeds):
+                # up to date: plain greedy would have evaluated all the candidates to find it
+                self.greedy_calls += len(self.heap) + 1
+                # choose it if it is worth something
+                if gain <= 0:
+                    heapq.heappush(self.heap, (0.0, node, gain, prev_best, gain_prev, epoch, n_seeds))
+                    break
+                seeds.append(node)
+                budget -= self.cost[node]
+                base += gain
+                last_seed, cur_best, cur_best_gain = node, None, -np.inf
+                continue
+            if epoch == self.epoch and n_seeds == len(seeds) - 1 and prev_best == last_seed:
+                # the gain with respect to the last seed was already computed
+                gain = gain_prev
+            else:
+                gain = self._gain(seeds + [node], base)
+                prev_best = cur_best
+                gain_prev = self._gain(seeds + [node, cur_best], base + cur_best_gain) if cur_best is not None else gain
+            if gain > cur_best_gain:
+                cur_best, cur_best_gain = node, gain
+            heapq.heappush(self.heap, (self._priority(gain, node), node, gain, prev_best, gain_prev, self.epoch, len(seeds)))
+        # seeds are never evaluated again
+        return seeds
+
+    def reset(self):
+        """Function to drop the queue, to be called when the environment starts a new episode
+        """
+        self.heap = None
+
+    def saved_oracle_calls(self):
+        """Number of oracle calls saved with respect to plain greedy, which evaluates every candidate for every choice
+
+        Returns:
+            int: saved calls
+        """
+        return self.greedy_calls - self.oracle_calls
+
+    def close(self):
+        """Function to stop the workers of the oracle built by the agent
+        """
+        if self.own_oracle:
+            self.oracle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def learn(self, epochs : int = 1000):
+        """The CELF++ agent does not need training
+
+        Args:
+            epochs (int, optional): number of tests done by the agent during the learning process. Defaults to 1000.
+        """
+        pass
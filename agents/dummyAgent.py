@@ -27,15 +27,16 @@ class DummyAgent(Agent):
             list: random influenced node selected
         """
         nodes_state, budget = state
+        # with the random streams the draw depends only on the episode and the step
+        rng = None
+        if self.env.social_net.streams is not None:
+            rng = self.env.social_net.streams.generator('agent', self.env.episode, self.env.current_time)
         # pick at random one node not already influenced
-        set_influenced_nodes = set(nodes_state)
-        set_not_influenced_nodes = set(list(self.env.social_net.g.nodes())) - set_influenced_nodes
-        # pick random node:
-        if len(set_not_influenced_nodes) == 0:
+        random_node = self.env.candidates.sample(rng=rng)
+        if random_node is None:
             return []
-        random_node = np.random.choice(list(set_not_influenced_nodes))
         # return node if budget is enough
-        if budget < self.env.social_net.g.nodes[random_node]['cost']:
+        if budget < self.env.social_net.graph.cost[random_node]:
             return []
         else:
             return [random_node]
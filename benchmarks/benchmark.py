@@ -0,0 +1,277 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import csv
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+# the packages of the repository root, when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+
+# columns of the raw timing table, one row per trial
+COLUMNS = [
+    'seed', 'graph', 'n_nodes', 'n_edges', 'diffusion', 'engine',
+    'time_construction', 'time_reset', 'time_step', 'time_episode',
+    'memory_construction', 'memory_episode'
+]
+# columns compared against the baseline
+TIME_COLUMNS = ['time_construction', 'time_reset', 'time_step', 'time_episode']
+# columns identifying an instance
+KEY_COLUMNS = ['graph', 'n_nodes', 'diffusion', 'engine']
+GRAPHS = ['barabasi_albert', 'erdos_renyi', 'watt_strogatz', 'power', 'real_graph']
+SIZES = [100, 1000, 10000, 100000]
+DIFFUSIONS = ['ICM', 'LTM', 'CTM']
+
+
+def build_settings(graph : str, n_nodes : int, diffusion : str, engine : str, seed : int, real_graph : str = None, generator : str = 'networkx'):
+    """Settings of a benchmark instance, with average degree about 10 in every graph family
+
+    Args:
+        graph (str): graph family
+        n_nodes (int): number of nodes, ignored by real_graph
+        diffusion (str): influence model
+        engine (str): propagation engine
+        seed (int): seed value
+        real_graph (str, optional): edge list used by real_graph. Defaults to None.
+        generator (str, optional): generator of the synthetic graphs, networkx or native. Defaults to 'networkx'.
+
+    Raises:
+        ValueError: Graph name not know
+
+    Returns:
+        dict: dictionary with settings parameters
+    """
+    if graph == 'barabasi_albert':
+        graph_type = {'name': graph, 'n_nodes': n_nodes, 'stub': 5}
+    elif graph == 'erdos_renyi':
+        graph_type = {'name': graph, 'n_nodes': n_nodes, 'p': min(10 / n_nodes, 1.0)}
+    elif graph == 'watt_strogatz':
+        graph_type = {'name': graph, 'n_nodes': n_nodes, 'n_neigh': n_nodes / 10, 'edge_prob': 0.1}
+    elif graph == 'power':
+        graph_type = {'name': graph, 'n_nodes': n_nodes, 'stubs': 5, 'prob': 0.3}
+    elif graph == 'real_graph':
+        graph_type = {'name': graph, 'file_path': real_graph}
+    else:
+        raise ValueError('Graph name not know')
+    if graph != 'real_graph':
+        graph_type['generator'] = generator
+    if diffusion == 'ICM':
+        influence_model = {'type': 'ICM', 'max_influence_prob': 0.1}
+    elif diffusion == 'LTM':
+        influence_model = {'type': 'LTM', 'max_influence_power': 0.1}
+    else:
+        influence_model = {
+            'type': 'CTM',
+            'percentage': [0.1, 0.2, 0.35, 0.35],
+            'a': [5, 4, 3, 2],
+            'b': [1, 2, 3, 4],
+            'decays': [0.8, 0.6, 0.5, 0.1],
+            'lambda': [0.7, 0.5, 0.4, 0.1],
+            'resistance_noises': [0.05, 0.05, 0.05, 0.05]
+        }
+    influence_model['engine'] = engine
+    return {
+        'time_horizon': 10,
+        'budget': 1,
+        'lambda': 0.1,
+        'graph_type': graph_type,
+        'cost_type': {'cost_name': 'proportional', 'max_price': 1},
+        'influence_model': influence_model,
+        'seed': seed
+    }
+
+
+def run_episode(env : DynamicSocialNetwork, rng : np.random.RandomState):
+    """Run an episode seeding one random node per step
+
+    Args:
+        env (DynamicSocialNetwork): environment
+        rng (np.random.RandomState): random stream of the actions
+
+    Returns:
+        float: total time of reset
+        list: time of each step
+    """
+    start = time.perf_counter()
+    env.reset()
+    time_reset = time.perf_counter() - start
+    time_steps = []
+    done = False
+    while not done:
+        action = [int(rng.randint(env.social_net.graph.n_nodes))]
+        start = time.perf_counter()
+        _, _, done, _ = env.step(action)
+        time_steps.append(time.perf_counter() - start)
+    return time_reset, time_steps
+
+
+def run_trial(settings : dict, n_episodes : int):
+    """Time the construction of the environment and n_episodes episodes
+
+    Args:
+        settings (dict): dictionary with settings parameters
+        n_episodes (int): number of episodes
+
+    Returns:
+        dict: timings in seconds, averaged over the episodes, number of nodes and edges
+    """
+    np.random.seed(settings['seed'])
+    rng = np.random.RandomState(settings['seed'])
+    start = time.perf_counter()
+    env = DynamicSocialNetwork(settings)
+    time_construction = time.perf_counter() - start
+    times_reset, times_step, times_episode = [], [], []
+    for _ in range(n_episodes):
+        start = time.perf_counter()
+        time_reset, time_steps = run_episode(env, rng)
+        times_episode.append(time.perf_counter() - start)
+        times_reset.append(time_reset)
+        times_step.extend(time_steps)
+    return {
+        'n_nodes': env.social_net.graph.n_nodes,
+        'n_edges': env.social_net.graph.n_edges,
+        'time_construction': time_construction,
+        'time_reset': float(np.mean(times_reset)),
+        'time_step': float(np.mean(times_step)),
+        'time_episode': float(np.mean(times_episode))
+    }
+
+
+def measure_memory(settings : dict):
+    """Peak memory of the construction and of an episode. It is measured apart from the timings,
+    as tracing the allocations slows the code down.
+
+    Args:
+        settings (dict): dictionary with settings parameters
+
+    Returns:
+        dict: peak bytes allocated by the construction and by an episode
+    """
+    np.random.seed(settings['seed'])
+    tracemalloc.start()
+    env = DynamicSocialNetwork(settings)
+    memory_construction = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    run_episode(env, np.random.RandomState(settings['seed']))
+    memory_episode = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return {
+        'memory_construction': memory_construction,
+        'memory_episode': memory_episode
+    }
+
+
+def run(args : argparse.Namespace):
+    """Run the benchmark grid and write one row per trial
+
+    Args:
+        args (argparse.Namespace): command line arguments
+    """
+    new_file = not os.path.exists(args.output)
+    with open(args.output, 'a', newline='') as fp:
+        writer = csv.DictWriter(fp, fieldnames=COLUMNS)
+        if new_file:
+            writer.writeheader()
+        for graph in args.graphs:
+            if graph == 'real_graph' and args.real_graph is None:
+                print("skipping real_graph: no --real-graph file given")
+                continue
+            # the size of a real graph is given by its file
+            sizes = [0] if graph == 'real_graph' else args.sizes
+            for n_nodes in sizes:
+                for diffusion in args.diffusions:
+                    for seed in range(args.warmup + args.trials):
+                        settings = build_settings(graph, n_nodes, diffusion, args.engine, seed, args.real_graph, args.generator)
+                        timings = run_trial(settings, args.episodes)
+                        # warmup trials fill the caches and are not written
+                        if seed < args.warmup:
+                            continue
+                        row = {
+                            'seed': seed,
+                            'graph': graph,
+                            'diffusion': diffusion,
+                            'engine': args.engine
+                        }
+                        row.update(timings)
+                        row.update(measure_memory(settings) if args.memory else {'memory_construction': '', 'memory_episode': ''})
+                        writer.writerow(row)
+                        fp.flush()
+                        print(f"{graph} {row['n_nodes']} {diffusion} seed {seed}: step {row['time_step']:.6f} s, episode {row['time_episode']:.6f} s")
+
+
+def load_medians(file_path : str):
+    """Median of the time columns of a raw timing table for each instance
+
+    Args:
+        file_path (str): csv file
+
+    Returns:
+        dict: (graph, n_nodes, diffusion, engine) -> column -> median
+    """
+    values = {}
+    with open(file_path, 'r', newline='') as fp:
+        for row in csv.DictReader(fp):
+            key = tuple(row[column] for column in KEY_COLUMNS)
+            for column in TIME_COLUMNS:
+                values.setdefault(key, {}).setdefault(column, []).append(float(row[column]))
+    return {
+        key: {column: float(np.median(times)) for column, times in columns.items()}
+        for key, columns in values.items()
+    }
+
+
+def compare(current : str, baseline : str, threshold : float):
+    """Flag the instances whose median timings grew more than threshold with respect to the baseline
+
+    Args:
+        current (str): csv file of the current timings
+        baseline (str): csv file of the baseline timings
+        threshold (float): relative slowdown tolerated, e.g. 0.1 for 10%
+
+    Returns:
+        int: number of regressions
+    """
+    current_medians = load_medians(current)
+    baseline_medians = load_medians(baseline)
+    n_regressions = 0
+    for key in sorted(current_medians):
+        if key not in baseline_medians:
+            continue
+        for column in TIME_COLUMNS:
+            new, old = current_medians[key][column], baseline_medians[key][column]
+            ratio = new / old if old > 0 else 1.0
+            flag = 'REGRESSION' if ratio > 1 + threshold else 'ok'
+            n_regressions += flag == 'REGRESSION'
+            print(f"{flag:10} {' '.join(key)} {column}: {old:.6f} -> {new:.6f} s ({ratio:.2f}x)")
+    return n_regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time construction, reset, step and episodes of the environment")
+    parser.add_argument('--graphs', nargs='+', default=GRAPHS, choices=GRAPHS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--diffusions', nargs='+', default=DIFFUSIONS, choices=DIFFUSIONS)
+    parser.add_argument('--engine', default='vectorized', choices=['vectorized', 'scalar'])
+    parser.add_argument('--real-graph', default=None, help="edge list used by real_graph")
+    parser.add_argument('--generator', default='networkx', choices=['networkx', 'native'], help="generator of the synthetic graphs")
+    parser.add_argument('--trials', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--episodes', type=int, default=5)
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="skip the memory measures")
+    parser.add_argument('--output', default="./benchmarks/performance_raw.csv")
+    parser.add_argument('--compare', default=None, help="baseline csv: flag the regressions of --output against it")
+    parser.add_argument('--skip-run', action='store_true', help="compare the existing --output without running")
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    if not args.skip_run:
+        run(args)
+    if args.compare is not None:
+        n_regressions = compare(args.output, args.compare, args.threshold)
+        print(f"{n_regressions} regressions")
+        sys.exit(1 if n_regressions > 0 else 0)
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import sys
+import argparse
+import numpy as np
+# the packages of the repository root, when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+from diffusion_models import SpreadEstimator
+from benchmarks.benchmark import GRAPHS, DIFFUSIONS, build_settings
+
+
+def memory_line(report : dict):
+    """Format a memory report on one line
+
+    Args:
+        report (dict): report of CSRGraph.memory_report
+
+    Returns:
+        str: array name, dtype and bytes per edge of each array, then the total
+    """
+    arrays = [f"{name} {entry['dtype']} {entry['bytes_per_edge']:.2f}" for name, entry in report.items() if name != 'total']
+    return ", ".join(arrays) + f" | total {report['total']['bytes_per_edge']:.2f} bytes/edge"
+
+
+def validate(args : argparse.Namespace, diffusion : str):
+    """Compare the spread estimated on the full precision graph and on its compact storage.
+    Both models are built from the same seed and the estimators share their root seed, so the two estimates
+    of a seed set use the same random numbers and their difference is the effect of the quantization.
+
+    Args:
+        args (argparse.Namespace): command line arguments
+        diffusion (str): 'ICM', 'LTM' or 'CTM'
+
+    Returns:
+        np.array: relative error of each seed set
+    """
+    settings = build_settings(args.graph, args.n_nodes, diffusion, 'vectorized', args.seed, args.real_graph, args.generator)
+    np.random.seed(settings['seed'])
+    full = DynamicSocialNetwork(settings).social_net
+    settings['storage'] = {'edge_dtype': args.edge_dtype}
+    np.random.seed(settings['seed'])
+    compact = DynamicSocialNetwork(settings).social_net
+    print(f"{diffusion} full:    {memory_line(full.graph.memory_report())}")
+    print(f"{diffusion} compact: {memory_line(compact.graph.memory_report())}")
+    rng = np.random.RandomState(args.seed)
+    errors = []
+    with SpreadEstimator(full, n_workers=args.workers, seed=args.seed) as full_estimator, \
+         SpreadEstimator(compact, n_workers=args.workers, seed=args.seed) as compact_estimator:
+        for _ in range(args.seed_sets):
+            action = rng.choice(full.graph.n_nodes, args.seed_size, replace=False)
+            expected = full_estimator.estimate(action, args.steps, args.simulations)['mean']
+            estimated = compact_estimator.estimate(action, args.steps, args.simulations)['mean']
+            errors.append(abs(estimated - expected) / expected)
+            print(f"{diffusion} seeds {args.seed_size}: full {expected:.2f}, compact {estimated:.2f}, relative error {errors[-1]:.4f}")
+    errors = np.array(errors)
+    print(f"{diffusion} relative error: mean {errors.mean():.4f}, max {errors.max():.4f}")
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the effect of the compact storage on the spread estimates")
+    parser.add_argument('--graph', default='barabasi_albert', choices=GRAPHS)
+    parser.add_argument('--n-nodes', type=int, default=10000)
+    parser.add_argument('--diffusions', nargs='+', default=DIFFUSIONS, choices=DIFFUSIONS)
+    parser.add_argument('--real-graph', default=None, help="edge list used by real_graph")
+    parser.add_argument('--generator', default='networkx', choices=['networkx', 'native'], help="generator of the synthetic graphs")
+    parser.add_argument('--edge-dtype', default='uint8', choices=['uint8', 'uint16'])
+    parser.add_argument('--seed-sets', type=int, default=10)
+    parser.add_argument('--seed-size', type=int, default=10)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--simulations', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None, help="processes of the estimators, 0 to simulate in this process")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for diffusion in args.diffusions:
+        validate(args, diffusion)
@@ -1,47 +1,75 @@
 # -*- coding: utf-8 -*-
 import numpy as np
-import networkx as nx
-from .socialNetwork import SocialNetwork
+from .socialNetwork import CSRGraph, SocialNetwork, _read_only
 
 
 class CTModel(SocialNetwork):
-    def __init__(self, env : object, settings : dict):
-        """Base function for instantiating the Complex Threshold Model. 
+    def __init__(self, env : object, settings : dict, graph : CSRGraph = None, node_labels : np.array = None):
+        """Base function for instantiating the Complex Threshold Model.
         Derived from the linear threshold model, it considers the influence power and the influence resistance of the nodes, which can change
         along the simulation based on influence decay, influence noise, time form influence.
 
         Args:
             env (object): environment object
             settings (dict): dictionary with settings parameters
+            graph (CSRGraph, optional): compiled graph, with the node types, influences and resistances already set. Defaults to None.
+            node_labels (np.array, optional): original label of each node of graph. Defaults to None.
+
+        Raises:
+            ValueError: invalid engine
+            ValueError: converge is not defined for CTM
         """
         # save pointer to env
         self.env = env
-        self.resistance_noises = settings['influence_model']['resistance_noises']
-        self.decays = settings['influence_model']['decays']
+        # per-type parameter tables, indexed by the node type
+        self.resistance_noises = np.asarray(settings['influence_model']['resistance_noises'], dtype=np.float64)
+        self.decays = np.asarray(settings['influence_model']['decays'], dtype=np.float64)
+        # select the propagation engine: 'vectorized', 'incremental' or the per-edge 'scalar' reference
+        self.engine = settings['influence_model'].get('engine', 'vectorized')
+        if self.engine not in ['vectorized', 'incremental', 'scalar']:
+            raise ValueError("invalid engine")
+        # the active nodes try again at every step, so the diffusion within a step does not converge
+        if settings['influence_model'].get('converge', False):
+            raise ValueError("converge is not defined for CTM")
         # run super class constructor
-        super(CTModel, self).__init__(settings)
+        super(CTModel, self).__init__(settings, graph, node_labels)
         # initialize attributes
-        nx.set_node_attributes(self.g, values = 0, name = 'type')
-        nx.set_node_attributes(self.g, values = 0.0, name = 'influence')
-        nx.set_node_attributes(self.g, values = 0.0, name = 'resistance')
-        nx.set_node_attributes(self.g, values = 0, name = 'influence_time')
-        # set characteristics
+        self.influence_time = np.zeros(self.graph.n_nodes, dtype=np.int64)
+        # incremental engine: active nodes which can still influence their successors
+        self.live = np.empty(0, dtype=np.int64)
+        # per-type tables used to characterize the nodes added by mutate()
+        self.influence_settings = settings['influence_model']
+        # nodes with a type: the ones beyond the sum of the percentages keep null influence and resistance
+        n_nodes = self.graph.n_nodes
+        n_typed = sum(int(n_nodes * perc) for perc in settings['influence_model']['percentage'])
+        self.typed = np.arange(n_nodes) < n_typed
+        if graph is None:
+            self._set_characteristics(settings)
+        # compact storage: quantized edge arrays and single precision node arrays
+        if settings.get('storage') is not None:
+            self.graph.compact(**settings['storage'])
+
+    def _set_characteristics(self, settings : dict):
+        """Function to set the type, influence and resistance of the nodes of a generated graph
+
+        Args:
+            settings (dict): dictionary with settings parameters
+        """
+        n_nodes = self.graph.n_nodes
         counter = 0
-        n_nodes = len(self.g.nodes)
-        node_lst = list(self.g.nodes)
+        n_successors = self.graph.out_degree() / self.reference_degree()
         # for each type of node:
         for i, perc in enumerate(settings['influence_model']['percentage']):
-            # for each node in the given subset
-            for node in node_lst[counter:(counter + int(n_nodes * perc))]:
-                # compute successors
-                n_successors = len(list(self.g.successors(node))) / max(self.g.degree())[1]
-                # set data
-                self.g.nodes[node]['type'] = i
-                self.g.nodes[node]['influence'] = 1 - np.exp(- settings['influence_model']['lambda'][i] * n_successors)
-                self.g.nodes[node]['resistance'] = np.random.beta(
-                    a=settings['influence_model']['a'][i],
-                    b=settings['influence_model']['b'][i]
-                )
+            # the given subset of nodes
+            subset = slice(counter, counter + int(n_nodes * perc))
+            # set data
+            self.graph.type[subset] = i
+            self.graph.influence[subset] = 1 - np.exp(- settings['influence_model']['lambda'][i] * n_successors[subset])
+            self.graph.resistance[subset] = self.construction_rng.beta(
+                a=settings['influence_model']['a'][i],
+                b=settings['influence_model']['b'][i],
+                size=int(n_nodes * perc)
+            )
             # update the set of nodes to consider
             counter = counter + int(n_nodes * perc)
 
@@ -52,28 +80,261 @@ class CTModel(SocialNetwork):
         Args:
             action (list): graph node set of the chosen node from the agent with get_action() function
         """
+        if self.engine == 'incremental':
+            self.apply_influence_incremental(action)
+        elif self.engine == 'vectorized':
+            self.apply_influence_vectorized(action)
+        else:
+            self.apply_influence_scalar(action)
+
+    def apply_influence_scalar(self, action : list):
+        """Reference implementation of apply_influence, drawing one resistance noise per edge
+
+        Args:
+            action (list): graph node set of the chosen node from the agent with get_action() function
+        """
+        status = self.graph.status
         # for all the nodes influenced
-        for node in self.state.union(action):
+        for node in sorted(self.state.union(action)):
+            if self.counters is not None:
+                n_successors = self.graph.indptr[node + 1] - self.graph.indptr[node]
+                self.count_work(1, n_successors, n_successors)
             # for all the successors
-            for i in self.g.successors(node):
+            for edge in range(self.graph.indptr[node], self.graph.indptr[node + 1]):
+                i = self.graph.indices[edge]
                 # get the resistance of the node
-                resistance_noise = self.resistance_noises[self.g.nodes[node]['type']]
+                resistance_noise = self.resistance_noises[self.graph.type[node]]
                 # update the influnce considering the decay
-                decay = self.decays[self.g.nodes[node]['type']]
-                time_from_influence = self.env.current_time - self.g.nodes[node]['influence_time']
-                influence = self.g.nodes[node]['influence'] * (1 - decay * self.g.nodes[node]['status'] ) ** time_from_influence 
+                decay = self.decays[self.graph.type[node]]
+                time_from_influence = self.env.current_time - self.influence_time[node]
+                influence = self.graph.influence[node] * (1 - decay * status[node]) ** time_from_influence
                 # compute the resistance
-                resistance = self.g.nodes[node]['resistance'] + np.random.uniform(
-                    low = -resistance_noise,
-                    high = resistance_noise,
-                )
+                if self.streams is None:
+                    resistance = self.graph.resistance[node] + self.diffusion_rng.uniform(
+                        low = -resistance_noise,
+                        high = resistance_noise,
+                    )
+                else:
+                    resistance = self.graph.resistance[node] + self.draw_uniform(np.array([edge]), -resistance_noise, resistance_noise)[0]
                 # if the influence grater than resistance update the state
                 if influence >= resistance:
-                    self.g.nodes[i]['status'] = 1
-                    self.state.add(i) 
-           
-            # add node activated in the list of active nodes   
+                    status[i] = 1
+                    self.state.add(int(i))
+
+            # add node activated in the list of active nodes
             self.state.add(node)
-            if self.g.nodes[node]['influence_time'] == 0:
-                self.g.nodes[node]['status']
-                self.g.nodes[node]['influence_time'] = self.env.current_time
+            if self.influence_time[node] == 0:
+                self.influence_time[node] = self.env.current_time
+
+    def apply_influence_vectorized(self, action : list):
+        """Vectorized implementation of apply_influence.
+        The decayed influences of all the active nodes are computed at once, using the node status at the
+        beginning of the step, and compared with the noisy resistances drawn for all their out edges.
+
+        Args:
+            action (list): graph node set of the chosen node from the agent with get_action() function
+        """
+        status = self.graph.status
+        active = np.unique(np.fromiter(self.state.union(action), dtype=np.int64))
+        # decayed influence and resistance noise of each active node, from the type tables
+        node_type = self.graph.type[active]
+        time_from_influence = self.env.current_time - self.influence_time[active]
+        influence = self.graph.influence[active] * (1 - self.decays[node_type] * status[active]) ** time_from_influence
+        resistance_noise = self.resistance_noises[node_type]
+        # compare them with a noisy resistance for each out edge
+        n_successors = self.graph.indptr[active + 1] - self.graph.indptr[active]
+        resistance_noise = np.repeat(resistance_noise, n_successors)
+        edges = self.graph.out_edges(active)
+        resistance = np.repeat(self.graph.resistance[active], n_successors) + self.draw_uniform(
+            edges,
+            low = -resistance_noise,
+            high = resistance_noise,
+        )
+        influenced = np.repeat(influence, n_successors) >= resistance
+        if self.counters is not None:
+            self.count_work(len(active), len(resistance), len(resistance))
+        targets = self.graph.indices[edges[influenced]]
+        # update the state
+        status[targets] = 1
+        self.state.update(targets.tolist())
+        self.state.update(active.tolist())
+        # set the influence time of the nodes activated for the first time
+        first_time = active[self.influence_time[active] == 0]
+        self.influence_time[first_time] = self.env.current_time
+
+    def apply_influence_incremental(self, action : list):
+        """Incremental implementation of apply_influence. Once its influence time is set, the decayed influence of a
+        node never grows, so a node whose influence is below its resistance minus the noise can never influence
+        again and is dropped from the live nodes. The noisy resistances are drawn only for the out edges of the live nodes towards nodes
+        with status 0, as the others cannot change. The activations follow the distribution of
+        apply_influence_vectorized(), with fewer random draws.
+
+        Args:
+            action (list): graph node set of the chosen node from the agent with get_action() function
+        """
+        status = self.graph.status
+        active = np.union1d(self.live, np.asarray(action, dtype=np.int64))
+        # decayed influence of each live node, from the type tables
+        node_type = self.graph.type[active]
+        time_from_influence = self.env.current_time - self.influence_time[active]
+        influence = self.graph.influence[active] * (1 - self.decays[node_type] * status[active]) ** time_from_influence
+        resistance_noise = self.resistance_noises[node_type]
+        # out edges towards the nodes not influenced yet
+        edges = self.graph.out_edges(active)
+        sources = np.repeat(np.arange(len(active)), self.graph.indptr[active + 1] - self.graph.indptr[active])
+        open_edges = status[self.graph.indices[edges]] == 0
+        edges = edges[open_edges]
+        sources = sources[open_edges]
+        resistance = self.graph.resistance[active[sources]] + self.draw_uniform(
+            edges,
+            low = -resistance_noise[sources],
+            high = resistance_noise[sources],
+        )
+        if self.counters is not None:
+            self.count_work(len(active), len(edges), len(edges))
+        targets = np.unique(self.graph.indices[edges[influence[sources] >= resistance]]).astype(np.int64)
+        # update the state
+        status[targets] = 1
+        self.state.update(targets.tolist())
+        self.state.update(active.tolist())
+        # set the influence time of the nodes activated for the first time
+        first_time = self.influence_time[active] == 0
+        self.influence_time[active[first_time]] = self.env.current_time
+        # drop the nodes which can no longer influence. Before the influence time is set the decay counts
+        # the whole time elapsed, so only the nodes whose influence time was already set are dropped
+        alive = (influence >= self.graph.resistance[active] - resistance_noise) | first_time
+        self.live = np.union1d(active[alive], targets)
+
+    def set_state(self, state : np.array):
+        """Function to replace the influenced nodes of the current episode, setting their attribute status to 1
+
+        Args:
+            state (np.array): graph nodes set of the influenced nodes
+        """
+        super(CTModel, self).set_state(state)
+        self.live = np.sort(self.active_nodes())
+
+    def reset(self):
+        """Function to clear the data of the current episode, touching only the influenced nodes
+        """
+        self.influence_time[self.active_nodes()] = 0
+        self.live = np.empty(0, dtype=np.int64)
+        super(CTModel, self).reset()
+
+    def snapshot(self):
+        """Function to save the data of the current episode
+
+        Returns:
+            dict: snapshot of SocialNetwork, plus the 'influence_time' of the influenced nodes
+        """
+        snapshot = super(CTModel, self).snapshot()
+        snapshot['influence_time'] = _read_only(self.influence_time[snapshot['state']])
+        return snapshot
+
+    def restore(self, snapshot : dict):
+        """Function to restore the data of an episode saved by snapshot(), touching only the influenced nodes
+
+        Args:
+            snapshot (dict): data returned by snapshot()
+        """
+        super(CTModel, self).restore(snapshot)
+        self.influence_time[snapshot['state']] = snapshot['influence_time']
+        self.live = snapshot['state'].copy()
+
+    def _grow(self, n_added : int):
+        """Function to extend the influence times to the nodes appended by mutate(), and to draw the type and the resistance
+        of the new nodes, with the type probabilities proportional to the percentages
+
+        Args:
+            n_added (int): number of new nodes
+        """
+        self.influence_time = np.concatenate([self.influence_time, np.zeros(n_added, dtype=np.int64)])
+        self.typed = np.concatenate([self.typed, np.ones(n_added, dtype=bool)])
+        percentage = np.asarray(self.influence_settings['percentage'], dtype=np.float64)
+        node_type = self.construction_rng.choice(len(percentage), size=n_added, p=percentage / percentage.sum())
+        self.graph.type[-n_added:] = node_type
+        self.graph.resistance[-n_added:] = self.construction_rng.beta(
+            a=np.asarray(self.influence_settings['a'])[node_type],
+            b=np.asarray(self.influence_settings['b'])[node_type]
+        )
+
+    def _out_degree_changed(self, nodes : np.array):
+        """Function to compute again the influence of the typed nodes whose successors changed.
+        The influenced ones go back to the live nodes, as their influence may have grown.
+
+        Args:
+            nodes (np.array): node indexes
+        """
+        nodes = nodes[self.typed[nodes]]
+        if not self.graph.influence.flags.writeable:
+            self.graph.influence = self.graph.influence.copy()
+        n_successors = self.graph.out_degree()[nodes] / self.max_degree
+        lambdas = np.asarray(self.influence_settings['lambda'], dtype=np.float64)[self.graph.type[nodes]]
+        self.graph.influence[nodes] = 1 - np.exp(- lambdas * n_successors)
+        influenced = [node for node in nodes.tolist() if node in self.state]
+        if influenced:
+            self.live = np.union1d(self.live, influenced)
+
+    def new_batch(self, n_episodes : int):
+        """Function to allocate the per-episode arrays used by apply_influence_batch()
+
+        Args:
+            n_episodes (int): number of episodes
+
+        Returns:
+            dict: arrays of shape (n_episodes, n_nodes): 'state', 'status' and 'influence_time'
+        """
+        batch = super(CTModel, self).new_batch(n_episodes)
+        batch['status'] = np.zeros((n_episodes, self.graph.n_nodes), dtype=np.uint8)
+        batch['influence_time'] = np.zeros((n_episodes, self.graph.n_nodes), dtype=np.int64)
+        return batch
+
+    def current_batch(self):
+        """Function to copy the state of the current episode into a batch of one episode
+
+        Returns:
+            dict: per-episode arrays, as returned by new_batch(1)
+        """
+        batch = super(CTModel, self).current_batch()
+        batch['status'][0] = self.graph.status
+        batch['influence_time'][0] = self.influence_time
+        return batch
+
+    def apply_influence_batch(self, batch : dict, action : np.array, current_time : np.array):
+        """Vectorized apply_influence over a batch of episodes sharing this graph
+
+        Args:
+            batch (dict): per-episode arrays created by new_batch(), updated in place
+            action (np.array): boolean matrix of shape (n_episodes, n_nodes) of the chosen nodes
+            current_time (np.array): current time of each episode
+        """
+        state = batch['state']
+        status = batch['status']
+        influence_time = batch['influence_time']
+        episodes, active = np.nonzero(state | action)
+        # decayed influence and resistance noise of each active node, from the type tables
+        node_type = self.graph.type[active]
+        time_from_influence = current_time[episodes] - influence_time[episodes, active]
+        influence = self.graph.influence[active] * (1 - self.decays[node_type] * status[episodes, active]) ** time_from_influence
+        resistance_noise = self.resistance_noises[node_type]
+        # compare them with a noisy resistance for each out edge
+        n_successors = self.graph.indptr[active + 1] - self.graph.indptr[active]
+        resistance_noise = np.repeat(resistance_noise, n_successors)
+        edges = self.graph.out_edges(active)
+        resistance = np.repeat(self.graph.resistance[active], n_successors) + self.draw_uniform(
+            edges,
+            low = -resistance_noise,
+            high = resistance_noise,
+            episodes = np.repeat(self.batch_episodes(batch)[episodes], n_successors),
+            steps = np.repeat(current_time[episodes], n_successors)
+        )
+        influenced = np.repeat(influence, n_successors) >= resistance
+        targets = self.graph.indices[edges[influenced]]
+        target_episodes = np.repeat(episodes, n_successors)[influenced]
+        # update the state
+        status[target_episodes, targets] = 1
+        state[target_episodes, targets] = True
+        state[episodes, active] = True
+        # set the influence time of the nodes activated for the first time
+        first_time = influence_time[episodes, active] == 0
+        influence_time[episodes[first_time], active[first_time]] = current_time[episodes[first_time]]
@@ -1,32 +1,60 @@
 # -*- coding: utf-8 -*-
 import numpy as np
-import networkx as nx
-from .socialNetwork import SocialNetwork
+from .socialNetwork import CSRGraph, SocialNetwork, _read_only
 
 
 class ICModel(SocialNetwork):
-    def __init__(self, settings : dict):
+
+    EDGE_ARRAY = 'probability_to_influence'
+
+    def __init__(self, settings : dict, graph : CSRGraph = None, node_labels : np.array = None):
         """Base function for instantiating the Independent Cascade Model.
         Each arc in the graph is associated with a probability of influencing.
 
         Args:
             settings (dict): dictionary with settings parameters
+            graph (CSRGraph, optional): compiled graph, with the probabilities to influence already set. Defaults to None.
+            node_labels (np.array, optional): original label of each node of graph. Defaults to None.
+
+        Raises:
+            ValueError: invalid engine
+            ValueError: converge needs the incremental engine
         """
         # run super class constructor
-        super(ICModel, self).__init__(settings)
+        super(ICModel, self).__init__(settings, graph, node_labels)
 
+        # select the propagation engine: 'vectorized', 'incremental' or the per-edge 'scalar' reference
+        self.engine = settings['influence_model'].get('engine', 'vectorized')
+        if self.engine not in ['vectorized', 'incremental', 'scalar']:
+            raise ValueError("invalid engine")
+        # run the diffusion until no node can be influenced within each step
+        self.converge = settings['influence_model'].get('converge', False)
+        if self.converge and self.engine != 'incremental':
+            raise ValueError("converge needs the incremental engine")
         # for each link define the probability to influence
-        for node in self.g.nodes:
-            for i in self.g.successors(node):
-                self.g[node][i]['probability_to_influence'] = np.random.uniform(
-                    low = 0,
-                    high = settings['influence_model']['max_influence_prob']
-                )
+        self.max_influence_prob = settings['influence_model'].get('max_influence_prob')
+        if graph is None:
+            self.graph.probability_to_influence = self.new_edge_values(self.graph.n_edges)['probability_to_influence']
         # set the realized flag
-        nx.set_node_attributes(
-            self.g, values = False,
-            name = "realized"
-        )
+        self.realized = np.zeros(self.graph.n_nodes, dtype=bool)
+        # active nodes which have not tried to influence their successors yet
+        self.frontier = np.empty(0, dtype=np.int64)
+        # pre-sampled worlds the coins are read from, drawn at each step if None
+        self.worlds = None
+        self.world = 0
+        # compact storage: quantized edge arrays and single precision node arrays
+        if settings.get('storage') is not None:
+            self.graph.compact(**settings['storage'])
+
+    def set_world(self, worlds : object, world : int = 0):
+        """Function to read the coins of the next episodes from a world instead of drawing them
+
+        Args:
+            worlds (object): LiveEdgeWorlds of this model, None to draw the coins again
+            world (int, optional): world index. Defaults to 0.
+        """
+        self.worlds = worlds
+        self.world = world
 
     def apply_influence(self, action : list):
         """Simulation of the node influence process starting with the selection of a set of nodes from the agent.
@@ -35,20 +63,195 @@ class ICModel(SocialNetwork):
         Args:
             action (list): graph node set of the chosen node from the agent with get_action() function
         """
-        for node in self.state.union(action):
+        if self.engine == 'incremental':
+            self.apply_influence_incremental(action)
+        elif self.engine == 'vectorized' or self.worlds is not None:
+            self.apply_influence_vectorized(action)
+        else:
+            self.apply_influence_scalar(action)
+
+    def apply_influence_scalar(self, action : list):
+        """Reference implementation of apply_influence, drawing one binomial per edge
+
+        Args:
+            action (list): graph node set of the chosen node from the agent with get_action() function
+        """
+        indptr = self.graph.indptr
+        indices = self.graph.indices
+        probability = self.graph.probability_to_influence
+        for node in sorted(self.state.union(action)):
             # if the node has not been influenced
-            if not self.g.nodes[node]['realized']:
+            if not self.realized[node]:
+                if self.counters is not None:
+                    self.count_work(1, indptr[node + 1] - indptr[node], indptr[node + 1] - indptr[node])
                 # try to influence each successor
-                for i in self.g.successors(node):
-                    influence_flag = np.random.binomial(
-                        n=1,
-                        p=self.g[node][i]['probability_to_influence']
-                    )
+                for edge in range(indptr[node], indptr[node + 1]):
+                    if self.streams is None:
+                        influence_flag = self.diffusion_rng.binomial(
+                            n=1,
+                            p=probability[edge]
+                        )
+                    else:
+                        influence_flag = int(self.draw_uniform(np.array([edge]))[0] < probability[edge])
                     if influence_flag == 1:
-                        self.g.nodes[i]['status'] = 1
-                        self.state.add(i)
-                # add node activated in the list of active nodes   
+                        self.graph.status[indices[edge]] = 1
+                        self.state.add(int(indices[edge]))
+                # add node activated in the list of active nodes
                 self.state.add(node)
                 # mark node as realized
-                self.g.nodes[node]['status'] = 1
-                self.g.nodes[node]['realized'] = True
+                self.graph.status[node] = 1
+                self.realized[node] = True
+
+    def apply_influence_vectorized(self, action : list):
+        """Vectorized implementation of apply_influence.
+        Only the out edges of the active nodes not realized yet are visited, and their coins are drawn at once,
+        or read from the world set by set_world().
+
+        Args:
+            action (list): graph node set of the chosen node from the agent with get_action() function
+        """
+        # nodes trying to influence their successors in this step
+        frontier = np.union1d(self.frontier, np.asarray(action, dtype=np.int64))
+        frontier = frontier[~self.realized[frontier]]
+        # draw the coins of all the out edges of the frontier
+        edges = self.graph.out_edges(frontier)
+        if self.worlds is None:
+            influence_flag = self.draw_uniform(edges) < self.graph.probability_to_influence[edges]
+        else:
+            influence_flag = self.worlds.live(edges, self.world)
+        if self.counters is not None:
+            self.count_work(len(frontier), len(edges), len(edges) if self.worlds is None else 0)
+        targets = self.graph.indices[edges[influence_flag]]
+        # mark frontier as realized and activate the influenced successors
+        self.graph.status[frontier] = 1
+        self.realized[frontier] = True
+        self.graph.status[targets] = 1
+        self.state.update(frontier.tolist())
+        self.state.update(targets.tolist())
+        # the newly influenced nodes will try to influence in the next step
+        self.frontier = np.unique(targets[~self.realized[targets]]).astype(np.int64)
+
+    def apply_influence_incremental(self, action : list):
+        """Incremental implementation of apply_influence. The vectorized step already visits only the frontier,
+        the nodes activated in the last step; with converge the steps are repeated until the frontier is empty.
+
+        Args:
+            action (list): graph node set of the chosen node from the agent with get_action() function
+        """
+        self.apply_influence_vectorized(action)
+        while self.converge and len(self.frontier) > 0:
+            self.apply_influence_vectorized([])
+
+    def reset(self):
+        """Function to clear the data of the current episode, touching only the influenced nodes
+        """
+        self.realized[self.active_nodes()] = False
+        self.frontier = np.empty(0, dtype=np.int64)
+        super(ICModel, self).reset()
+
+    def set_state(self, state : np.array):
+        """Function to replace the influenced nodes of the current episode. They are not realized,
+        so they will try to influence their successors in the next step.
+
+        Args:
+            state (np.array): graph nodes set of the influenced nodes
+        """
+        super(ICModel, self).set_state(state)
+        self.frontier = np.sort(self.active_nodes())
+
+    def snapshot(self):
+        """Function to save the data of the current episode
+
+        Returns:
+            dict: snapshot of SocialNetwork, plus 'realized' and 'frontier' nodes
+        """
+        snapshot = super(ICModel, self).snapshot()
+        snapshot['realized'] = _read_only(snapshot['state'][self.realized[snapshot['state']]])
+        snapshot['frontier'] = _read_only(self.frontier.copy())
+        return snapshot
+
+    def restore(self, snapshot : dict):
+        """Function to restore the data of an episode saved by snapshot(), touching only the influenced nodes
+
+        Args:
+            snapshot (dict): data returned by snapshot()
+        """
+        super(ICModel, self).restore(snapshot)
+        self.realized[snapshot['realized']] = True
+        self.frontier = snapshot['frontier']
+
+    def new_edge_values(self, n_added : int):
+        """Function to draw the probability to influence of new edges
+
+        Args:
+            n_added (int): number of new edges
+
+        Returns:
+            dict: 'probability_to_influence' of the new edges
+        """
+        return {
+            'probability_to_influence': self.construction_rng.uniform(
+                low = 0,
+                high = self.max_influence_prob,
+                size = n_added
+            )
+        }
+
+    def _grow(self, n_added : int):
+        """Function to extend the realized flags to the nodes appended by mutate()
+
+        Args:
+            n_added (int): number of new nodes
+        """
+        self.realized = np.concatenate([self.realized, np.zeros(n_added, dtype=bool)])
+
+    def new_batch(self, n_episodes : int):
+        """Function to allocate the per-episode arrays used by apply_influence_batch()
+
+        Args:
+            n_episodes (int): number of episodes
+
+        Returns:
+            dict: arrays of shape (n_episodes, n_nodes): 'state' and the 'realized' flags
+        """
+        batch = super(ICModel, self).new_batch(n_episodes)
+        batch['realized'] = np.zeros((n_episodes, self.graph.n_nodes), dtype=bool)
+        return batch
+
+    def current_batch(self):
+        """Function to copy the state of the current episode into a batch of one episode
+
+        Returns:
+            dict: per-episode arrays, as returned by new_batch(1)
+        """
+        batch = super(ICModel, self).current_batch()
+        batch['realized'][0] = self.realized
+        return batch
+
+    def apply_influence_batch(self, batch : dict, action : np.array, current_time : np.array):
+        """Vectorized apply_influence over a batch of episodes sharing this graph.
+        When worlds are set by set_world(), the coins of each episode are read from the world batch['world'].
+
+        Args:
+            batch (dict): per-episode arrays created by new_batch(), updated in place
+            action (np.array): boolean matrix of shape (n_episodes, n_nodes) of the chosen nodes
+            current_time (np.array): current time of each episode
+        """
+        state = batch['state']
+        realized = batch['realized']
+        state |= action
+        # active nodes not realized yet, in each episode
+        episodes, frontier = np.nonzero(state & ~realized)
+        realized[episodes, frontier] = True
+        # draw the coins of all their out edges
+        edges = self.graph.out_edges(frontier)
+        episodes = np.repeat(episodes, self.graph.indptr[frontier + 1] - self.graph.indptr[frontier])
+        if self.worlds is None:
+            influence_flag = self.draw_uniform(
+                edges,
+                episodes=self.batch_episodes(batch)[episodes],
+                steps=current_time[episodes]
+            ) < self.graph.probability_to_influence[edges]
+        else:
+            influence_flag = self.worlds.live_pairs(edges, self.batch_worlds(batch)[episodes])
+        state[episodes[influence_flag], self.graph.indices[edges[influence_flag]]] = True
@@ -1,34 +1,113 @@
 # -*- coding: utf-8 -*-
 import numpy as np
-import networkx as nx
-from .socialNetwork import SocialNetwork
+from .socialNetwork import CSRGraph, SocialNetwork
 
 
 class LTModel(SocialNetwork):
-    def __init__(self, settings : dict):
+
+    EDGE_ARRAY = 'influence_power'
+
+    def __init__(self, settings : dict, graph : CSRGraph = None, node_labels : np.array = None):
         """Base function for instantiating the Linear Threshold Model.
 
         Args:
             settings (dict): dictionary with settings parameters
+            graph (CSRGraph, optional): compiled graph, with the resistances and influence powers already set. Defaults to None.
+            node_labels (np.array, optional): original label of each node of graph. Defaults to None.
+
+        Raises:
+            ValueError: invalid engine
+            ValueError: converge needs the incremental engine
         """
         # run super class constructor
-        super(LTModel, self).__init__(settings)
-        
-        # initialize attribute
-        nx.set_node_attributes(
-            self.g, values = 0,
-            name = "influence_resistence"
-        )
-        for node in self.g.nodes:
-            # set influence_resistence:
-            self.g.nodes[node]['influence_resistence'] = np.random.uniform(0,1)
-            # get the number of successors 
-            for i in self.g.successors(node):
-                self.g[node][i]['influence_power'] = np.random.uniform(
-                    low = 0,
-                    high = settings['influence_model']['max_influence_power']
-                )
-    
+        super(LTModel, self).__init__(settings, graph, node_labels)
+
+        # select the propagation engine: 'vectorized', 'incremental' or the per-edge 'scalar' reference
+        self.engine = settings['influence_model'].get('engine', 'vectorized')
+        if self.engine not in ['vectorized', 'incremental', 'scalar']:
+            raise ValueError("invalid engine")
+        # run the diffusion until no node can be influenced within each step
+        self.converge = settings['influence_model'].get('converge', False)
+        if self.converge and self.engine != 'incremental':
+            raise ValueError("converge needs the incremental engine")
+        # incremental engine: influence received by each node from the accumulated active nodes,
+        # and active nodes whose influence is not accumulated yet
+        self.incoming = np.zeros(self.graph.n_nodes, dtype=np.float64)
+        self.accumulated = np.zeros(self.graph.n_nodes, dtype=bool)
+        self.frontier = np.empty(0, dtype=np.int64)
+        # nodes whose incoming influence was changed by mutate(), compared with their resistance in the next step
+        self.changed = np.empty(0, dtype=np.int64)
+        self.max_influence_power = settings['influence_model'].get('max_influence_power')
+        if graph is None:
+            # set influence resistance of each node
+            self.graph.resistance = self.sample_thresholds(1, self.construction_rng)[0]
+            # set influence power of each link
+            self.graph.influence_power = self.new_edge_values(self.graph.n_edges)['influence_power']
+        # pre-sampled worlds the thresholds are read from, the node resistances are used if None
+        self.worlds = None
+        self.world = 0
+        # compact storage: quantized edge arrays and single precision node arrays
+        if settings.get('storage') is not None:
+            self.graph.compact(**settings['storage'])
+
+    def set_world(self, worlds : object, world : int = 0):
+        """Function to use the thresholds of a world instead of the node resistances in the next episodes
+
+        Args:
+            worlds (object): LiveEdgeWorlds of this model, None to use the node resistances again
+            world (int, optional): world index. Defaults to 0.
+        """
+        self.worlds = worlds
+        self.world = world
+
+    def sample_thresholds(self, n_worlds : int, rng : object = None):
+        """Sample independent influence resistances for each node, one row per world
+
+        Args:
+            n_worlds (int): number of worlds
+            rng (object, optional): numpy generator. Defaults to the global numpy state.
+
+        Returns:
+            np.array: thresholds matrix of shape (n_worlds, n_nodes)
+        """
+        rng = np.random if rng is None else rng
+        return rng.uniform(0, 1, size=(n_worlds, self.graph.n_nodes))
+
+    def propagate(self, active : np.array, thresholds : np.array):
+        """One step of the linear threshold dynamics evaluated in K worlds at once.
+        The incoming influence of every node is the product between the active-node indicator and the
+        weighted adjacency matrix, and a node becomes active when it exceeds the node threshold of the world.
+
+        Args:
+            active (np.array): boolean matrix of shape (K, n_nodes) of the active nodes in each world
+            thresholds (np.array): matrix of shape (K, n_nodes) of the node thresholds in each world
+
+        Returns:
+            np.array: boolean matrix of shape (K, n_nodes) of the active nodes after the step
+        """
+        incoming = self.graph.weighted_in_sum(active, self.graph.influence_power)
+        return active | (incoming > thresholds)
+
+    def estimate_spread(self, action : list, n_worlds : int = 100, n_steps : int = 1):
+        """Estimate the expected number of influenced nodes after n_steps, starting from the current
+        state plus the action, over n_worlds sampled threshold draws
+
+        Args:
+            action (list): graph node set of the chosen nodes
+            n_worlds (int, optional): number of sampled worlds. Defaults to 100.
+            n_steps (int, optional): number of diffusion steps. Defaults to 1.
+
+        Returns:
+            float: mean number of influenced nodes
+        """
+        active = np.zeros((n_worlds, self.graph.n_nodes), dtype=bool)
+        active[:, self.graph.status == 1] = True
+        active[:, np.asarray(action, dtype=np.int64)] = True
+        thresholds = self.sample_thresholds(n_worlds)
+        for _ in range(n_steps):
+            active = self.propagate(active, thresholds)
+        return float(active.sum(axis=1).mean())
+
     def apply_influence(self, action : list):
         """Simulation of the node influence process starting from choosing a set of nodes from the agent.
         A node becomes active if a weighted sum of the active successor nodes is greater than its resistance.
@@ -36,20 +115,183 @@ class LTModel(SocialNetwork):
         Args:
             action (list): graph node set of the chosen nodes from the agent with get_action() function
         """
-        active_nodes = self.state.union(action)
+        if self.engine == 'incremental':
+            self.apply_influence_incremental(action)
+        elif self.engine == 'vectorized' or self.worlds is not None:
+            self.apply_influence_vectorized(action)
+        else:
+            self.apply_influence_scalar(action)
+
+    def apply_influence_scalar(self, action : list):
+        """Reference implementation of apply_influence, accumulating the influence edge by edge
+
+        Args:
+            action (list): graph node set of the chosen nodes from the agent with get_action() function
+        """
+        indptr = self.graph.indptr
+        indices = self.graph.indices
+        influence_power = self.graph.influence_power
+        active_nodes = sorted(self.state.union(action))
         dict_res = {}
         for node in active_nodes:
             # Add node in the active list
-            self.g.nodes[node]['status'] = 1
+            self.graph.status[node] = 1
             self.state.add(node)
+            if self.counters is not None:
+                self.count_work(1, indptr[node + 1] - indptr[node], 0)
             # compute the total influence on each node
-            for j in self.g.successors(node):
+            for edge in range(indptr[node], indptr[node + 1]):
+                j = int(indices[edge])
                 if j in dict_res:
-                    dict_res[j] += self.g[node][j]["influence_power"]
+                    dict_res[j] += influence_power[edge]
                 else:
-                    dict_res[j] = self.g[node][j]["influence_power"]
+                    dict_res[j] = influence_power[edge]
         # Update the status of the node if the influence_resistence is exceed
         for key, ele in dict_res.items():
-            if ele > self.g.nodes[j]["influence_resistence"]:
-                self.g.nodes[key]['status'] = 1
+            if ele > self.graph.resistance[key]:
+                self.graph.status[key] = 1
                 self.state.add(key)
+
+    def apply_influence_vectorized(self, action : list):
+        """Vectorized implementation of apply_influence, running propagate() on the single world
+        defined by the node resistances, or by the thresholds of the world set by set_world()
+
+        Args:
+            action (list): graph node set of the chosen nodes from the agent with get_action() function
+        """
+        action = np.asarray(action, dtype=np.int64)
+        # Add the chosen nodes in the active list
+        self.graph.status[action] = 1
+        active = self.graph.status == 1
+        if self.counters is not None:
+            nodes = np.flatnonzero(active)
+            self.count_work(len(nodes), (self.graph.indptr[nodes + 1] - self.graph.indptr[nodes]).sum(), 0)
+        # Update the status of the nodes whose influence_resistence is exceeded
+        thresholds = self.graph.resistance if self.worlds is None else self.worlds.thresholds[self.world]
+        new_active = self.propagate(active, thresholds)
+        new_nodes = np.flatnonzero(new_active & ~active)
+        self.graph.status[new_nodes] = 1
+        self.state.update(action.tolist())
+        self.state.update(new_nodes.tolist())
+
+    def apply_influence_incremental(self, action : list):
+        """Incremental implementation of apply_influence. Only the active nodes whose influence has not been
+        accumulated yet (the seeds and the nodes activated in the last step) add the influence power of their
+        out edges to the incoming influence of their successors, and only these successors are compared with
+        their resistance. The activations are the ones of apply_influence_vectorized(), up to the rounding of the sums.
+
+        Args:
+            action (list): graph node set of the chosen nodes from the agent with get_action() function
+        """
+        action = np.asarray(action, dtype=np.int64)
+        self.graph.status[action] = 1
+        self.state.update(action.tolist())
+        thresholds = self.graph.resistance if self.worlds is None else self.worlds.thresholds[self.world]
+        new_nodes = np.union1d(self.frontier, action)
+        new_nodes = new_nodes[~self.accumulated[new_nodes]]
+        changed, self.changed = self.changed, np.empty(0, dtype=np.int64)
+        while len(new_nodes) > 0 or len(changed) > 0:
+            self.accumulated[new_nodes] = True
+            # add the influence of the new active nodes
+            edges = self.graph.out_edges(new_nodes)
+            if self.counters is not None:
+                self.count_work(len(new_nodes), len(edges), 0)
+            targets, positions = np.unique(self.graph.indices[edges], return_inverse=True)
+            self.incoming[targets] += np.bincount(positions, weights=self.graph.influence_power[edges], minlength=len(targets))
+            targets = np.union1d(targets, changed)
+            changed = changed[:0]
+            # only the nodes whose incoming influence changed can exceed their resistance
+            new_nodes = targets[(self.incoming[targets] > thresholds[targets]) & (self.graph.status[targets] == 0)].astype(np.int64)
+            self.graph.status[new_nodes] = 1
+            self.state.update(new_nodes.tolist())
+            if not self.converge:
+                break
+        # the nodes activated in this step influence from the next one
+        self.frontier = new_nodes if not self.converge else np.empty(0, dtype=np.int64)
+
+    def reset(self):
+        """Function to clear the data of the current episode, touching only the influenced nodes
+        and, with the incremental engine, their successors
+        """
+        nodes = self.active_nodes()
+        if self.engine == 'incremental':
+            nodes = nodes[self.accumulated[nodes]]
+            self.incoming[self.graph.indices[self.graph.out_edges(nodes)]] = 0
+            self.accumulated[nodes] = False
+        self.frontier = np.empty(0, dtype=np.int64)
+        self.changed = np.empty(0, dtype=np.int64)
+        super(LTModel, self).reset()
+
+    def set_state(self, state : np.array):
+        """Function to replace the influenced nodes of the current episode. Their influence is accumulated
+        in the next step of the incremental engine.
+
+        Args:
+            state (np.array): graph nodes set of the influenced nodes
+        """
+        super(LTModel, self).set_state(state)
+        self.frontier = np.sort(self.active_nodes())
+
+    def restore(self, snapshot : dict):
+        """Function to restore the data of an episode saved by snapshot(), touching only the influenced nodes
+
+        Args:
+            snapshot (dict): data returned by snapshot()
+        """
+        super(LTModel, self).restore(snapshot)
+        self.frontier = snapshot['status']
+
+    def new_edge_values(self, n_added : int):
+        """Function to draw the influence power of new edges
+
+        Args:
+            n_added (int): number of new edges
+
+        Returns:
+            dict: 'influence_power' of the new edges
+        """
+        return {
+            'influence_power': self.construction_rng.uniform(
+                low = 0,
+                high = self.max_influence_power,
+                size = n_added
+            )
+        }
+
+    def _grow(self, n_added : int):
+        """Function to extend the incremental engine arrays to the nodes appended by mutate(),
+        and to draw the resistance of the new nodes
+
+        Args:
+            n_added (int): number of new nodes
+        """
+        self.incoming = np.concatenate([self.incoming, np.zeros(n_added, dtype=np.float64)])
+        self.accumulated = np.concatenate([self.accumulated, np.zeros(n_added, dtype=bool)])
+        self.graph.resistance[-n_added:] = self.construction_rng.uniform(0, 1, size=n_added)
+
+    def _edge_weights_changed(self, sources : np.array, targets : np.array, delta : np.array):
+        """Function to correct the incoming influence accumulated from the sources of the changed edges
+
+        Args:
+            sources (np.array): source of each edge
+            targets (np.array): target of each edge
+            delta (np.array): change of the influence power of each edge
+        """
+        accumulated = self.accumulated[sources]
+        if accumulated.any():
+            np.add.at(self.incoming, targets[accumulated], delta[accumulated])
+            self.changed = np.union1d(self.changed, targets[accumulated])
+
+    def apply_influence_batch(self, batch : dict, action : np.array, current_time : np.array):
+        """Vectorized apply_influence over a batch of episodes sharing this graph and its resistances.
+        When worlds are set by set_world(), each episode uses the thresholds of the world batch['world'].
+
+        Args:
+            batch (dict): per-episode arrays created by new_batch(), updated in place
+            action (np.array): boolean matrix of shape (n_episodes, n_nodes) of the chosen nodes
+            current_time (np.array): current time of each episode
+        """
+        state = batch['state']
+        state |= action
+        thresholds = self.graph.resistance if self.worlds is None else self.worlds.thresholds[self.batch_worlds(batch)]
+        state[:] = self.propagate(state, thresholds)
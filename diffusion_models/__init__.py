@@ -2,11 +2,28 @@
 from .ICModel import ICModel
 from .CTModel import CTModel
 from .LTModel import LTModel
-from .socialNetwork import SocialNetwork
+from .socialNetwork import SocialNetwork, CSRGraph
+from .spreadEstimator import SpreadEstimator
+from .risIndex import RISIndex
+from .liveEdgeWorlds import LiveEdgeWorlds
+from .instanceCache import compile_instance, load_instance
+from .randomStreams import RandomStreams
+from .compactStorage import QuantizedArray, compact_graph
+from .graphPlotter import GraphPlotter
 
 __all__ = [
     "ICModel",
     "CTModel",
     "LTModel",
-    "SocialNetwork"
+    "SocialNetwork",
+    "CSRGraph",
+    "SpreadEstimator",
+    "RISIndex",
+    "LiveEdgeWorlds",
+    "compile_instance",
+    "load_instance",
+    "RandomStreams",
+    "QuantizedArray",
+    "compact_graph",
+    "GraphPlotter"
 ]
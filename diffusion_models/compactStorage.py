@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+# dtypes of the quantized edge arrays
+EDGE_DTYPES = {'uint8': np.uint8, 'uint16': np.uint16}
+
+
+class QuantizedArray():
+
+    def __init__(self, codes : np.array, scale : float):
+        """Base function for instantiating an edge array stored as unsigned integer codes: the value of
+        edge e is codes[e] * scale. Indexing returns the dequantized float64 values and assigning quantizes
+        them, so the array can replace a float64 edge array in the diffusion models.
+
+        Args:
+            codes (np.array): uint8 or uint16 codes
+            scale (float): dequantization scale
+        """
+        self.codes = codes
+        self.scale = float(scale)
+
+    @classmethod
+    def from_values(cls, values : np.array, dtype : str = 'uint8', scale : float = None):
+        """Quantize an array of non-negative values, rounding to the nearest code
+
+        Args:
+            values (np.array): values to quantize
+            dtype (str, optional): 'uint8' or 'uint16'. Defaults to 'uint8'.
+            scale (float, optional): dequantization scale. Defaults to the largest value over the largest code.
+
+        Raises:
+            ValueError: invalid dtype
+
+        Returns:
+            QuantizedArray: quantized array
+        """
+        if dtype not in EDGE_DTYPES:
+            raise ValueError("invalid dtype")
+        values = np.asarray(values, dtype=np.float64)
+        max_code = np.iinfo(EDGE_DTYPES[dtype]).max
+        if scale is None:
+            max_value = float(values.max()) if len(values) > 0 else 0.0
+            scale = max_value / max_code if max_value > 0 else 1.0 / max_code
+        array = cls(np.zeros(len(values), dtype=EDGE_DTYPES[dtype]), scale)
+        array[:] = values
+        return array
+
+    def quantize(self, values : np.array):
+        """Codes of the given values, clipped to the range of the dtype
+
+        Args:
+            values (np.array): values
+
+        Returns:
+            np.array: codes
+        """
+        max_code = np.iinfo(self.codes.dtype).max
+        return np.clip(np.rint(np.asarray(values, dtype=np.float64) / self.scale), 0, max_code).astype(self.codes.dtype)
+
+    def __getitem__(self, item):
+        return self.codes[item] * self.scale
+
+    def __setitem__(self, item, values):
+        self.codes[item] = self.quantize(values)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __array__(self, dtype = None, copy = None):
+        values = self.codes * self.scale
+        return values if dtype is None else values.astype(dtype)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def dtype(self):
+        return np.dtype(np.float64)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    @property
+    def flags(self):
+        return self.codes.flags
+
+    def copy(self):
+        """Copy of the array
+
+        Returns:
+            QuantizedArray: array with a copy of the codes
+        """
+        return QuantizedArray(self.codes.copy(), self.scale)
+
+    def tolist(self):
+        """Dequantized values as a list
+
+        Returns:
+            list: values
+        """
+        return np.asarray(self).tolist()
+
+    def max_error(self):
+        """Largest difference between a value and its dequantized value, within the range of the codes
+
+        Returns:
+            float: half the scale
+        """
+        return self.scale / 2
+
+
+def compact_graph(graph : object, edge_dtype : str = 'uint8', scale : float = None, scales : dict = None):
+    """Convert the arrays of a CSRGraph to the compact storage: int32 CSR offsets when the edges fit, uint8 or
+    uint16 edge arrays, float32 node costs, influences and resistances and int8 node types.
+    The arrays already compact are left as they are.
+
+    Args:
+        graph (object): CSRGraph, converted in place
+        edge_dtype (str, optional): dtype of the quantized edge arrays, 'uint8' or 'uint16'. Defaults to 'uint8'.
+        scale (float, optional): dequantization scale of every edge array. Defaults to the largest value over the largest code.
+        scales (dict, optional): dequantization scale of each edge array, overriding scale. Defaults to None.
+    """
+    scales = {} if scales is None else scales
+    if graph.n_edges < np.iinfo(np.int32).max:
+        graph.indptr = graph.indptr.astype(np.int32, copy=False)
+    graph.indices = graph.indices.astype(np.int32, copy=False)
+    for name in ['cost', 'influence', 'resistance']:
+        setattr(graph, name, getattr(graph, name).astype(np.float32, copy=False))
+    if graph.type.max(initial=0) <= np.iinfo(np.int8).max:
+        graph.type = graph.type.astype(np.int8, copy=False)
+    for name in graph.EDGE_ARRAYS:
+        values = getattr(graph, name)
+        if values is not None and not isinstance(values, QuantizedArray):
+            setattr(graph, name, QuantizedArray.from_values(values, edge_dtype, scales.get(name, scale)))
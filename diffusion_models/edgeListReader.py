@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import re
+import gzip
+import time
+import tracemalloc
+import numpy as np
+from .socialNetwork import CSRGraph
+
+
+# comment lines of the SNAP headers
+_COMMENT = re.compile(rb'^[ \t]*#[^\n]*\n?', re.MULTILINE)
+
+
+def _parse_chunk(chunk : bytes):
+    """Parse a chunk of whole lines into an array of (source, target) pairs. The chunk is split in whitespace
+    separated tokens, and every non empty line must hold two of them.
+
+    Args:
+        chunk (bytes): lines of the edge list
+
+    Raises:
+        ValueError: a line does not contain two integer node ids
+
+    Returns:
+        np.array: edges, one row per line
+    """
+    if b'#' in chunk:
+        chunk = _COMMENT.sub(b'', chunk)
+    tokens = chunk.split()
+    if len(tokens) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    # first byte of each token, and the line it is on
+    data = np.frombuffer(chunk, dtype=np.uint8)
+    space = data <= 32
+    starts = np.flatnonzero(space[:-1] & ~space[1:]) + 1
+    if not space[0]:
+        starts = np.concatenate(([0], starts))
+    counts = np.bincount(np.searchsorted(np.flatnonzero(data == 10), starts))
+    if len(starts) != len(tokens) or ((counts != 0) & (counts != 2)).any():
+        line = next((line for line in chunk.split(b'\n') if len(line.split()) not in [0, 2]), chunk)
+        raise ValueError(f"invalid edge list: expected two integer node ids per line, got {line[:80]!r}")
+    try:
+        values = np.asarray(tokens, dtype=np.int64)
+    except (ValueError, OverflowError):
+        for token in tokens:
+            try:
+                np.int64(int(token))
+            except (ValueError, OverflowError):
+                raise ValueError(f"invalid edge list: node ids must be 64 bit integers, got {token[:80]!r}")
+        raise
+    return values.reshape(-1, 2)
+
+
+class _NodeIndex():
+    def __init__(self):
+        """Dense indexes of the original node ids, given in order of first appearance. The ids already seen are
+        kept sorted with their indexes, and the new ids of each chunk are merged into them.
+        """
+        # original ids in index order, one array per chunk
+        self.labels = []
+        # original ids sorted, and the index of each one
+        self.known = np.empty(0, dtype=np.int64)
+        self.index = np.empty(0, dtype=np.int64)
+        self.n_nodes = 0
+
+    def remap(self, edges : np.array):
+        """Map the node ids of a chunk to dense indexes, giving the next free indexes to the ids never seen before
+        in order of first appearance
+
+        Args:
+            edges (np.array): edges of the chunk with the original node ids
+
+        Returns:
+            np.array: edges of the chunk with the dense indexes
+        """
+        ids, first, inverse = np.unique(edges.ravel(), return_index=True, return_inverse=True)
+        pos = np.searchsorted(self.known, ids)
+        found = pos < len(self.known)
+        found[found] = self.known[pos[found]] == ids[found]
+        new = ~found
+        ids_index = np.empty(len(ids), dtype=np.int64)
+        ids_index[found] = self.index[pos[found]]
+        # rank of the new ids by first appearance
+        order = np.argsort(first[new], kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        ids_index[new] = self.n_nodes + rank
+        if len(order) > 0:
+            self.labels.append(ids[new][order])
+            # the new ids are sorted, inserting them at their positions keeps the ids sorted
+            self.known = np.insert(self.known, pos[new], ids[new])
+            self.index = np.insert(self.index, pos[new], ids_index[new])
+            self.n_nodes += len(order)
+        return ids_index[inverse.ravel()].astype(np.int32).reshape(-1, 2)
+
+
+def read_edge_list(file_path : str, chunk_size : int = 1 << 22, trace_memory : bool = False):
+    """Read a SNAP edge list, plain or gzip compressed, in chunks of bytes and build the compact graph
+    without going through networkx. Sparse node ids are remapped to 0..n_nodes-1 in order of first appearance
+    and duplicated edges are dropped, so the graph is the same built by nx.read_edgelist with a nx.DiGraph.
+
+    Args:
+        file_path (str): path of the edge list, ending with .gz if compressed
+        chunk_size (int, optional): number of bytes parsed at once. Defaults to 4 MB.
+        trace_memory (bool, optional): measure the peak memory with tracemalloc, which slows the reading down. Defaults to False.
+
+    Raises:
+        ValueError: a line does not contain two integer node ids
+
+    Returns:
+        CSRGraph: compact graph
+        np.array: original label of each node
+        dict: 'n_edges', 'n_duplicates', 'seconds' and 'peak_memory' (bytes allocated at the peak, over the memory
+            at the call, None if trace_memory is False)
+    """
+    start = time.time()
+    # the trace of a caller is left running and its peak is not reset
+    tracing = tracemalloc.is_tracing()
+    if trace_memory and not tracing:
+        tracemalloc.start()
+    # memory traced at the call, zero when nothing is traced
+    base_memory, base_peak = tracemalloc.get_traced_memory()
+    # memory sampled along the reading, used when the peak of the caller is above the one of the reader
+    sampled_peak = base_memory
+    # the chunks are remapped as soon as they are parsed, and kept as int32 indexes
+    chunks = []
+    node_index = _NodeIndex()
+    opener = gzip.open if file_path.endswith('.gz') else open
+    with opener(file_path, 'rb') as fp:
+        rest = b''
+        while True:
+            data = fp.read(chunk_size)
+            if not data:
+                break
+            data = rest + data
+            # parse up to the last complete line
+            end = data.rfind(b'\n') + 1
+            rest = data[end:]
+            if end > 0:
+                chunks.append(node_index.remap(_parse_chunk(data[:end])))
+            sampled_peak = max(sampled_peak, tracemalloc.get_traced_memory()[0])
+            del data
+        if rest:
+            chunks.append(node_index.remap(_parse_chunk(rest)))
+    n_nodes = node_index.n_nodes
+    edges = np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int32)
+    node_labels = np.concatenate(node_index.labels) if node_index.labels else np.empty(0, dtype=np.int64)
+    del chunks, node_index
+    sampled_peak = max(sampled_peak, tracemalloc.get_traced_memory()[0])
+    # keep the first occurrence of each edge
+    key = edges[:, 0].astype(np.int64) * n_nodes + edges[:, 1]
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    keep = np.ones(len(edges), dtype=bool)
+    keep[order[1:][key[1:] == key[:-1]]] = False
+    del key, order
+    edges = edges[keep]
+    n_duplicates = len(keep) - len(edges)
+    # group by source keeping the file order, as nx.DiGraph does
+    order = np.argsort(edges[:, 0], kind='stable')
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges[:, 0], minlength=n_nodes), out=indptr[1:])
+    graph = CSRGraph(indptr, edges[order, 1])
+    del edges, order
+    peak_memory = None
+    if trace_memory:
+        current_memory, peak = tracemalloc.get_traced_memory()
+        if peak > base_peak:
+            peak_memory = peak - base_memory
+        else:
+            peak_memory = max(sampled_peak, current_memory) - base_memory
+        if not tracing:
+            tracemalloc.stop()
+    report = {
+        'n_edges': graph.n_edges,
+        'n_duplicates': n_duplicates,
+        'seconds': time.time() - start,
+        'peak_memory': peak_memory
+    }
+    return graph, node_labels, report
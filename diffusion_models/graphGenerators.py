@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from .socialNetwork import CSRGraph
+
+
+def _directed_csr(n_nodes : int, sources : np.array, targets : np.array):
+    """Build the compact graph of a list of directed edges, successors sorted by index
+
+    Args:
+        n_nodes (int): number of nodes
+        sources (np.array): source of each edge
+        targets (np.array): target of each edge
+
+    Returns:
+        CSRGraph: compact graph
+    """
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n_nodes), out=indptr[1:])
+    # sorting the edge keys is faster than sorting the pairs
+    keys = sources.astype(np.int64) * n_nodes + targets
+    keys.sort()
+    return CSRGraph(indptr, keys % n_nodes)
+
+
+def _undirected_csr(n_nodes : int, u : np.array, v : np.array):
+    """Build the compact graph of a list of undirected edges, with both directions of each edge as nx.to_directed does
+
+    Args:
+        n_nodes (int): number of nodes
+        u (np.array): first end of each edge
+        v (np.array): second end of each edge
+
+    Returns:
+        CSRGraph: compact graph
+    """
+    u = u.astype(np.int32)
+    v = v.astype(np.int32)
+    return _directed_csr(n_nodes, np.concatenate([u, v]), np.concatenate([v, u]))
+
+
+def erdos_renyi(n_nodes : int, p : float, rng : np.random.Generator):
+    """Directed G(n, p) graph. The ordered pairs are numbered 0..n(n-1)-1 and the gaps between two edges
+    are drawn from a geometric distribution, so the cost is proportional to the number of edges.
+
+    Args:
+        n_nodes (int): number of nodes
+        p (float): probability of each edge
+        rng (np.random.Generator): random stream
+
+    Returns:
+        CSRGraph: compact graph
+    """
+    n_pairs = n_nodes * (n_nodes - 1)
+    if p <= 0 or n_pairs == 0:
+        positions = np.empty(0, dtype=np.int64)
+    elif p >= 1:
+        positions = np.arange(n_pairs, dtype=np.int64)
+    else:
+        chunks = []
+        last = -1
+        while last < n_pairs:
+            # enough gaps to cover the remaining pairs with high probability
+            expected = (n_pairs - last) * p
+            gaps = rng.geometric(p, size=int(expected + 5 * np.sqrt(expected)) + 16)
+            positions = last + np.cumsum(gaps)
+            last = int(positions[-1])
+            chunks.append(positions[positions < n_pairs])
+        positions = np.concatenate(chunks)
+    sources = positions // (n_nodes - 1)
+    targets = positions % (n_nodes - 1)
+    # skip the self loop
+    targets += targets >= sources
+    return _directed_csr(n_nodes, sources.astype(np.int32), targets.astype(np.int32))
+
+
+def _chase(values : np.array, pointers : np.array, positions : np.array):
+    """Follow the pointers of the repeated-nodes list from the given positions up to the known entries
+
+    Args:
+        values (np.array): node of each entry of the list, -1 if not known yet
+        pointers (np.array): earlier position of the list copied by each unknown entry
+        positions (np.array): starting positions
+
+    Returns:
+        np.array: node found from each starting position
+    """
+    positions = positions.copy()
+    nodes = values[positions]
+    pending = np.flatnonzero(nodes < 0)
+    while len(pending) > 0:
+        positions[pending] = pointers[positions[pending]]
+        nodes[pending] = values[positions[pending]]
+        pending = pending[nodes[pending] < 0]
+    return nodes
+
+
+def _duplicates(targets : np.array):
+    """Mask of the repeated targets in each row, keeping the first occurrence
+
+    Args:
+        targets (np.array): targets of each new node, one row per node
+
+    Returns:
+        np.array: boolean matrix, True for the repeated targets
+    """
+    order = np.argsort(targets, axis=1, kind='stable')
+    ordered = np.take_along_axis(targets, order, axis=1)
+    repeated = np.zeros(targets.shape, dtype=bool)
+    np.put_along_axis(
+        repeated,
+        order[:, 1:],
+        ordered[:, 1:] == ordered[:, :-1],
+        axis=1
+    )
+    return repeated
+
+
+def _attach(initial : np.array, n_nodes : int, m : int, p : float, rng : np.random.Generator, block_size : int = 1 << 16):
+    """Grow a graph by preferential attachment on the repeated-nodes list of networkx, laid out in advance:
+    after the initial entries, every new node has m target entries followed by m entries of itself.
+    A target entry copies a uniform position of the list before it, and with probability p (never for the first
+    one) it closes a triangle instead, copying one of the targets chosen by the last attachment target when it
+    joined. The new nodes are resolved block_size at a time by following the copies back to known entries,
+    and the targets repeated for the same node are drawn again by preferential attachment.
+
+    Args:
+        initial (np.array): initial entries of the list
+        n_nodes (int): number of nodes
+        m (int): number of edges of each new node
+        p (float): probability of a triangle step
+        rng (np.random.Generator): random stream
+        block_size (int, optional): number of new nodes resolved at once. Defaults to 65536.
+
+    Returns:
+        np.array: targets of each new node, one row per node
+    """
+    first_node = int(initial.max()) + 1 if len(initial) > 0 else 0
+    n_new = n_nodes - first_node
+    values = np.full((n_new, 2, m), -1, dtype=np.int64)
+    values[:, 1, :] = np.arange(first_node, n_nodes)[:, None]
+    values = np.concatenate([initial.astype(np.int64), values.ravel()])
+    pointers = np.zeros(len(values), dtype=np.int64)
+    targets = np.empty((n_new, m), dtype=np.int64)
+    columns = np.arange(m)
+    for start in range(0, n_new, block_size):
+        rows = np.arange(start, min(start + block_size, n_new))
+        # first target entry of each node, which is also the length of the list before it
+        length = len(initial) + 2 * m * rows[:, None]
+        slots = length + columns
+        attachment = (rng.random(slots.shape) * length).astype(np.int64)
+        triangle = rng.random(slots.shape) < p
+        triangle[:, 0] = False
+        neighbor = rng.integers(0, m, size=slots.shape)
+        while True:
+            # column of the last attachment step before each entry
+            last = np.maximum.accumulate(np.where(triangle, 0, columns), axis=1)
+            copied = attachment
+            # a triangle step depends on the targets of earlier nodes: iterate up to a fixed point
+            while True:
+                pointers[slots] = copied
+                block = _chase(values, pointers, slots.ravel()).reshape(slots.shape)
+                target = np.take_along_axis(block, last, axis=1)
+                closing = triangle & (target >= first_node)
+                row_target = len(initial) + 2 * m * np.maximum(target - first_node, 0)
+                next_copied = np.where(closing, row_target + neighbor, attachment)
+                if np.array_equal(next_copied, copied):
+                    break
+                copied = next_copied
+            # the initial nodes have no targets: attachment step
+            triangle &= closing
+            redraw = _duplicates(block)
+            if not redraw.any():
+                break
+            triangle &= ~redraw
+            attachment = attachment.copy()
+            attachment[redraw] = (rng.random(int(redraw.sum())) * length.repeat(m, axis=1)[redraw]).astype(np.int64)
+        values[slots] = block
+        targets[rows] = block
+    return targets
+
+
+def barabasi_albert(n_nodes : int, m : int, rng : np.random.Generator):
+    """Barabási–Albert graph grown from a star on m + 1 nodes, as nx.barabasi_albert_graph
+
+    Args:
+        n_nodes (int): number of nodes
+        m (int): number of edges of each new node
+        rng (np.random.Generator): random stream
+
+    Raises:
+        ValueError: m not in [1, n_nodes)
+
+    Returns:
+        CSRGraph: compact graph
+    """
+    if m < 1 or m >= n_nodes:
+        raise ValueError(f"barabasi_albert needs 1 <= m < n_nodes, m = {m}, n_nodes = {n_nodes}")
+    # the star: the center once per edge, then the leaves
+    star = np.arange(1, m + 1)
+    targets = _attach(np.concatenate([np.zeros(m, dtype=np.int64), star]), n_nodes, m, 0.0, rng)
+    u = np.concatenate([np.zeros(m, dtype=np.int64), np.repeat(np.arange(m + 1, n_nodes), m)])
+    v = np.concatenate([star, targets.ravel()])
+    return _undirected_csr(n_nodes, u, v)
+
+
+def powerlaw_cluster(n_nodes : int, m : int, p : float, rng : np.random.Generator):
+    """Holme–Kim graph grown from m isolated nodes, as nx.powerlaw_cluster_graph: each new node makes a preferential
+    attachment step, then every other edge closes a triangle with probability p.
+    The triangle is closed towards one of the nodes the last attachment target linked to when it joined, since
+    its later neighbors are not known while the nodes are resolved in blocks.
+
+    Args:
+        n_nodes (int): number of nodes
+        m (int): number of edges of each new node
+        p (float): probability of a triangle step
+        rng (np.random.Generator): random stream
+
+    Raises:
+        ValueError: m not in [1, n_nodes] or p not in [0, 1]
+
+    Returns:
+        CSRGraph: compact graph
+    """
+    if m < 1 or m > n_nodes:
+        raise ValueError(f"powerlaw_cluster needs 1 <= m <= n_nodes, m = {m}, n_nodes = {n_nodes}")
+    if p < 0 or p > 1:
+        raise ValueError(f"powerlaw_cluster needs 0 <= p <= 1, p = {p}")
+    targets = _attach(np.arange(m), n_nodes, m, p, rng)
+    return _undirected_csr(n_nodes, np.repeat(np.arange(m, n_nodes), m), targets.ravel())
+
+
+def watts_strogatz(n_nodes : int, k : int, p : float, rng : np.random.Generator):
+    """Watts–Strogatz graph, as nx.watts_strogatz_graph: a ring lattice where each node is linked to its k // 2
+    nearest neighbors on each side, then the edge (u, u + j) is rewired to a uniform node with probability p.
+    The edges at distance j are rewired together, and the new ends making self loops or multiple edges are drawn again.
+
+    Args:
+        n_nodes (int): number of nodes
+        k (int): number of nearest neighbors of each node in the lattice
+        p (float): rewiring probability
+        rng (np.random.Generator): random stream
+
+    Raises:
+        ValueError: k larger than n_nodes
+
+    Returns:
+        CSRGraph: compact graph
+    """
+    if k > n_nodes:
+        raise ValueError("k>n, choose smaller k or larger n")
+    nodes = np.arange(n_nodes, dtype=np.int64)
+    if k == n_nodes:
+        # complete graph
+        u, v = np.triu_indices(n_nodes, 1)
+        return _undirected_csr(n_nodes, u, v)
+    # an undirected edge is the key min * n_nodes + max, the keys are kept sorted
+    def edge_key(u, v):
+        return np.minimum(u, v) * n_nodes + np.maximum(u, v)
+    keys = np.concatenate([np.empty(0, dtype=np.int64)] + [edge_key(nodes, (nodes + j) % n_nodes) for j in range(1, k // 2 + 1)])
+    keys.sort()
+    # the lattice has repeated edges when k // 2 reaches n_nodes / 2
+    keep = np.ones(len(keys), dtype=bool)
+    keep[1:] = keys[1:] != keys[:-1]
+    keys = keys[keep]
+    for j in range(1, k // 2 + 1):
+        u = nodes[rng.random(n_nodes) < p]
+        # nodes linked to all the others keep their edge
+        degree = np.bincount(np.concatenate([keys // n_nodes, keys % n_nodes]), minlength=n_nodes)
+        u = u[degree[u] < n_nodes - 1]
+        old = edge_key(u, (u + j) % n_nodes)
+        w = np.empty(len(u), dtype=np.int64)
+        redraw = np.ones(len(u), dtype=bool)
+        while redraw.any():
+            w[redraw] = rng.integers(0, n_nodes, size=int(redraw.sum()))
+            new = edge_key(u, w)
+            position = np.minimum(np.searchsorted(keys, new), len(keys) - 1)
+            redraw = (w == u) | (keys[position] == new)
+            # two nodes drawing the same edge: the first one keeps it
+            order = np.argsort(new, kind='stable')
+            repeated = np.zeros(len(u), dtype=bool)
+            repeated[order[1:]] = new[order[1:]] == new[order[:-1]]
+            redraw |= repeated
+        if len(u) > 0:
+            old.sort()
+            position = np.minimum(np.searchsorted(old, keys), len(old) - 1)
+            keys = np.sort(np.concatenate([keys[old[position] != keys], new]))
+    return _undirected_csr(n_nodes, keys // n_nodes, keys % n_nodes)
+
+
+def generate(graph_settings : dict, seed_settings : int):
+    """Generate the graph described by graph_settings with the array generators, seeded with seed_settings.
+    The parameters are read as in SocialNetwork.generate_graph; the graphs follow the same models as the networkx
+    generators, but are drawn from a different random stream.
+
+    Args:
+        graph_settings (dict): dictionary with graph settings parameters
+        seed_settings (int): seed value
+
+    Raises:
+        ValueError: Graph name without array generator
+
+    Returns:
+        CSRGraph: compact graph
+        np.array: original label of each node
+    """
+    rng = np.random.default_rng(seed_settings)
+    n_nodes = graph_settings['n_nodes']
+    if graph_settings['name'] == 'erdos_renyi':
+        graph = erdos_renyi(n_nodes, graph_settings['p'], rng)
+    elif graph_settings['name'] == 'watt_strogatz':
+        graph = watts_strogatz(
+            n_nodes,
+            int(n_nodes/graph_settings['n_neigh']),
+            graph_settings['edge_prob'],
+            rng
+        )
+    elif graph_settings['name'] == 'barabasi_albert':
+        graph = barabasi_albert(n_nodes, graph_settings['stub'], rng)
+    elif graph_settings['name'] == 'power':
+        graph = powerlaw_cluster(n_nodes, graph_settings['stubs'], graph_settings['prob'], rng)
+    else:
+        raise ValueError(f"no native generator for {graph_settings['name']}")
+    return graph, np.arange(n_nodes)
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib import animation
+
+
+# RGB colors of the frames
+BACKGROUND_COLOR = np.array([255, 255, 255], dtype=np.float64)
+EDGE_COLOR = np.array([150, 150, 150], dtype=np.float64)
+NODE_COLORS = np.array([[0, 0, 255], [255, 0, 0]], dtype=np.uint8)
+
+
+def _force_layout(n_nodes : int, sources : np.array, targets : np.array, iterations : int, rng : np.random.RandomState):
+    """Fruchterman-Reingold layout of a small graph, with dense numpy forces
+
+    Args:
+        n_nodes (int): number of nodes
+        sources (np.array): source of each edge
+        targets (np.array): target of each edge
+        iterations (int): number of iterations
+        rng (np.random.RandomState): random stream of the initial positions
+
+    Returns:
+        np.array: positions of shape (n_nodes, 2)
+    """
+    positions = rng.uniform(0, 1, (n_nodes, 2))
+    if n_nodes < 2:
+        return positions
+    k = np.sqrt(1.0 / n_nodes)
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        # repulsion between every pair of nodes: sum over j of (x_i - x_j) * k^2 / d_ij^2
+        dx = positions[:, 0, None] - positions[None, :, 0]
+        dy = positions[:, 1, None] - positions[None, :, 1]
+        weights = k * k / np.maximum(dx * dx + dy * dy, 1e-4)
+        np.fill_diagonal(weights, 0)
+        displacement = positions * weights.sum(axis=1)[:, None] - weights @ positions
+        # attraction along the edges
+        edge_delta = positions[sources] - positions[targets]
+        edge_distance = np.maximum(np.sqrt((edge_delta ** 2).sum(axis=1)), 0.01)
+        attraction = edge_delta * (edge_distance / k)[:, None]
+        for axis in range(2):
+            displacement[:, axis] -= np.bincount(sources, weights=attraction[:, axis], minlength=n_nodes)
+            displacement[:, axis] += np.bincount(targets, weights=attraction[:, axis], minlength=n_nodes)
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 0.01)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+    return positions
+
+
+class GraphPlotter():
+
+    def __init__(self, social_net : object, key : str = None, layout_cache : str = None, size : int = 1024,
+                 node_size : int = None, max_nodes : int = 200000, max_edges : int = 100000, layout_nodes : int = 1000,
+                 iterations : int = 50, seed : int = 0):
+        """Base function for instantiating the plotter of an influence model. The layout is computed once: a force
+        directed layout of the layout_nodes nodes of highest degree, then every other node is placed at the mean
+        position of its placed neighbours. It is stored in layout_cache, keyed by the instance, so the steps and the
+        other processes reuse it. Above max_nodes nodes and max_edges edges a fixed random sample is drawn. The edges
+        are rasterized once into a density background, and each frame only repaints the nodes whose color changed.
+        The plotter has its own random stream, so plotting does not change the numpy state of the experiments.
+
+        Args:
+            social_net (object): influence model (ICModel, LTModel or CTModel)
+            key (str, optional): key of the instance, e.g. instance_key(settings). The layout is not cached on disk if None. Defaults to None.
+            layout_cache (str, optional): directory of the cached layouts. Defaults to None.
+            size (int, optional): width and height of the frames, in pixels. Defaults to 1024.
+            node_size (int, optional): half width of the square of a node, in pixels. Defaults to a size shrinking with the number of drawn nodes.
+            max_nodes (int, optional): maximum number of drawn nodes. Defaults to 200000.
+            max_edges (int, optional): maximum number of drawn edges. Defaults to 100000.
+            layout_nodes (int, optional): number of nodes of the force directed layout. Defaults to 1000.
+            iterations (int, optional): iterations of the force directed layout. Defaults to 50.
+            seed (int, optional): seed of the layout and of the samples. Defaults to 0.
+        """
+        self.social_net = social_net
+        self.key = key
+        self.layout_cache = layout_cache
+        self.size = size
+        self.node_size = node_size
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.layout_nodes = layout_nodes
+        self.iterations = iterations
+        self.seed = seed
+        self.positions = None
+        self.nodes = None
+        self._pixels = None
+        self._shape = None
+        self._background = None
+        self._image = None
+        self._colors = None
+
+    def layout_path(self):
+        """Path of the cached layout
+
+        Returns:
+            str: file path, None if the layout is not cached on disk
+        """
+        if self.key is None or self.layout_cache is None:
+            return None
+        return os.path.join(self.layout_cache, f"layout-{self.key}-{self.layout_nodes}-{self.iterations}-{self.seed}.npy")
+
+    def layout(self):
+        """Get method for the node positions in [0, 1] x [0, 1], read from the cache or computed. The nodes added to
+        the graph after the layout (see SocialNetwork.mutate) are placed next to their neighbours.
+
+        Returns:
+            np.array: positions of shape (n_nodes, 2)
+        """
+        n_nodes = self.social_net.graph.n_nodes
+        if self.positions is None:
+            path = self.layout_path()
+            if path is not None and os.path.exists(path):
+                self.positions = np.load(path)
+            else:
+                self.positions = self._compute_layout()
+                if path is not None:
+                    self._write_layout(path)
+        if len(self.positions) < n_nodes:
+            rng = np.random.RandomState(self.seed + len(self.positions))
+            placed = np.zeros(n_nodes, dtype=bool)
+            placed[:len(self.positions)] = True
+            positions = np.zeros((n_nodes, 2))
+            positions[:len(self.positions)] = self.positions
+            self.positions = self._place(positions, placed, rng)
+        return self.positions[:n_nodes]
+
+    def _write_layout(self, path : str):
+        """Write the layout in a temporary file and rename it, so concurrent processes never read a partial layout
+
+        Args:
+            path (str): file path
+        """
+        os.makedirs(self.layout_cache, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=self.layout_cache, suffix='.npy')
+        with os.fdopen(handle, 'wb') as f:
+            np.save(f, self.positions)
+        os.replace(temporary, path)
+
+    def _edges(self):
+        """Undirected edges of the graph, without self loops
+
+        Returns:
+            np.array: sources
+            np.array: targets
+        """
+        graph = self.social_net.graph
+        sources, targets = graph.sources, graph.indices
+        keep = sources != targets
+        return sources[keep].astype(np.int64), targets[keep].astype(np.int64)
+
+    def _compute_layout(self):
+        """Force directed layout of the nodes of highest degree, extended to the other nodes
+
+        Returns:
+            np.array: positions of shape (n_nodes, 2)
+        """
+        graph = self.social_net.graph
+        rng = np.random.RandomState(self.seed)
+        degree = graph.degree()
+        skeleton = np.argsort(-degree, kind='stable')[:self.layout_nodes]
+        # index of each node in the skeleton, -1 outside
+        skeleton_index = np.full(graph.n_nodes, -1, dtype=np.int64)
+        skeleton_index[skeleton] = np.arange(len(skeleton))
+        sources, targets = self._edges()
+        inside = (skeleton_index[sources] >= 0) & (skeleton_index[targets] >= 0)
+        positions = np.zeros((graph.n_nodes, 2))
+        positions[skeleton] = _force_layout(
+            len(skeleton), skeleton_index[sources[inside]], skeleton_index[targets[inside]], self.iterations, rng
+        )
+        placed = np.zeros(graph.n_nodes, dtype=bool)
+        placed[skeleton] = True
+        return self._place(positions, placed, rng)
+
+    def _place(self, positions : np.array, placed : np.array, rng : np.random.RandomState):
+        """Place the nodes without position at the mean position of their placed neighbours, plus a small jitter,
+        one hop at a time. The nodes not connected to any placed node are spread on a ring around the layout.
+
+        Args:
+            positions (np.array): positions of shape (n_nodes, 2), defined for the placed nodes
+            placed (np.array): boolean array, True for the nodes with a position
+            rng (np.random.RandomState): random stream of the jitter
+
+        Returns:
+            np.array: positions of every node, rescaled to [0, 1] x [0, 1]
+        """
+        n_nodes = len(placed)
+        sources, targets = self._edges()
+        sources, targets = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+        jitter = 0.5 / np.sqrt(max(n_nodes, 1))
+        while not placed.all():
+            known = placed[sources] & ~placed[targets]
+            if not known.any():
+                break
+            count = np.bincount(targets[known], minlength=n_nodes)
+            new = count > 0
+            for axis in range(2):
+                total = np.bincount(targets[known], weights=positions[sources[known], axis], minlength=n_nodes)
+                positions[new, axis] = total[new] / count[new] + rng.normal(0, jitter, new.sum())
+            placed |= new
+        if placed.any():
+            low, high = positions[placed].min(axis=0), positions[placed].max(axis=0)
+            positions[placed] = (positions[placed] - low) / np.maximum(high - low, 1e-12)
+        # unreachable nodes on a ring
+        angle = rng.uniform(0, 2 * np.pi, (~placed).sum())
+        positions[~placed] = 0.5 + 0.5 * np.stack([np.cos(angle), np.sin(angle)], axis=1)
+        low, high = positions.min(axis=0), positions.max(axis=0)
+        return (positions - low) / np.maximum(high - low, 1e-12)
+
+    def _prepare(self):
+        """Compute the pixels of the drawn nodes and the edge background, again when the graph changed
+        """
+        graph = self.social_net.graph
+        if self._shape == (graph.n_nodes, graph.n_edges):
+            return
+        self._shape = (graph.n_nodes, graph.n_edges)
+        rng = np.random.RandomState(self.seed)
+        self.nodes = np.arange(graph.n_nodes)
+        if graph.n_nodes > self.max_nodes:
+            self.nodes = np.sort(rng.choice(graph.n_nodes, self.max_nodes, replace=False))
+        node_size = self.node_size
+        if node_size is None:
+            node_size = int(np.clip(self.size / (8 * np.sqrt(max(len(self.nodes), 1))), 1, 6))
+        margin = node_size + 1
+        pixels = margin + np.rint(self.layout() * (self.size - 1 - 2 * margin)).astype(np.int64)
+        # edge density background
+        sources, targets = self._edges()
+        if len(sources) > self.max_edges:
+            sample = np.sort(rng.choice(len(sources), self.max_edges, replace=False))
+            sources, targets = sources[sample], targets[sample]
+        # one sample per pixel, fewer on the long edges of large graphs (at most about 10M samples)
+        max_samples = int(np.clip(10 ** 7 // max(len(sources), 1), 32, 2 * self.size))
+        density = np.zeros(self.size * self.size)
+        for start in range(0, len(sources), 10000):
+            start_pixels = pixels[sources[start:start + 10000]]
+            end_pixels = pixels[targets[start:start + 10000]]
+            n_samples = np.clip(np.abs(end_pixels - start_pixels).max(axis=1), 1, max_samples)
+            edge = np.repeat(np.arange(len(n_samples)), n_samples)
+            t = (np.arange(n_samples.sum()) - np.repeat(np.cumsum(n_samples) - n_samples, n_samples)) / np.repeat(n_samples, n_samples)
+            points = np.rint(start_pixels[edge] + t[:, None] * (end_pixels[edge] - start_pixels[edge])).astype(np.int64)
+            density += np.bincount(points[:, 1] * self.size + points[:, 0], minlength=self.size * self.size)
+        alpha = (1 - np.exp(-0.3 * density))[:, None]
+        background = (1 - alpha) * BACKGROUND_COLOR + alpha * EDGE_COLOR
+        self._background = background.reshape(self.size, self.size, 3).astype(np.uint8)
+        # flat pixel indexes of the square of each drawn node
+        offsets = np.arange(-node_size, node_size + 1)
+        dy, dx = np.meshgrid(offsets, offsets, indexing='ij')
+        node_pixels = pixels[self.nodes]
+        self._pixels = (node_pixels[:, 1, None] + dy.ravel()) * self.size + node_pixels[:, 0, None] + dx.ravel()
+        self._image = None
+
+    def frame(self, influenced : np.array = None):
+        """Render the current frame, influenced nodes in red and the others in blue. Only the nodes whose color
+        changed since the previous frame are repainted.
+
+        Args:
+            influenced (np.array, optional): boolean array of the influenced nodes, e.g. a recorded step. Defaults to the current state.
+
+        Returns:
+            np.array: RGB image of shape (size, size, 3)
+        """
+        self._prepare()
+        if influenced is None:
+            influenced = np.zeros(self.social_net.graph.n_nodes, dtype=bool)
+            influenced[self.social_net.active_nodes()] = True
+        colors = np.asarray(influenced, dtype=bool)[self.nodes].astype(np.int8)
+        if self._image is None:
+            self._image = self._background.copy()
+            changed = np.ones(len(self.nodes), dtype=bool)
+        else:
+            changed = colors != self._colors
+        self._colors = colors
+        self._image.reshape(-1, 3)[self._pixels[changed].ravel()] = np.repeat(NODE_COLORS[colors[changed]], self._pixels.shape[1], axis=0)
+        return self._image.copy()
+
+    def plot(self, path : str = None):
+        """Show the current frame, or save it as an image
+
+        Args:
+            path (str, optional): image file, e.g. a png. Defaults to None.
+        """
+        image = self.frame()
+        if path is not None:
+            plt.imsave(path, image)
+            return
+        plt.figure(figsize=(8, 8))
+        plt.imshow(image, interpolation='nearest')
+        plt.axis('off')
+        plt.show()
+
+    def animate(self, frames : list, path : str = None, fps : int = 5):
+        """Replay recorded frames as a matplotlib animation
+
+        Args:
+            frames (list): RGB images returned by frame()
+            path (str, optional): output file, e.g. a gif or an mp4. Defaults to None.
+            fps (int, optional): frames per second. Defaults to 5.
+
+        Returns:
+            animation.FuncAnimation: animation
+        """
+        figure = plt.figure(figsize=(8, 8))
+        artist = plt.imshow(frames[0], interpolation='nearest', animated=True)
+        plt.axis('off')
+
+        def update(i):
+            artist.set_data(frames[i])
+            return (artist,)
+
+        replay = animation.FuncAnimation(figure, update, frames=len(frames), interval=1000 / fps, blit=True)
+        if path is not None:
+            replay.save(path, writer='pillow' if path.endswith('.gif') else None, fps=fps)
+            plt.close(figure)
+        return replay
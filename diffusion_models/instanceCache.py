@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from .ICModel import ICModel
+from .LTModel import LTModel
+from .CTModel import CTModel
+from .socialNetwork import CSRGraph
+
+
+# version of the on-disk format, bumped whenever the stored arrays change
+CACHE_VERSION = 2
+# settings entries defining an instance
+INSTANCE_KEYS = ('graph_type', 'cost_type', 'influence_model', 'seed')
+
+
+def instance_key(settings : dict):
+    """Hash of the settings entries defining an instance, plus the size and modification time of the
+    edge list of a real_graph
+
+    Args:
+        settings (dict): dictionary with settings parameters
+
+    Returns:
+        str: hexadecimal key
+    """
+    data = {key: settings[key] for key in INSTANCE_KEYS}
+    # the engine does not change the instance
+    data['influence_model'] = {key: value for key, value in data['influence_model'].items() if key != 'engine'}
+    # nor does measuring the memory of the reading
+    data['graph_type'] = {key: value for key, value in data['graph_type'].items() if key != 'trace_memory'}
+    # the random streams draw another instance from the same seed
+    if settings.get('random_streams', False):
+        data['random_streams'] = True
+    # an edited edge list is another instance
+    if data['graph_type'].get('name') == 'real_graph':
+        info = os.stat(data['graph_type']['file_path'])
+        data['file_stat'] = [info.st_size, info.st_mtime_ns]
+    text = json.dumps(data, sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:24]
+
+
+def instance_path(settings : dict, cache_dir : str):
+    """Directory of the compiled instance
+
+    Args:
+        settings (dict): dictionary with settings parameters
+        cache_dir (str): root directory of the cache
+
+    Returns:
+        str: directory path
+    """
+    return os.path.join(cache_dir, f"v{CACHE_VERSION}-{instance_key(settings)}")
+
+
+def compile_instance(settings : dict, cache_dir : str):
+    """Generate the instance described by settings, seeding numpy with settings['seed'], and write its node and
+    edge arrays as .npy files. The numpy random state of the caller is restored after the generation.
+    The directory is written in a temporary location and renamed, so concurrent workers never read a partial instance.
+
+    Args:
+        settings (dict): dictionary with settings parameters
+        cache_dir (str): root directory of the cache
+
+    Returns:
+        str: directory of the compiled instance
+    """
+    path = instance_path(settings, cache_dir)
+    if os.path.exists(path):
+        return path
+    os.makedirs(cache_dir, exist_ok=True)
+    # the instance is stored in full precision, the compact storage is applied when it is loaded
+    settings = {key: value for key, value in settings.items() if key != 'storage'}
+    state = np.random.get_state()
+    np.random.seed(settings['seed'])
+    try:
+        influence_type = settings['influence_model']['type']
+        if influence_type == 'LTM':
+            social_net = LTModel(settings)
+        elif influence_type == 'ICM':
+            social_net = ICModel(settings)
+        elif influence_type == 'CTM':
+            social_net = CTModel(None, settings)
+        else:
+            raise ValueError('invalid influence_model')
+    finally:
+        np.random.set_state(state)
+    tmp_path = tempfile.mkdtemp(dir=cache_dir)
+    for name, values in social_net.graph.arrays().items():
+        if name != 'status':
+            np.save(os.path.join(tmp_path, f"{name}.npy"), values)
+    np.save(os.path.join(tmp_path, "node_labels.npy"), social_net.node_labels)
+    with open(os.path.join(tmp_path, "meta.json"), 'w') as fp:
+        json.dump({
+            'version': CACHE_VERSION,
+            'settings': {key: settings[key] for key in INSTANCE_KEYS},
+            'n_nodes': social_net.graph.n_nodes,
+            'n_edges': social_net.graph.n_edges
+        }, fp, indent=4)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # another worker compiled the same instance in the meantime
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+def load_instance(settings : dict, cache_dir : str):
+    """Memory-map read-only the arrays of the instance described by settings, compiling it if needed.
+    The numpy random state is left untouched, the simulation draws from the stream of the caller.
+
+    Args:
+        settings (dict): dictionary with settings parameters
+        cache_dir (str): root directory of the cache
+
+    Returns:
+        CSRGraph: graph with its node and edge arrays
+        np.array: original label of each node
+    """
+    path = compile_instance(settings, cache_dir)
+    with open(os.path.join(path, "meta.json"), 'r') as fp:
+        meta = json.load(fp)
+    if meta['version'] != CACHE_VERSION:
+        raise ValueError("invalid instance version")
+    arrays = {}
+    for name in ('indptr', 'indices') + CSRGraph.NODE_ARRAYS + CSRGraph.EDGE_ARRAYS:
+        file_path = os.path.join(path, f"{name}.npy")
+        if os.path.exists(file_path):
+            arrays[name] = np.load(file_path, mmap_mode='r')
+    # the status changes along the episode
+    arrays['status'] = np.zeros(meta['n_nodes'], dtype=np.uint8)
+    node_labels = np.load(os.path.join(path, "node_labels.npy"), mmap_mode='r')
+    return CSRGraph.from_arrays(arrays), node_labels
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from .socialNetwork import CSRGraph, SocialNetwork
+
+
+class LiveEdgeWorlds():
+
+    def __init__(self, social_net : SocialNetwork, n_worlds : int, seed : int = 0, block_size : int = 1 << 20):
+        """Base function for instantiating the store of pre-sampled worlds of an influence model.
+        For ICM every edge gets one coin per world, stored with one bit per edge per world in an array of
+        shape (n_edges, ceil(n_worlds / 8)): in an episode each edge is tried at most once, so the coins of a
+        world fix the whole diffusion. For LTM every world holds a vector of node thresholds.
+        The worlds are drawn from their own random stream, the numpy global one is not touched.
+
+        Args:
+            social_net (SocialNetwork): influence model (ICModel or LTModel)
+            n_worlds (int): number of worlds
+            seed (int, optional): seed of the worlds. Defaults to 0.
+            block_size (int, optional): number of coins drawn at once, bounding the memory of the draws. Defaults to 1048576.
+
+        Raises:
+            ValueError: influence model without live-edge worlds
+        """
+        if social_net.influence_type not in ['ICM', 'LTM']:
+            raise ValueError("live-edge worlds are defined for ICM and LTM only")
+        self.influence_type = social_net.influence_type
+        self.n_worlds = n_worlds
+        self.block_size = block_size
+        rng = np.random.default_rng(seed)
+        # kept to draw the worlds of the edges and nodes added by mutate()
+        self.rng = rng
+        graph = social_net.graph
+        self.live_edges = None
+        self.thresholds = None
+        if self.influence_type == 'ICM':
+            self.live_edges = self._coins(graph.probability_to_influence)
+        else:
+            # single precision halves the memory of the thresholds
+            self.thresholds = rng.random((n_worlds, graph.n_nodes), dtype=np.float32)
+
+    def _coins(self, probability : np.array):
+        """Draw the packed coins of edges in every world
+
+        Args:
+            probability (np.array): probability to influence of each edge
+
+        Returns:
+            np.array: packed coins, one row per edge
+        """
+        packed = np.empty((len(probability), (self.n_worlds + 7) // 8), dtype=np.uint8)
+        # edges drawn at once, so that a draw holds at most block_size coins
+        n_rows = max(1, self.block_size // max(self.n_worlds, 1))
+        for start in range(0, len(probability), n_rows):
+            block = np.asarray(probability[start:start + n_rows], dtype=np.float64)
+            coins = self.rng.random((len(block), self.n_worlds)) < block[:, None]
+            packed[start:start + len(block)] = np.packbits(coins, axis=1, bitorder='little')
+        return packed
+
+    def splice(self, splice : dict, probability : np.array = None):
+        """Function to move the coins as CSRGraph.splice_edges() moved the edges, drawing the ones of the new edges
+
+        Args:
+            splice (dict): data returned by CSRGraph.splice_edges()
+            probability (np.array, optional): probability to influence of the new edges, for ICM. Defaults to None.
+        """
+        if self.live_edges is not None:
+            probability = np.empty(0) if probability is None else probability
+            self.live_edges = CSRGraph.splice_array(self.live_edges, splice, self._coins(probability))
+
+    def redraw(self, edges : np.array, probability : np.array):
+        """Function to draw again the coins of edges whose probability to influence changed
+
+        Args:
+            edges (np.array): edge indexes
+            probability (np.array): new probability to influence of each edge
+        """
+        if self.live_edges is not None:
+            self.live_edges[edges] = self._coins(probability)
+
+    def add_nodes(self, n_added : int):
+        """Function to draw the thresholds of the nodes added by mutate(), for LTM
+
+        Args:
+            n_added (int): number of new nodes
+        """
+        if self.thresholds is not None:
+            thresholds = self.rng.random((self.n_worlds, n_added), dtype=np.float32)
+            self.thresholds = np.concatenate([self.thresholds, thresholds], axis=1)
+
+    def live(self, edges : np.array, world : int):
+        """Get method for the coins of the given edges in a world
+
+        Args:
+            edges (np.array): edge indexes
+            world (int): world index
+
+        Returns:
+            np.array: boolean array, True for the live edges
+        """
+        return (self.live_edges[edges, world >> 3] >> (world & 7)) & 1 == 1
+
+    def live_pairs(self, edges : np.array, worlds : np.array):
+        """Get method for the coin of each (edge, world) pair
+
+        Args:
+            edges (np.array): edge indexes
+            worlds (np.array): world index of each edge
+
+        Returns:
+            np.array: boolean array, True for the live edges
+        """
+        return (self.live_edges[edges, worlds >> 3] >> (worlds & 7).astype(np.uint8)) & 1 == 1
+
+    def nbytes(self):
+        """Memory used by the worlds
+
+        Returns:
+            int: number of bytes
+        """
+        values = self.live_edges if self.live_edges is not None else self.thresholds
+        return values.nbytes
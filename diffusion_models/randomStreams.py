@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import zlib
+import numpy as np
+
+
+# Philox4x32 multipliers and Weyl key increments (Salmon et al., Random123)
+PHILOX_M = (np.uint64(0xD2511F53), np.uint64(0xCD9E8D57))
+PHILOX_W = (0x9E3779B9, 0xBB67AE85)
+MASK_32 = np.uint64(0xFFFFFFFF)
+
+
+def philox4x32(counter : tuple, key : tuple, n_rounds : int = 10):
+    """Philox4x32 block function, evaluated element-wise on arrays of counters
+
+    Args:
+        counter (tuple): four arrays (or integers) of 32-bit counter words, broadcast together
+        key (tuple): two 32-bit key words
+        n_rounds (int, optional): number of rounds. Defaults to 10.
+
+    Returns:
+        tuple: four uint64 arrays holding the 32-bit output words
+    """
+    c0, c1, c2, c3 = (np.asarray(word, dtype=np.uint64) & MASK_32 for word in np.broadcast_arrays(*counter))
+    k0, k1 = int(key[0]) & 0xFFFFFFFF, int(key[1]) & 0xFFFFFFFF
+    for _ in range(n_rounds):
+        product0 = c0 * PHILOX_M[0]
+        product1 = c2 * PHILOX_M[1]
+        c0, c1, c2, c3 = (
+            (product1 >> np.uint64(32)) ^ c1 ^ np.uint64(k0),
+            product1 & MASK_32,
+            (product0 >> np.uint64(32)) ^ c3 ^ np.uint64(k1),
+            product0 & MASK_32
+        )
+        k0 = (k0 + PHILOX_W[0]) & 0xFFFFFFFF
+        k1 = (k1 + PHILOX_W[1]) & 0xFFFFFFFF
+    return c0, c1, c2, c3
+
+
+class RandomStreams():
+
+    def __init__(self, seed : int):
+        """Base function for instantiating the counter-based random streams of an instance.
+        A stream is named (e.g. 'construction', 'dynamics', 'agent') and its key is spawned from seed by SeedSequence,
+        so the streams are independent. Each draw is a pure function of (seed, stream, episode, step, index):
+        the draws do not depend on the order in which they are made, so serial, vectorized and parallel runs
+        produce the same values.
+
+        Args:
+            seed (int): root seed
+        """
+        self.seed = seed
+        self._keys = {}
+
+    def _spawn_key(self, stream : str):
+        """Spawn key of a named stream
+
+        Args:
+            stream (str): stream name
+
+        Returns:
+            tuple: spawn key of the SeedSequence of the stream
+        """
+        return (zlib.crc32(stream.encode('utf-8')),)
+
+    def key(self, stream : str):
+        """Get method for the Philox key of a named stream
+
+        Args:
+            stream (str): stream name
+
+        Returns:
+            tuple: two 32-bit key words
+        """
+        if stream not in self._keys:
+            words = np.random.SeedSequence(self.seed, spawn_key=self._spawn_key(stream)).generate_state(2, dtype=np.uint32)
+            self._keys[stream] = (int(words[0]), int(words[1]))
+        return self._keys[stream]
+
+    def uniform(self, stream : str, episode : np.array, step : np.array, index : np.array, low : np.array = 0.0, high : np.array = 1.0):
+        """Uniform draws in [low, high), one per element of the broadcast arguments. The Philox counter is
+        (index, episode, step), with a 64-bit index, and the 53-bit mantissa is built from two output words.
+
+        Args:
+            stream (str): stream name
+            episode (np.array): episode of each draw
+            step (np.array): step of each draw
+            index (np.array): index of each draw, e.g. an edge or a node
+            low (np.array, optional): lower bound. Defaults to 0.0.
+            high (np.array, optional): upper bound. Defaults to 1.0.
+
+        Returns:
+            np.array: draws
+        """
+        index = np.asarray(index, dtype=np.int64).astype(np.uint64)
+        words = philox4x32((index & MASK_32, index >> np.uint64(32), episode, step), self.key(stream))
+        mantissa = (words[0] >> np.uint64(5)) * np.uint64(1 << 26) + (words[1] >> np.uint64(6))
+        return low + (np.asarray(high) - low) * (mantissa.astype(np.float64) * 2.0 ** -53)
+
+    def generator(self, stream : str, *position : int):
+        """Numpy generator of a named stream at a given position, e.g. (episode, step). The generator is
+        a pure function of its key: asking again for the same stream and position gives the same draws.
+
+        Args:
+            stream (str): stream name
+            position (int): integers identifying the position in the stream
+
+        Returns:
+            np.random.Generator: Philox generator
+        """
+        spawn_key = self._spawn_key(stream) + tuple(int(value) for value in position)
+        return np.random.Generator(np.random.Philox(np.random.SeedSequence(self.seed, spawn_key=spawn_key)))
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+import math
+import numpy as np
+import multiprocessing as mp
+from .socialNetwork import SocialNetwork
+
+
+# reversed graph used by the sampling workers
+_worker_graph = None
+
+
+def _set_worker_graph(graph : dict):
+    """Pool initializer: save the reversed graph used to sample the reverse reachable sets
+
+    Args:
+        graph (dict): reversed CSR arrays and sampling parameters
+    """
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _segments(indptr : np.array, ids : np.array):
+    """Positions of the CSR segments of the given ids, concatenated
+
+    Args:
+        indptr (np.array): CSR offsets
+        ids (np.array): segment indexes
+
+    Returns:
+        np.array: positions in the CSR values array
+    """
+    starts = indptr[ids]
+    counts = indptr[ids + 1] - starts
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+
+def _sample_sets(task : tuple, graph : dict = None):
+    """Sample a chunk of reverse reachable sets with the worker reversed graph.
+    The sets of a batch of roots are expanded together, one BFS layer (ICM) or one walk step (LTM) at a time.
+
+    Args:
+        task (tuple): (seed sequence, number of sets)
+        graph (dict, optional): reversed graph. Defaults to the worker reversed graph.
+
+    Returns:
+        np.array: CSR offsets of the sampled sets
+        np.array: nodes of the sampled sets
+    """
+    seed_sequence, n_sets = task
+    graph = _worker_graph if graph is None else graph
+    rng = np.random.default_rng(seed_sequence)
+    n_nodes = len(graph['indptr']) - 1
+    indptr, indices = graph['indptr'], graph['indices']
+    # number of sets expanded together, bounded to keep the visited flags small
+    batch_size = max(1, min(n_sets, (1 << 22) // max(n_nodes, 1)))
+    visited = np.zeros(batch_size * n_nodes, dtype=bool)
+    set_ids, set_nodes = [], []
+    for start in range(0, n_sets, batch_size):
+        size = min(batch_size, n_sets - start)
+        sets = np.arange(size, dtype=np.int64)
+        nodes = rng.integers(0, n_nodes, size=size)
+        layers_sets, layers_nodes = [sets], [nodes]
+        visited[sets * n_nodes + nodes] = True
+        while sets.shape[0] > 0:
+            if graph['model'] == 'ICM':
+                # each in edge of the frontier is live with its probability
+                edges = _segments(indptr, nodes)
+                sets = np.repeat(sets, indptr[nodes + 1] - indptr[nodes])
+                live = rng.random(edges.shape[0]) < graph['weights'][edges]
+                sets, nodes = sets[live], indices[edges[live]]
+            else:
+                # each node picks at most one in edge, with probability proportional to its weight
+                target = rng.random(sets.shape[0]) * graph['scale'][nodes]
+                live = target < graph['in_weight'][nodes]
+                sets, nodes, target = sets[live], nodes[live], target[live]
+                edges = np.searchsorted(graph['cum_weights'], graph['base'][nodes] + target, side='right')
+                edges = np.minimum(edges, indptr[nodes + 1] - 1)
+                nodes = indices[edges]
+            # keep the nodes reached for the first time
+            keys = np.unique(sets * n_nodes + nodes)
+            keys = keys[~visited[keys]]
+            visited[keys] = True
+            sets, nodes = keys // n_nodes, keys % n_nodes
+            layers_sets.append(sets)
+            layers_nodes.append(nodes)
+        sets = np.concatenate(layers_sets)
+        nodes = np.concatenate(layers_nodes)
+        visited[sets * n_nodes + nodes] = False
+        set_ids.append(sets + start)
+        set_nodes.append(nodes)
+    set_ids = np.concatenate(set_ids)
+    set_nodes = np.concatenate(set_nodes)
+    order = np.argsort(set_ids, kind='stable')
+    set_indptr = np.zeros(n_sets + 1, dtype=np.int64)
+    np.cumsum(np.bincount(set_ids, minlength=n_sets), out=set_indptr[1:])
+    return set_indptr, set_nodes[order].astype(np.int32)
+
+
+class RISIndex():
+
+    def __init__(self, social_net : SocialNetwork, k : int = None, epsilon : float = 0.5, l : float = 1.0,
+                 n_workers : int = None, seed : int = 0, max_sets : int = 10000000):
+        """Base function for instantiating the reverse reachable sets index of an ICM or LTM influence model.
+        The number of sets is chosen with the IMM bounds, so that the greedy seed selection of k nodes on the index
+        is a (1 - 1/e - epsilon)-approximation with probability at least 1 - 1/n^l.
+        The spread estimated by the index is the one of the cascade run until convergence. Under LTM the sets follow the
+        live-edge reduction with uniform random thresholds, which is exact when the in weights of every node sum to at most 1
+        and underestimates the spread otherwise.
+
+        Args:
+            social_net (SocialNetwork): influence model (ICModel or LTModel)
+            k (int, optional): maximum number of seeds. Defaults to 1.
+            epsilon (float, optional): approximation error. Defaults to 0.5.
+            l (float, optional): confidence exponent. Defaults to 1.0.
+            n_workers (int, optional): number of processes, the sets are sampled in the calling process if 0. Defaults to the number of cpus.
+            seed (int, optional): root seed of the sampling streams. Defaults to 0.
+            max_sets (int, optional): upper bound on the number of sets. Defaults to 10000000.
+
+        Raises:
+            ValueError: influence model not supported
+        """
+        if social_net.influence_type not in ['ICM', 'LTM']:
+            raise ValueError("influence model not supported")
+        self.social_net = social_net
+        self.n_nodes = social_net.graph.n_nodes
+        self.k = max(1, min(k if k is not None else 1, self.n_nodes))
+        self.epsilon = epsilon
+        self.l = l
+        self.max_sets = max_sets
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.n_workers = mp.cpu_count() if n_workers is None else n_workers
+        # reversed graph
+        indptr, indices, edge_ids = social_net.graph.reverse()
+        graph = {
+            'model': social_net.influence_type,
+            'indptr': indptr,
+            'indices': indices
+        }
+        if social_net.influence_type == 'ICM':
+            graph['weights'] = social_net.graph.probability_to_influence[edge_ids]
+        else:
+            # the live edge of a node is drawn with probability weight / max(1, sum of the in weights)
+            weights = social_net.graph.influence_power[edge_ids]
+            graph['cum_weights'] = np.cumsum(weights)
+            graph['base'] = np.concatenate(([0.0], graph['cum_weights']))[indptr[:-1]]
+            graph['in_weight'] = np.bincount(social_net.graph.indices, weights=social_net.graph.influence_power, minlength=self.n_nodes)
+            graph['scale'] = np.maximum(1.0, graph['in_weight'])
+        self._graph = graph
+        # sampled sets
+        self.set_indptr = np.zeros(1, dtype=np.int64)
+        self.set_nodes = np.empty(0, dtype=np.int32)
+        if self.n_workers > 0:
+            self._pool = mp.Pool(self.n_workers, initializer=_set_worker_graph, initargs=(graph,))
+        else:
+            self._pool = None
+        # sample the sets
+        self.theta = self._imm_theta()
+        self._sample(self.theta)
+        self._build_index()
+        self.reset()
+
+    @property
+    def n_sets(self):
+        """Get method for the number of sampled sets
+
+        Returns:
+            int: number of sets
+        """
+        return len(self.set_indptr) - 1
+
+    def _sample(self, n_sets : int):
+        """Sample new sets until the index holds n_sets sets, splitting the work in chunks with independent streams
+
+        Args:
+            n_sets (int): number of sets
+        """
+        n_new = min(n_sets, self.max_sets) - self.n_sets
+        if n_new <= 0:
+            return
+        chunk_size = int(np.ceil(n_new / max(4 * self.n_workers, 1)))
+        sizes = [min(chunk_size, n_new - start) for start in range(0, n_new, chunk_size)]
+        tasks = list(zip(self.seed_sequence.spawn(len(sizes)), sizes))
+        if self._pool is not None:
+            chunks = self._pool.map(_sample_sets, tasks)
+        else:
+            chunks = [_sample_sets(task, self._graph) for task in tasks]
+        indptr_lst, nodes_lst = [self.set_indptr], [self.set_nodes]
+        for set_indptr, set_nodes in chunks:
+            indptr_lst.append(set_indptr[1:] + indptr_lst[-1][-1])
+            nodes_lst.append(set_nodes)
+        self.set_indptr = np.concatenate(indptr_lst)
+        self.set_nodes = np.concatenate(nodes_lst)
+
+    def _build_index(self):
+        """Function to build the inverted index: the sets containing node v are node_sets[node_indptr[v]:node_indptr[v + 1]]
+        """
+        set_ids = np.repeat(np.arange(self.n_sets, dtype=np.int32), np.diff(self.set_indptr))
+        order = np.argsort(self.set_nodes, kind='stable')
+        self.node_sets = set_ids[order]
+        self.node_indptr = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.set_nodes, minlength=self.n_nodes), out=self.node_indptr[1:])
+
+    def _greedy_coverage(self, k : int):
+        """Fraction of the sets covered by the greedy selection of k nodes
+
+        Args:
+            k (int): number of nodes
+
+        Returns:
+            float: covered fraction
+        """
+        self.reset()
+        for _ in range(k):
+            node = int(np.argmax(self.uncovered_count))
+            if self.uncovered_count[node] == 0:
+                break
+            self.mark_covered([node])
+        return self.n_covered / max(self.n_sets, 1)
+
+    def _imm_theta(self):
+        """Number of sets required by the IMM algorithm (Tang et al., 2015), estimating a lower bound of the optimal spread
+
+        Returns:
+            int: number of sets
+        """
+        n, k = self.n_nodes, self.k
+        if n < 2:
+            return 1
+        l = self.l * (1 + math.log(2) / math.log(n))
+        log_binomial = math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+        epsilon_prime = math.sqrt(2) * self.epsilon
+        lambda_prime = (2 + 2 / 3 * epsilon_prime) * (log_binomial + l * math.log(n) + math.log(max(math.log2(n), 1))) * n / epsilon_prime ** 2
+        lower_bound = 1.0
+        for i in range(1, max(int(math.log2(n)), 2)):
+            x = n / 2 ** i
+            self._sample(int(np.ceil(lambda_prime / x)))
+            self._build_index()
+            fraction = self._greedy_coverage(k)
+            if n * fraction >= (1 + epsilon_prime) * x:
+                lower_bound = n * fraction / (1 + epsilon_prime)
+                break
+        alpha = math.sqrt(l * math.log(n) + math.log(2))
+        beta = math.sqrt((1 - 1 / math.e) * (log_binomial + l * math.log(n) + math.log(2)))
+        lambda_star = 2 * n * ((1 - 1 / math.e) * alpha + beta) ** 2 / self.epsilon ** 2
+        return int(min(np.ceil(lambda_star / lower_bound), self.max_sets))
+
+    def reset(self):
+        """Function to mark all the sets as uncovered, as in the empty state
+        """
+        self.covered = np.zeros(self.n_sets, dtype=bool)
+        self.n_covered = 0
+        self.marked = np.zeros(self.n_nodes, dtype=bool)
+        self.uncovered_count = np.diff(self.node_indptr)
+
+    def mark_covered(self, nodes : list):
+        """Function to mark as covered the sets containing the given nodes, updating the counts of the uncovered sets of each node
+
+        Args:
+            nodes (list): influenced nodes
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        nodes = np.unique(nodes[~self.marked[nodes]])
+        if nodes.shape[0] == 0:
+            return
+        self.marked[nodes] = True
+        sets = np.unique(self.node_sets[_segments(self.node_indptr, nodes)])
+        sets = sets[~self.covered[sets]]
+        self.covered[sets] = True
+        self.n_covered += sets.shape[0]
+        # the nodes of the newly covered sets lose one uncovered set each, in place
+        np.subtract.at(self.uncovered_count, self.set_nodes[_segments(self.set_indptr, sets)], 1)
+
+    def update_state(self, state : set):
+        """Function to condition the index on the currently influenced nodes
+
+        Args:
+            state (set): graph nodes set of the influenced nodes
+        """
+        if len(state) > 0:
+            self.mark_covered(np.fromiter(state, dtype=np.int64))
+
+    def marginal_gain(self, nodes : list):
+        """Estimated number of additional influenced nodes when seeding each node, given the covered sets
+
+        Args:
+            nodes (list): candidate nodes
+
+        Returns:
+            np.array: marginal gain of each node
+        """
+        return self.uncovered_count[np.asarray(nodes, dtype=np.int64)] * self.n_nodes / max(self.n_sets, 1)
+
+    def coverage(self, nodes : list):
+        """Estimated number of influenced nodes when seeding the given nodes, together with the already covered sets
+
+        Args:
+            nodes (list): seed nodes
+
+        Returns:
+            float: estimated spread
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        sets = np.unique(self.node_sets[_segments(self.node_indptr, nodes)])
+        n_covered = self.n_covered + int((~self.covered[sets]).sum())
+        return n_covered * self.n_nodes / max(self.n_sets, 1)
+
+    def close(self):
+        """Stop the sampling workers
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
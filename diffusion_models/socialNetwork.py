@@ -1,16 +1,371 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 import networkx as nx
-import matplotlib.pyplot as plt
+from .randomStreams import RandomStreams
+from .compactStorage import QuantizedArray, compact_graph
+from .graphPlotter import GraphPlotter
+
+
+def _read_only(values : np.array):
+    """Set an array as read-only
+
+    Args:
+        values (np.array): array
+
+    Returns:
+        np.array: the same array, not writeable
+    """
+    values.setflags(write=False)
+    return values
+
+
+class CSRGraph():
+
+    # names of the node and edge arrays stored next to the topology
+    NODE_ARRAYS = ('cost', 'status', 'type', 'influence', 'resistance')
+    EDGE_ARRAYS = ('probability_to_influence', 'influence_power')
+
+    def __init__(self, indptr : np.array, indices : np.array):
+        """Base function for instantiating the compact graph representation.
+        The successors of node u are indices[indptr[u]:indptr[u + 1]], and the edge
+        arrays are aligned with indices.
+
+        Args:
+            indptr (np.array): CSR offsets, of length n_nodes + 1
+            indices (np.array): CSR successor indexes, of length n_edges
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.n_nodes = len(self.indptr) - 1
+        self.n_edges = len(self.indices)
+        # node arrays
+        self.cost = np.ones(self.n_nodes, dtype=np.float64)
+        self.status = np.zeros(self.n_nodes, dtype=np.uint8)
+        self.type = np.zeros(self.n_nodes, dtype=np.int64)
+        self.influence = np.zeros(self.n_nodes, dtype=np.float64)
+        self.resistance = np.zeros(self.n_nodes, dtype=np.float64)
+        # edge arrays, allocated by the diffusion model using them
+        self.probability_to_influence = None
+        self.influence_power = None
+        # lazily computed edge sources
+        self._sources = None
+
+    @classmethod
+    def from_networkx(cls, g : nx.DiGraph):
+        """Build the compact representation of a directed networkx graph.
+        Nodes are relabeled to 0..n_nodes-1 following the order of g.nodes.
+
+        Args:
+            g (nx.DiGraph): directed graph
+
+        Returns:
+            CSRGraph: compact graph
+            np.array: original label of each node
+        """
+        n_nodes = g.number_of_nodes()
+        node_labels = np.fromiter(g.nodes, dtype=np.int64, count=n_nodes)
+        edges = np.array(list(g.edges()), dtype=np.int64).reshape(-1, 2)
+        # map labels to indexes when the graph is not already labeled 0..n_nodes-1
+        if not np.array_equal(node_labels, np.arange(n_nodes)):
+            index = {label: i for i, label in enumerate(node_labels.tolist())}
+            edges = np.array(
+                [index[label] for label in edges.ravel().tolist()],
+                dtype=np.int64
+            ).reshape(-1, 2)
+        # g.edges() is grouped by source following the node order
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edges[:, 0], minlength=n_nodes), out=indptr[1:])
+        return cls(indptr, edges[:, 1]), node_labels
+
+    @classmethod
+    def from_arrays(cls, arrays : dict):
+        """Build the compact representation from the dictionary returned by arrays(), without copying
+
+        Args:
+            arrays (dict): topology, node and edge arrays
+
+        Returns:
+            CSRGraph: compact graph
+        """
+        graph = cls(arrays['indptr'], arrays['indices'])
+        # keep the int32 offsets of the compact storage
+        graph.indptr = arrays['indptr']
+        for name in cls.NODE_ARRAYS + cls.EDGE_ARRAYS:
+            if name in arrays:
+                setattr(graph, name, arrays[name])
+        return graph
+
+    def arrays(self):
+        """Get method for the topology, node and edge arrays
+
+        Returns:
+            dict: array name -> array, skipping the edge arrays not allocated
+        """
+        arrays = {
+            'indptr': self.indptr,
+            'indices': self.indices
+        }
+        for name in self.NODE_ARRAYS + self.EDGE_ARRAYS:
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+        return arrays
+
+    def compact(self, edge_dtype : str = 'uint8', scale : float = None, scales : dict = None):
+        """Function to convert the arrays to the compact storage, see compactStorage.compact_graph()
+
+        Args:
+            edge_dtype (str, optional): dtype of the quantized edge arrays, 'uint8' or 'uint16'. Defaults to 'uint8'.
+            scale (float, optional): dequantization scale of the edge arrays. Defaults to the largest value over the largest code.
+            scales (dict, optional): dequantization scale of each edge array, overriding scale. Defaults to None.
+        """
+        compact_graph(self, edge_dtype, scale, scales)
+
+    def memory_report(self):
+        """Get method for the memory used by each array, including the edge sources if they were computed
+
+        Returns:
+            dict: array name -> {'dtype', 'nbytes', 'bytes_per_edge'}, plus a 'total' entry
+        """
+        arrays = self.arrays()
+        if self._sources is not None:
+            arrays['sources'] = self._sources
+        report = {}
+        for name, values in arrays.items():
+            dtype = values.codes.dtype if isinstance(values, QuantizedArray) else values.dtype
+            report[name] = {
+                'dtype': str(dtype),
+                'nbytes': int(values.nbytes),
+                'bytes_per_edge': values.nbytes / max(self.n_edges, 1)
+            }
+        total = sum(entry['nbytes'] for entry in report.values())
+        report['total'] = {'dtype': '', 'nbytes': total, 'bytes_per_edge': total / max(self.n_edges, 1)}
+        return report
+
+    def to_networkx(self):
+        """Build a networkx view of the graph carrying the node cost and the allocated edge arrays
+
+        Returns:
+            nx.DiGraph: directed graph
+        """
+        g = nx.DiGraph()
+        g.add_nodes_from(range(self.n_nodes))
+        g.add_edges_from(zip(self.sources.tolist(), self.indices.tolist()))
+        nx.set_node_attributes(g, dict(enumerate(self.cost.tolist())), name='cost')
+        nx.set_node_attributes(g, dict(enumerate(self.status.tolist())), name='status')
+        for name in self.EDGE_ARRAYS:
+            values = getattr(self, name)
+            if values is not None:
+                nx.set_edge_attributes(g, dict(zip(g.edges(), values.tolist())), name=name)
+        return g
+
+    @property
+    def sources(self):
+        """Source node of each edge, aligned with indices
+
+        Returns:
+            np.array: edge sources
+        """
+        if self._sources is None:
+            self._sources = np.repeat(
+                np.arange(self.n_nodes, dtype=np.int32),
+                self.out_degree()
+            )
+        return self._sources
+
+    def successors(self, node : int):
+        """Get method for the successors of a node
+
+        Args:
+            node (int): node index
+
+        Returns:
+            np.array: successors indexes
+        """
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def out_edges(self, nodes : np.array):
+        """Get method for the indexes of the out edges of a set of nodes, grouped by node
+
+        Args:
+            nodes (np.array): node indexes
+
+        Returns:
+            np.array: edge indexes, usable on indices and on the edge arrays
+        """
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return offsets + np.arange(offsets.shape[0])
+
+    def weighted_in_sum(self, active : np.array, weights : np.array):
+        """Sparse product between K active-node indicator vectors and the weighted adjacency matrix:
+        result[k, v] is the sum of weights[e] over the edges e = (u, v) with active[k, u].
+        Only the out edges of the active nodes are visited.
+
+        Args:
+            active (np.array): boolean matrix of shape (K, n_nodes), or vector of length n_nodes
+            weights (np.array): edge weights, aligned with indices
+
+        Returns:
+            np.array: incoming weight of each node, with the same shape as active
+        """
+        active_matrix = np.atleast_2d(active)
+        n_worlds = active_matrix.shape[0]
+        worlds, nodes = np.nonzero(active_matrix)
+        edges = self.out_edges(nodes)
+        worlds = np.repeat(worlds, self.indptr[nodes + 1] - self.indptr[nodes])
+        incoming = np.bincount(
+            worlds * self.n_nodes + self.indices[edges],
+            weights=weights[edges],
+            minlength=n_worlds * self.n_nodes
+        ).reshape(n_worlds, self.n_nodes)
+        return incoming.reshape(np.shape(active))
+
+    def reverse(self):
+        """Build the CSR arrays of the predecessors: the predecessors of node v are
+        indices[indptr[v]:indptr[v + 1]] of the returned arrays
+
+        Returns:
+            np.array: CSR offsets of the reversed graph
+            np.array: CSR predecessor indexes
+            np.array: index of each reversed edge in the original edge arrays
+        """
+        edge_ids = np.argsort(self.indices, kind='stable')
+        indptr = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=self.n_nodes), out=indptr[1:])
+        return indptr, self.sources[edge_ids], edge_ids
+
+    def find_edges(self, sources : np.array, targets : np.array):
+        """Get method for the indexes of the edges (sources[i], targets[i]).
+        Only the out edges of the given sources are visited.
+
+        Args:
+            sources (np.array): source of each edge
+            targets (np.array): target of each edge
+
+        Returns:
+            np.array: edge indexes, -1 for the edges not in the graph
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        wanted = sources * self.n_nodes + np.asarray(targets, dtype=np.int64)
+        nodes = np.unique(sources)
+        edges = self.out_edges(nodes)
+        if len(edges) == 0:
+            return np.full(len(wanted), -1, dtype=np.int64)
+        keys = np.repeat(nodes, self.indptr[nodes + 1] - self.indptr[nodes]) * self.n_nodes + self.indices[edges]
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        position = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        return np.where(keys[position] == wanted, edges[order][position], -1)
+
+    def add_nodes(self, n_added : int):
+        """Function to append isolated nodes, with the default node arrays of __init__
+
+        Args:
+            n_added (int): number of new nodes
+        """
+        self.indptr = np.concatenate([self.indptr, np.full(n_added, self.indptr[-1], dtype=np.int64)])
+        for name in self.NODE_ARRAYS:
+            values = getattr(self, name)
+            default = 1 if name == 'cost' else 0
+            setattr(self, name, np.concatenate([values, np.full(n_added, default, dtype=values.dtype)]))
+        self.n_nodes += n_added
+
+    def splice_edges(self, removed : np.array, sources : np.array, targets : np.array, values : dict = None):
+        """Function to remove the edges with the given indexes and to add the edges (sources[i], targets[i]) after
+        the successors of their source. The topology and the allocated edge arrays are moved once for the whole batch,
+        so the mutations should be applied in batches.
+
+        Args:
+            removed (np.array): indexes of the edges to remove
+            sources (np.array): source of each new edge
+            targets (np.array): target of each new edge
+            values (dict, optional): edge array name -> values of the new edges, zeros for the arrays not given. Defaults to None.
+
+        Returns:
+            dict: 'keep' (mask of the kept edges among the old ones), 'added' (mask of the new edges among the
+                spliced ones) and 'added_position' (index of each new edge), to move other edge-aligned arrays with splice_array()
+        """
+        values = {} if values is None else values
+        removed = np.unique(np.asarray(removed, dtype=np.int64))
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        keep = np.ones(self.n_edges, dtype=bool)
+        keep[removed] = False
+        removed_sources = np.searchsorted(self.indptr, removed, side='right') - 1
+        # the new edges follow the kept successors of their source, in the given order
+        order = np.argsort(sources, kind='stable')
+        end = self.indptr[sources[order] + 1]
+        added_position = np.empty(len(sources), dtype=np.int64)
+        added_position[order] = end - np.searchsorted(removed, end, side='left') + np.arange(len(sources))
+        # the kept edges keep their order in the other positions
+        added = np.zeros(self.n_edges - len(removed) + len(sources), dtype=bool)
+        added[added_position] = True
+        # new topology
+        out_degree = self.out_degree() - np.bincount(removed_sources, minlength=self.n_nodes) + np.bincount(sources, minlength=self.n_nodes)
+        self.indptr = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        np.cumsum(out_degree, out=self.indptr[1:])
+        splice = {
+            'keep': keep,
+            'added': added,
+            'added_position': added_position
+        }
+        self.indices = self.splice_array(self.indices, splice, targets)
+        for name in self.EDGE_ARRAYS:
+            if getattr(self, name) is not None:
+                setattr(self, name, self.splice_array(getattr(self, name), splice, values.get(name, 0)))
+        self.n_edges = len(self.indices)
+        self._sources = None
+        return splice
+
+    @staticmethod
+    def splice_array(values : np.array, splice : dict, added : np.array):
+        """Move an edge-aligned array as splice_edges() moved the edges
+
+        Args:
+            values (np.array): array aligned with the edges before the splice, one row per edge
+            splice (dict): data returned by splice_edges()
+            added (np.array): rows of the new edges
+
+        Returns:
+            np.array: array aligned with the edges after the splice
+        """
+        if isinstance(values, QuantizedArray):
+            return QuantizedArray(CSRGraph.splice_array(values.codes, splice, values.quantize(added)), values.scale)
+        spliced = np.empty((len(splice['added']),) + values.shape[1:], dtype=values.dtype)
+        spliced[~splice['added']] = values[splice['keep']]
+        spliced[splice['added_position']] = added
+        return spliced
+
+    def out_degree(self):
+        """Get method for the number of successors of each node
+
+        Returns:
+            np.array: out degree of each node
+        """
+        return np.diff(self.indptr)
+
+    def degree(self):
+        """Get method for the total (in + out) degree of each node
+
+        Returns:
+            np.array: degree of each node
+        """
+        return self.out_degree() + np.bincount(self.indices, minlength=self.n_nodes)
 
 
 class SocialNetwork():
 
-    def __init__(self, settings : dict):
+    # edge array of the diffusion model, set by the edge values given to mutate()
+    EDGE_ARRAY = None
+
+    def __init__(self, settings : dict, graph : CSRGraph = None, node_labels : np.array = None):
         """Base function for instantiating the social network graph
 
         Args:
             settings (dict): dictionary with settings parameters
+            graph (CSRGraph, optional): compiled graph with its node and edge arrays, generated from settings if None. Defaults to None.
+            node_labels (np.array, optional): original label of each node of graph. Defaults to None.
 
         Raises:
             Exception: Influence value not valid
@@ -28,8 +383,48 @@ class SocialNetwork():
         self.influence_type = influence_type
         # initialize state: it contains the indexes of all the active nodes
         self.state = set()
+        # networkx view, built on demand
+        self._g = None
+        # rasterizing plotter with its layout, built on the first plot
+        self.plotter = None
+        # time and memory spent reading a real graph
+        self.load_report = None
+        # work done by apply_influence, counted only when the counters are set
+        self.counters = None
+        # graph mutations: number of mutate() calls, nodes removed and index of the node labels, built on demand
+        self.version = 0
+        self.removed = None
+        self._label_index = None
+        # pre-sampled worlds of the model, repaired by mutate(), and the world of the episodes
+        self.worlds = None
+        self.world = 0
+        self.cost_settings = cost_settings
+        # random streams: with random_streams the construction draws come from their own generator, and each
+        # draw of the diffusion is a pure function of (seed, episode, step, index), the position being set by the env
+        self.streams = RandomStreams(seed_settings) if settings.get('random_streams', False) else None
+        self.construction_rng = np.random if self.streams is None else self.streams.generator('construction')
+        # source of the diffusion draws without the random streams, e.g. a local generator of a simulation task
+        self.diffusion_rng = np.random
+        self.position = (0, 0)
         # generate graph
-        self.generate_graph(graph_settings, cost_settings, seed_settings)
+        if graph is None:
+            self.generate_graph(graph_settings, cost_settings, seed_settings)
+        else:
+            self.graph = graph
+            self.node_labels = np.arange(graph.n_nodes) if node_labels is None else node_labels
+            self.max_degree = self.reference_degree()
+
+    @property
+    def g(self):
+        """Networkx view of the social network graph, built on first access.
+        The diffusion models run on self.graph: the view copies its arrays when it is built.
+
+        Returns:
+            nx.DiGraph: directed graph
+        """
+        if self._g is None:
+            self._g = self.graph.to_networkx()
+        return self._g
 
     def generate_graph(self, graph_settings : dict, cost_settings : dict, seed_settings : int):
         """Function that generates the graph based on input parameters
@@ -42,81 +437,100 @@ class SocialNetwork():
         Raises:
             ValueError: Graph name not know
         """
+        if graph_settings.get('generator', 'networkx') == 'native':
+            # imported here: the generators build a CSRGraph
+            from .graphGenerators import generate
+            # array generators, the directed edges are written in the compact representation directly
+            self.graph, self.node_labels = generate(graph_settings, seed_settings)
+            self._g = None
+            self.assign_cost(cost_settings)
+            return
         if graph_settings['name'] =='scale_free_graph':
-            self.g = nx.generators.directed.scale_free_graph(
-                graph_settings['n_nodes'], 
+            g = nx.generators.directed.scale_free_graph(
+                graph_settings['n_nodes'],
                 graph_settings['alfa'],
-                graph_settings['beta'], 
-                graph_settings['gamma'],  
-                graph_settings['delta_in'],  
+                graph_settings['beta'],
+                graph_settings['gamma'],
+                graph_settings['delta_in'],
                 graph_settings['delta_out'],
                 seed=seed_settings
             )
         elif graph_settings['name'] =='erdos_renyi':
-            self.g = nx.erdos_renyi_graph(
+            g = nx.erdos_renyi_graph(
                 graph_settings['n_nodes'],
                 graph_settings['p'],
                 directed=True,
                 seed=seed_settings
             )
         elif graph_settings['name'] =='watt_strogatz':
-            self.g = nx.watts_strogatz_graph(
+            g = nx.watts_strogatz_graph(
                 graph_settings['n_nodes'],
                 int(graph_settings['n_nodes']/graph_settings['n_neigh']),
                 graph_settings['edge_prob'],
                 seed=seed_settings
             )
         elif graph_settings['name'] =='regular_random':
-            self.g = nx.random_regular_graph(
+            g = nx.random_regular_graph(
                 graph_settings['node_degree'],
                 graph_settings['n_nodes'],
                 seed=seed_settings
             )
         elif graph_settings['name'] =='barabasi_albert':
-            self.g = nx.barabasi_albert_graph(
-                n=graph_settings['n_nodes'], 
+            g = nx.barabasi_albert_graph(
+                n=graph_settings['n_nodes'],
                 m=graph_settings['stub'],
                 seed=seed_settings
             )
         elif graph_settings['name'] =='power':
-            self.g = nx.powerlaw_cluster_graph(
-                graph_settings['n_nodes'], 
+            g = nx.powerlaw_cluster_graph(
+                graph_settings['n_nodes'],
                 graph_settings['stubs'],
                 graph_settings['prob'],
                 seed=seed_settings
             )
         elif graph_settings['name'] =='random_lobster':
-            self.g = nx.random_lobster(
-                graph_settings['n_nodes'], 
+            g = nx.random_lobster(
+                graph_settings['n_nodes'],
                 graph_settings['p1'],
                 graph_settings['p2'],
                 seed=seed_settings
             )
         elif graph_settings['name'] =='real_graph':
-            self.g = nx.read_edgelist(
+            # imported here: the reader builds a CSRGraph
+            from .edgeListReader import read_edge_list
+            # streaming reader, the same graph as nx.read_edgelist without the networkx objects
+            self.graph, self.node_labels, self.load_report = read_edge_list(
                 graph_settings['file_path'],
-                nodetype=int,
-                create_using=nx.DiGraph()
+                trace_memory=graph_settings.get('trace_memory', False)
             )
+            self._g = None
+            self.assign_cost(cost_settings)
+            return
         else:
             raise ValueError('Graph name not know')
 
         # transforming in a directed graph if needed
-        if isinstance(self.g, nx.Graph):
-            self.g = nx.DiGraph(
-                nx.to_directed(self.g)
+        if isinstance(g, nx.Graph):
+            g = nx.DiGraph(
+                nx.to_directed(g)
             )
 
+        # compile the compact representation, the networkx graph is dropped
+        self.graph, self.node_labels = CSRGraph.from_networkx(g)
+        self._g = None
+
         # the cost of a node is equal to the number of its successors
         self.assign_cost(cost_settings)
 
-        # set status values
-        nx.set_node_attributes(
-            self.g,
-            values=0,
-            name="status"
-        )
-    
+    def reference_degree(self):
+        """Degree used to normalize the node costs and influences.
+        It is the degree of the node with the largest label, as returned by max(g.degree)[1] in networkx.
+
+        Returns:
+            int: reference degree
+        """
+        return int(self.graph.degree()[np.argmax(self.node_labels)])
+
     def assign_cost(self, cost_settings : dict):
         """Function to assign the social network graph node cost,
         given a defined policy: random proportional, proportional
@@ -127,23 +541,112 @@ class SocialNetwork():
         Raises:
             ValueError: invalid cost_name
         """
-        # initialize attribute
-        nx.set_node_attributes(self.g, values = 1, name = "cost")
-        # set maximum degree
-        max_degree = max(self.g.degree)[1]
+        # set maximum degree, kept to price the nodes touched by the mutations
+        self.max_degree = self.reference_degree()
+        self.graph.cost = self._node_cost(self.graph.out_degree(), cost_settings)
+
+    def _node_cost(self, n_successors : np.array, cost_settings : dict):
+        """Function to price nodes from their number of successors
+
+        Args:
+            n_successors (np.array): out degree of each node
+            cost_settings (dict): dictionary with cost settings parameters
+
+        Raises:
+            ValueError: invalid cost_name
+
+        Returns:
+            np.array: cost of each node
+        """
         if cost_settings["cost_name"] == 'random_proportional':
-            for node in self.g.nodes:
-                n_successors = len(list(self.g.successors(node)))
-                self.g.nodes[node]['cost'] = np.random.uniform(
-                    low=0, high= n_successors / max_degree
-                )
+            return self.construction_rng.uniform(
+                low=0, high= n_successors / self.max_degree
+            )
         elif cost_settings["cost_name"] == "proportional":
-            for node in self.g.nodes:
-                n_successors = len(list(self.g.successors(node)))
-                self.g.nodes[node]['cost'] = (n_successors + 0.01) / max_degree * cost_settings["max_price"]
+            return (n_successors + 0.01) / self.max_degree * cost_settings["max_price"]
         else:
             raise ValueError("invalid cost_name")
 
+    def update_cost(self, nodes : np.array):
+        """Function to price again the given nodes, e.g. after a change of their successors.
+        The degree normalizing the costs is the one of the graph when the costs were assigned, so the other nodes keep their cost.
+        The removed nodes get an infinite cost and can never be chosen.
+
+        Args:
+            nodes (np.array): node indexes
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        if not self.graph.cost.flags.writeable:
+            self.graph.cost = self.graph.cost.copy()
+        self.graph.cost[nodes] = self._node_cost(self.graph.out_degree()[nodes], self.cost_settings)
+        if self.removed is not None:
+            self.graph.cost[nodes[self.removed[nodes]]] = np.inf
+
+    def draw_uniform(self, index : np.array, low : np.array = 0.0, high : np.array = 1.0, episodes : np.array = None, steps : np.array = None):
+        """Uniform draws of the diffusion, one per index. With the random streams each draw is a pure function of
+        (seed, episode, step, index), so every engine draws the same value for the same edge; otherwise the draws
+        come from diffusion_rng, the global numpy state by default, in order.
+
+        Args:
+            index (np.array): index of each draw, e.g. the edge
+            low (np.array, optional): lower bound. Defaults to 0.0.
+            high (np.array, optional): upper bound. Defaults to 1.0.
+            episodes (np.array, optional): episode of each draw, e.g. in a batch. Defaults to the episode of self.position.
+            steps (np.array, optional): step of each draw. Defaults to the step of self.position.
+
+        Returns:
+            np.array: draws
+        """
+        if self.streams is None:
+            return self.diffusion_rng.uniform(low, high, size=np.shape(index))
+        episode, step = self.position
+        return self.streams.uniform(
+            'dynamics',
+            episode if episodes is None else episodes,
+            step if steps is None else steps,
+            index,
+            low,
+            high
+        )
+
+    def batch_worlds(self, batch : dict):
+        """Get method for the world of each row of a batch, when worlds are set by set_world()
+
+        Args:
+            batch (dict): per-episode arrays created by new_batch()
+
+        Returns:
+            np.array: world of each row, the current world if the batch does not set them
+        """
+        if 'world' in batch:
+            return batch['world']
+        return np.full(batch['state'].shape[0], self.world, dtype=np.int64)
+
+    def batch_episodes(self, batch : dict):
+        """Get method for the episode of each row of a batch, used as key of the random streams
+
+        Args:
+            batch (dict): per-episode arrays created by new_batch()
+
+        Returns:
+            np.array: episode of each row, the row index if the batch does not set them
+        """
+        if 'episode' in batch:
+            return batch['episode']
+        return np.arange(batch['state'].shape[0])
+
+    def count_work(self, frontier_size : int, edges_examined : int, random_draws : int):
+        """Function to add the work of apply_influence to the counters, to be called only when they are set
+
+        Args:
+            frontier_size (int): number of nodes trying to influence their successors
+            edges_examined (int): number of out edges visited
+            random_draws (int): number of random numbers drawn
+        """
+        self.counters['frontier_size'] += int(frontier_size)
+        self.counters['edges_examined'] += int(edges_examined)
+        self.counters['random_draws'] += int(random_draws)
+
     def get_n_influenced(self):
         """Get method for the influenced nodes number
 
@@ -161,33 +664,287 @@ class SocialNetwork():
         Returns:
             float: total paid nodes cost
         """
-        tot = 0.0
-        for node in action:
-            tot += self.g.nodes[node]['cost']
-        return tot
+        if len(action) == 0:
+            return 0.0
+        return float(self.graph.cost[np.asarray(action, dtype=np.int64)].sum())
+
+    def new_batch(self, n_episodes : int):
+        """Function to allocate the per-episode arrays used by apply_influence_batch() to run
+        n_episodes episodes in lockstep on this graph
+
+        Args:
+            n_episodes (int): number of episodes
+
+        Returns:
+            dict: arrays of shape (n_episodes, n_nodes); 'state' marks the influenced nodes, plus the
+                'world' of each episode when worlds are set by set_world()
+        """
+        batch = {
+            'state': np.zeros((n_episodes, self.graph.n_nodes), dtype=bool)
+        }
+        if self.worlds is not None:
+            batch['world'] = np.full(n_episodes, self.world, dtype=np.int64)
+        return batch
+
+    def current_batch(self):
+        """Function to copy the state of the current episode into a batch of one episode
+
+        Returns:
+            dict: per-episode arrays, as returned by new_batch(1)
+        """
+        batch = self.new_batch(1)
+        if len(self.state) > 0:
+            batch['state'][0, np.fromiter(self.state, dtype=np.int64)] = True
+        return batch
+
+    def active_nodes(self):
+        """Get method for the influenced nodes as an array
+
+        Returns:
+            np.array: indexes of the influenced nodes
+        """
+        return np.fromiter(self.state, dtype=np.int64, count=len(self.state))
+
+    def reset(self):
+        """Function to clear the data of the current episode, touching only the influenced nodes
+        """
+        self.graph.status[self.active_nodes()] = 0
+        self.state.clear()
 
     def set_state(self, state: np.array):
-        """Function to set the attribute status of the nodes to 1, meaning influenced nodes
+        """Function to replace the influenced nodes of the current episode, setting their attribute status to 1
 
         Args:
             state (np.array): graph nodes set of the influenced nodes
         """
-        for node in self.g.nodes:
-            if node in state:
-                self.g.nodes[node]['status'] = 1
-
-    def plot(self):
-        """Plotting the social network graph, coloring influenced nodes
-        """
-        # define the colors:
-        colors = []
-        for _, state in nx.get_node_attributes(self.g,'status').items():
-            colors.append('red' if state == 1 else 'blue')
-        # draw the graph:
-        nx.draw(
-            self.g,
-            with_labels=False,
-            node_size=25,
-            node_color=colors
-        )
-        plt.show()
+        self.reset()
+        nodes = np.fromiter(state, dtype=np.int64)
+        self.graph.status[nodes] = 1
+        self.state.update(nodes.tolist())
+
+    def snapshot(self):
+        """Function to save the data of the current episode.
+        The snapshot holds read-only arrays of node indexes, so it can be restored any number of times without copying it.
+
+        Returns:
+            dict: 'state' (sorted influenced nodes) and 'status' (influenced nodes with status 1)
+        """
+        nodes = np.sort(self.active_nodes())
+        return {
+            'state': _read_only(nodes),
+            'status': _read_only(nodes[self.graph.status[nodes] == 1])
+        }
+
+    def restore(self, snapshot : dict):
+        """Function to restore the data of an episode saved by snapshot(), touching only the influenced nodes
+
+        Args:
+            snapshot (dict): data returned by snapshot()
+        """
+        self.reset()
+        self.graph.status[snapshot['status']] = 1
+        self.state.update(snapshot['state'].tolist())
+
+    def node_index(self, labels : np.array, add_missing : bool = False):
+        """Get method for the indexes of the nodes with the given original labels
+
+        Args:
+            labels (np.array): original node labels
+            add_missing (bool, optional): add a node for each label not in the graph. Defaults to False.
+
+        Raises:
+            ValueError: label not in the graph
+
+        Returns:
+            np.array: node indexes
+        """
+        if self._label_index is None:
+            self._label_index = {label: i for i, label in enumerate(self.node_labels.tolist())}
+        labels = np.asarray(labels, dtype=np.int64)
+        missing = [label for label in dict.fromkeys(labels.tolist()) if label not in self._label_index]
+        if missing and not add_missing:
+            raise ValueError(f"node {missing[0]} not in the graph")
+        if missing:
+            self.mutate(add_nodes=len(missing), node_labels=missing)
+        return np.array([self._label_index[label] for label in labels.tolist()], dtype=np.int64)
+
+    def mutate(self, add_nodes : int = 0, node_labels : list = None, remove_nodes : np.array = None,
+               add_edges : np.array = None, edge_values : np.array = None, remove_edges : np.array = None):
+        """Function to apply a batch of mutations to the graph between two steps. The nodes are added first, then the
+        nodes and edges are removed and the edges are added. Only the nodes whose successors change are priced
+        again, the edge arrays of the existing edges are patched in place and the topology is spliced once.
+        A removed node keeps its index, so the arrays indexed by node keep their size: it loses its edges and
+        gets an infinite cost. Adding an edge already in the graph sets its value, if given.
+
+        Args:
+            add_nodes (int, optional): number of isolated nodes to append. Defaults to 0.
+            node_labels (list, optional): original labels of the new nodes, following the largest label if None. Defaults to None.
+            remove_nodes (np.array, optional): indexes of the nodes to remove. Defaults to None.
+            add_edges (np.array, optional): (source, target) index pairs of the edges to add, one row per edge. Defaults to None.
+            edge_values (np.array, optional): value of each added edge in the edge array of the model (probability to
+                influence for ICM, influence power for LTM), drawn as in the constructor if None. Defaults to None.
+            remove_edges (np.array, optional): (source, target) index pairs of the edges to remove. Defaults to None.
+
+        Raises:
+            ValueError: edge of a removed node
+
+        Returns:
+            dict: number of 'added_nodes', 'removed_nodes', 'added_edges', 'updated_edges' and 'removed_edges',
+                and the 'touched' nodes, whose cost changed
+        """
+        graph = self.graph
+        touched = [np.empty(0, dtype=np.int64)]
+        # new nodes
+        if add_nodes > 0:
+            if node_labels is None:
+                start = int(self.node_labels.max()) + 1 if len(self.node_labels) > 0 else 0
+                node_labels = np.arange(start, start + add_nodes)
+            new_nodes = np.arange(graph.n_nodes, graph.n_nodes + add_nodes)
+            graph.add_nodes(add_nodes)
+            self.node_labels = np.concatenate([self.node_labels, np.asarray(node_labels, dtype=self.node_labels.dtype)])
+            if self._label_index is not None:
+                self._label_index.update(zip(np.asarray(node_labels).tolist(), new_nodes.tolist()))
+            if self.removed is not None:
+                self.removed = np.concatenate([self.removed, np.zeros(add_nodes, dtype=bool)])
+            self._grow(add_nodes)
+            touched.append(new_nodes)
+        # removed edges, including the ones of the removed nodes
+        removed = [np.empty(0, dtype=np.int64)]
+        n_removed_nodes = 0
+        if remove_nodes is not None and len(remove_nodes) > 0:
+            remove_nodes = np.unique(np.asarray(remove_nodes, dtype=np.int64))
+            if self.removed is None:
+                self.removed = np.zeros(graph.n_nodes, dtype=bool)
+            n_removed_nodes = int((~self.removed[remove_nodes]).sum())
+            self.removed[remove_nodes] = True
+            is_removed = np.zeros(graph.n_nodes, dtype=bool)
+            is_removed[remove_nodes] = True
+            removed.append(graph.out_edges(remove_nodes))
+            removed.append(np.flatnonzero(is_removed[graph.indices]))
+            touched.append(remove_nodes)
+        if remove_edges is not None and len(remove_edges) > 0:
+            remove_edges = np.asarray(remove_edges, dtype=np.int64).reshape(-1, 2)
+            edges = graph.find_edges(remove_edges[:, 0], remove_edges[:, 1])
+            removed.append(edges[edges >= 0])
+        removed = np.unique(np.concatenate(removed))
+        # added edges: the ones already in the graph are updated in place
+        n_added, n_updated = 0, 0
+        sources = np.empty(0, dtype=np.int64)
+        targets = np.empty(0, dtype=np.int64)
+        values = {}
+        if add_edges is not None and len(add_edges) > 0:
+            add_edges = np.asarray(add_edges, dtype=np.int64).reshape(-1, 2)
+            if self.removed is not None and self.removed[add_edges].any():
+                raise ValueError("edge of a removed node")
+            edges = graph.find_edges(add_edges[:, 0], add_edges[:, 1])
+            # an edge removed in the same batch is added again
+            edges[np.isin(edges, removed)] = -1
+            existing = edges >= 0
+            if edge_values is not None:
+                # the missing values (nan) are drawn for the new edges and left unchanged for the existing ones
+                edge_values = np.asarray(edge_values, dtype=np.float64)
+                updated = existing & ~np.isnan(edge_values)
+                if self.EDGE_ARRAY is not None and updated.any():
+                    n_updated = int(updated.sum())
+                    self._update_edge_values(edges[updated], edge_values[updated])
+            # the first occurrence of each new edge is added
+            new = np.flatnonzero(~existing)
+            _, first = np.unique(add_edges[new, 0] * graph.n_nodes + add_edges[new, 1], return_index=True)
+            new = new[np.sort(first)]
+            sources, targets = add_edges[new, 0], add_edges[new, 1]
+            n_added = len(new)
+            values = self.new_edge_values(n_added)
+            if edge_values is not None and self.EDGE_ARRAY is not None:
+                given = edge_values[new]
+                values[self.EDGE_ARRAY] = np.where(np.isnan(given), values[self.EDGE_ARRAY], given)
+        if len(removed) > 0 or n_added > 0:
+            removed_sources = np.searchsorted(graph.indptr, removed, side='right') - 1
+            if self.EDGE_ARRAY is not None:
+                weights = getattr(graph, self.EDGE_ARRAY)
+                self._edge_weights_changed(removed_sources, graph.indices[removed].astype(np.int64), -weights[removed])
+            splice = graph.splice_edges(removed, sources, targets, values)
+            if self.EDGE_ARRAY is not None and n_added > 0:
+                self._edge_weights_changed(sources, targets, values[self.EDGE_ARRAY])
+            if self.worlds is not None:
+                self.worlds.splice(splice, values.get(self.EDGE_ARRAY))
+            touched.extend([removed_sources, sources])
+        touched = np.unique(np.concatenate(touched))
+        self.update_cost(touched)
+        self._out_degree_changed(touched)
+        if add_nodes > 0 and self.worlds is not None:
+            self.worlds.add_nodes(add_nodes)
+        self._g = None
+        self.version += 1
+        return {
+            'added_nodes': add_nodes,
+            'removed_nodes': n_removed_nodes,
+            'added_edges': n_added,
+            'updated_edges': n_updated,
+            'removed_edges': len(removed),
+            'touched': touched
+        }
+
+    def _update_edge_values(self, edges : np.array, values : np.array):
+        """Function to set the value of existing edges in the edge array of the model, in place
+
+        Args:
+            edges (np.array): edge indexes
+            values (np.array): new values
+        """
+        weights = getattr(self.graph, self.EDGE_ARRAY)
+        if not weights.flags.writeable:
+            weights = weights.copy()
+            setattr(self.graph, self.EDGE_ARRAY, weights)
+        sources = np.searchsorted(self.graph.indptr, edges, side='right') - 1
+        self._edge_weights_changed(sources, self.graph.indices[edges].astype(np.int64), values - weights[edges])
+        weights[edges] = values
+        if self.worlds is not None:
+            self.worlds.redraw(edges, values)
+
+    def _grow(self, n_added : int):
+        """Function to extend the arrays of the model indexed by node to the nodes appended by mutate()
+
+        Args:
+            n_added (int): number of new nodes
+        """
+        pass
+
+    def new_edge_values(self, n_added : int):
+        """Function to draw the edge arrays of the edges added by mutate(), as the constructor does
+
+        Args:
+            n_added (int): number of new edges
+
+        Returns:
+            dict: edge array name -> values of the new edges
+        """
+        return {}
+
+    def _edge_weights_changed(self, sources : np.array, targets : np.array, delta : np.array):
+        """Function called by mutate() when the value of edges in the edge array of the model changes
+
+        Args:
+            sources (np.array): source of each edge
+            targets (np.array): target of each edge
+            delta (np.array): change of the value of each edge
+        """
+        pass
+
+    def _out_degree_changed(self, nodes : np.array):
+        """Function called by mutate() for the nodes whose successors changed
+
+        Args:
+            nodes (np.array): node indexes
+        """
+        pass
+
+    def plot(self, path : str = None):
+        """Plotting the social network graph, coloring influenced nodes. The graph is rasterized by a
+        GraphPlotter, built on the first call and reused with its layout by the following ones.
+
+        Args:
+            path (str, optional): image file the frame is saved to, shown if None. Defaults to None.
+        """
+        if self.plotter is None:
+            self.plotter = GraphPlotter(self)
+        self.plotter.plot(path)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import copy
+import numpy as np
+import multiprocessing as mp
+from statistics import NormalDist
+from multiprocessing import shared_memory
+from .socialNetwork import CSRGraph, SocialNetwork
+from .compactStorage import QuantizedArray
+
+
+# influence model rebuilt by each worker on top of the shared graph arrays
+_worker_model = None
+_worker_memory = []
+
+
+def _attach_worker(model : SocialNetwork, specs : dict):
+    """Pool initializer: attach the shared graph arrays and set them in the influence model
+
+    Args:
+        model (SocialNetwork): influence model without graph
+        specs (dict): array name -> (shared memory name, shape, dtype, dequantization scale or None)
+    """
+    global _worker_model
+    arrays = {}
+    for name, (shm_name, shape, dtype, scale) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_memory.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        arrays[name].setflags(write=False)
+        if scale is not None:
+            # quantized edge array: the codes are shared
+            arrays[name] = QuantizedArray(arrays[name], scale)
+    model.graph = CSRGraph.from_arrays(arrays)
+    _worker_model = model
+
+
+def _simulate(task : tuple, model : SocialNetwork = None):
+    """Run a chunk of independent simulations with the worker influence model
+
+    Args:
+        task (tuple): (seed state, n_simulations, seed set, initial batch, n_steps, current_time)
+        model (SocialNetwork, optional): influence model. Defaults to the worker influence model.
+
+    Returns:
+        np.array: number of influenced nodes at the end of each simulation
+    """
+    seed_state, n_simulations, action, initial_batch, n_steps, current_time = task
+    model = _worker_model if model is None else model
+    # the task draws from its own generator, the numpy state of the process is left untouched
+    model.diffusion_rng = np.random.RandomState(seed_state)
+    # replicate the initial state in each simulation
+    batch = {name: np.repeat(values, n_simulations, axis=0) for name, values in initial_batch.items()}
+    times = np.full(n_simulations, current_time, dtype=np.int64)
+    seeds = np.zeros_like(batch['state'])
+    seeds[:, action] = True
+    for step in range(n_steps):
+        model.apply_influence_batch(batch, seeds, times)
+        if step == 0:
+            seeds[:] = False
+        times += 1
+    return batch['state'].sum(axis=1)
+
+
+def _run(task : tuple):
+    """Run a custom task with the worker influence model
+
+    Args:
+        task (tuple): (function, arguments), function(arguments, model) being defined at module level
+
+    Returns:
+        object: value returned by function
+    """
+    function, arguments = task
+    return function(arguments, _worker_model)
+
+
+class SpreadEstimator():
+
+    def __init__(self, social_net : SocialNetwork, n_workers : int = None, seed : int = 0, chunk_size : int = 64):
+        """Base function for instantiating the Monte Carlo spread estimator.
+        The graph arrays are copied once in shared memory, and each worker of the pool attaches to them
+        without copying.
+
+        Args:
+            social_net (SocialNetwork): influence model (ICModel, LTModel or CTModel)
+            n_workers (int, optional): number of processes, the simulations run in the calling process if 0. Defaults to the number of cpus.
+            seed (int, optional): root seed of the random streams. Defaults to 0.
+            chunk_size (int, optional): number of simulations run by a worker task. Defaults to 64.
+        """
+        self.social_net = social_net
+        self.n_workers = mp.cpu_count() if n_workers is None else n_workers
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.chunk_size = chunk_size
+        # influence model without graph and episode data, sent to the workers
+        model = copy.copy(social_net)
+        model.graph = None
+        model._g = None
+        model.state = set()
+        model.env = None
+        model.plotter = None
+        # the simulations draw from the generator seeded by each task
+        model.streams = None
+        self._memory = []
+        self._pool = None
+        if self.n_workers == 0:
+            # run the simulations in the calling process on the original arrays
+            model.graph = social_net.graph
+            self._model = model
+            return
+        # copy the graph arrays in shared memory
+        specs = {}
+        for name, values in social_net.graph.arrays().items():
+            scale = None
+            if isinstance(values, QuantizedArray):
+                values, scale = values.codes, values.scale
+            shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[:] = values
+            self._memory.append(shm)
+            specs[name] = (shm.name, values.shape, values.dtype, scale)
+        self._pool = mp.Pool(self.n_workers, initializer=_attach_worker, initargs=(model, specs))
+
+    def estimate(self, action : list, n_steps : int, n_simulations : int = 1000, initial_batch : dict = None,
+                 current_time : int = 0, confidence : float = 0.95, tolerance : float = None):
+        """Estimate the expected number of influenced nodes when seeding action from a given state and
+        running the diffusion for n_steps steps
+
+        Args:
+            action (list): graph node set of the seed nodes
+            n_steps (int): number of diffusion steps, e.g. the remaining time horizon
+            n_simulations (int, optional): maximum number of simulations. Defaults to 1000.
+            initial_batch (dict, optional): initial state, as returned by current_batch(). Defaults to the current state of social_net.
+            current_time (int, optional): time of the initial state. Defaults to 0.
+            confidence (float, optional): confidence level of the interval. Defaults to 0.95.
+            tolerance (float, optional): stop as soon as the half width of the interval is below it. Defaults to None.
+
+        Returns:
+            dict: 'mean', 'variance', 'ci' (lower and upper bound) and 'n_simulations'
+        """
+        if initial_batch is None:
+            initial_batch = self.social_net.current_batch()
+        action = np.asarray(action, dtype=np.int64)
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        n_tasks = int(np.ceil(n_simulations / self.chunk_size))
+        # one independent stream per task, whatever the worker running it
+        seed_states = [child.generate_state(4) for child in self.seed_sequence.spawn(n_tasks)]
+        # submit the tasks in rounds of one task per worker, checking the interval after each round
+        round_size = max(self.n_workers, 1) if tolerance is not None else n_tasks
+        spreads = []
+        for start in range(0, n_tasks, round_size):
+            tasks = [
+                (seed_states[i], min(self.chunk_size, n_simulations - i * self.chunk_size), action,
+                 initial_batch, n_steps, current_time)
+                for i in range(start, min(start + round_size, n_tasks))
+            ]
+            if self._pool is not None:
+                spreads.extend(self._pool.map(_simulate, tasks))
+            else:
+                spreads.extend(_simulate(task, self._model) for task in tasks)
+            values = np.concatenate(spreads)
+            half_width = z * np.sqrt(values.var(ddof=1) / len(values)) if len(values) > 1 else np.inf
+            if tolerance is not None and half_width <= tolerance:
+                break
+        mean = float(values.mean())
+        return {
+            'mean': mean,
+            'variance': float(values.var(ddof=1)) if len(values) > 1 else 0.0,
+            'ci': (float(mean - half_width), float(mean + half_width)),
+            'n_simulations': len(values)
+        }
+
+    def map(self, function : object, tasks : list):
+        """Run function(task, model) for each task with the influence model of the workers, e.g. to generate
+        simulations other than the spread. function must be defined at module level to be sent to the workers.
+
+        Args:
+            function (object): function of a task and of the influence model
+            tasks (list): arguments of each call
+
+        Returns:
+            list: values returned by function, in the order of the tasks
+        """
+        if self._pool is not None:
+            return self._pool.map(_run, [(function, task) for task in tasks])
+        return [function(task, self._model) for task in tasks]
+
+    def close(self):
+        """Stop the workers and release the shared memory
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        for shm in self._memory:
+            shm.close()
+            shm.unlink()
+        self._memory = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,5 +1,16 @@
 from .dynamicSocialNetwork import DynamicSocialNetwork
+from .vectorDynamicSocialNetwork import VectorDynamicSocialNetwork
+from .stepTrace import StepTrace
+from .candidateIndex import CandidateIndex
+from .edgeEventReplay import EdgeEventReplay
+from .simulationServer import SimulationServer, SimulationClient
 
 __all__ = [
-    "DynamicSocialNetwork"
+    "DynamicSocialNetwork",
+    "VectorDynamicSocialNetwork",
+    "StepTrace",
+    "CandidateIndex",
+    "EdgeEventReplay",
+    "SimulationServer",
+    "SimulationClient"
 ]
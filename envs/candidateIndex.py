@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+class CandidateIndex():
+
+    def __init__(self, social_net : object, max_tries : int = 32):
+        """Base function for instantiating the index of the uninfluenced nodes, sorted by cost.
+        A node is removed as soon as it enters social_net.state, without touching the sorted arrays: the index
+        marks it in its influenced bitmap in O(1) when it meets it, the queries skip the marked nodes, and the
+        arrays are compacted when more than half of their nodes are influenced.
+        Within an episode the nodes are only added to the state, so the arrays always hold every uninfluenced node.
+
+        Args:
+            social_net (object): influence model whose state is indexed
+            max_tries (int, optional): number of rejection sampling tries before filtering the affordable nodes. Defaults to 32.
+        """
+        self.social_net = social_net
+        self.max_tries = max_tries
+        cost = social_net.graph.cost
+        order = np.argsort(cost, kind='stable')
+        self._all = (order, cost[order], np.cumsum(cost[order]))
+        # influenced nodes met by the index, and the list of them to clear the bitmap
+        self.influenced = np.zeros(social_net.graph.n_nodes, dtype=bool)
+        self.marked = []
+        self.reset()
+
+    def update(self, nodes : np.array):
+        """Function to move the given nodes to the position of their current cost, e.g. after a graph mutation.
+        The nodes not in the index yet are added, and the nodes with infinite cost (removed from the graph) are dropped.
+        The other nodes keep their relative order.
+
+        Args:
+            nodes (np.array): node indexes
+        """
+        nodes = np.unique(np.asarray(nodes, dtype=np.int64))
+        order, cost, _ = self._all
+        graph_cost = self.social_net.graph.cost
+        moved = np.zeros(self.social_net.graph.n_nodes, dtype=bool)
+        moved[nodes] = True
+        keep = ~moved[order]
+        order, cost = order[keep], cost[keep]
+        nodes = nodes[np.isfinite(graph_cost[nodes])]
+        nodes = nodes[np.argsort(graph_cost[nodes], kind='stable')]
+        positions = np.searchsorted(cost, graph_cost[nodes], side='right')
+        order = np.insert(order, positions, nodes)
+        cost = np.insert(cost, positions, graph_cost[nodes])
+        self._all = (order, cost, np.cumsum(cost))
+        self.reset()
+
+    def reset(self):
+        """Function to index all the nodes again, to be called when nodes leave the state (reset, set_state, restore).
+        Only the marked nodes are cleared.
+        """
+        self.nodes, self.cost, self.cumulative_cost = self._all
+        if len(self.influenced) != self.social_net.graph.n_nodes:
+            self.influenced = np.zeros(self.social_net.graph.n_nodes, dtype=bool)
+        else:
+            for nodes in self.marked:
+                self.influenced[nodes] = False
+        self.marked = []
+        self.n_marked = 0
+
+    def remove(self, nodes : np.array):
+        """Function to mark influenced nodes, O(1) per node. The nodes already marked are skipped.
+
+        Args:
+            nodes (np.array): node indexes in the state
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        nodes = nodes[~self.influenced[nodes]]
+        if len(nodes) > 0:
+            self.influenced[nodes] = True
+            self.marked.append(nodes)
+            self.n_marked += len(nodes)
+
+    def _sync(self):
+        """Function to mark the nodes of the state not met yet, only when the state has grown since the last call
+        """
+        if self.n_marked < self.social_net.get_n_influenced():
+            self.remove(self.social_net.active_nodes())
+
+    def _compact(self):
+        """Function to drop the influenced nodes from the sorted arrays when they are more than the uninfluenced ones
+        """
+        n_uninfluenced = self.social_net.graph.n_nodes - self.social_net.get_n_influenced()
+        if 2 * n_uninfluenced >= len(self.nodes):
+            return
+        self._sync()
+        keep = ~self.influenced[self.nodes]
+        self.nodes = self.nodes[keep]
+        self.cost = self.cost[keep]
+        self.cumulative_cost = np.cumsum(self.cost)
+
+    def n_candidates(self, budget : float = np.inf):
+        """Get method for the number of stored positions with cost at most budget, found by binary search.
+        It is an upper bound of the affordable uninfluenced nodes.
+
+        Args:
+            budget (float, optional): available budget. Defaults to np.inf.
+
+        Returns:
+            int: number of positions
+        """
+        return int(np.searchsorted(self.cost, budget, side='right'))
+
+    def affordable(self, budget : float = np.inf):
+        """Get method for the uninfluenced nodes with cost at most budget, in increasing cost order
+
+        Args:
+            budget (float, optional): available budget. Defaults to np.inf.
+
+        Returns:
+            np.array: node indexes
+        """
+        self._compact()
+        self._sync()
+        nodes = self.nodes[:self.n_candidates(budget)]
+        return nodes[~self.influenced[nodes]]
+
+    def sample(self, budget : float = np.inf, weighted : bool = False, rng : object = None):
+        """Draw an uninfluenced node with cost at most budget, uniformly or with probability proportional to its cost.
+        The positions are drawn from the affordable prefix of the sorted arrays and the influenced nodes are rejected,
+        so the cost does not depend on the number of nodes.
+
+        Args:
+            budget (float, optional): available budget. Defaults to np.inf.
+            weighted (bool, optional): draw proportionally to the node cost. Defaults to False.
+            rng (object, optional): numpy generator, e.g. from the random streams. Defaults to the global numpy state.
+
+        Returns:
+            int: node index, None if no node is affordable
+        """
+        self._compact()
+        n_candidates = self.n_candidates(budget)
+        if n_candidates == 0:
+            return None
+        total_cost = self.cumulative_cost[n_candidates - 1]
+        weighted = weighted and total_cost > 0
+        state = self.social_net.state
+        draw = np.random if rng is None else rng
+        for _ in range(self.max_tries):
+            if weighted:
+                position = int(np.searchsorted(self.cumulative_cost, draw.uniform(0, total_cost), side='right'))
+                position = min(position, n_candidates - 1)
+            elif rng is None:
+                position = np.random.randint(n_candidates)
+            else:
+                position = int(rng.integers(n_candidates))
+            node = int(self.nodes[position])
+            if self.influenced[node]:
+                continue
+            if node not in state:
+                return node
+            self.remove([node])
+        # most of the affordable nodes are influenced: draw among the filtered ones
+        nodes = self.affordable(budget)
+        if len(nodes) == 0:
+            return None
+        if weighted and self.social_net.graph.cost[nodes].sum() > 0:
+            cost = self.social_net.graph.cost[nodes]
+            return int(draw.choice(nodes, p=cost / cost.sum()))
+        return int(draw.choice(nodes))
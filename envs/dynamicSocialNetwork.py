@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 import gym
+import time
 import numpy as np
-from diffusion_models import ICModel, CTModel, LTModel
+from gym import spaces
+from diffusion_models import ICModel, CTModel, LTModel, GraphPlotter, load_instance
+from diffusion_models.instanceCache import instance_key
+from .stepTrace import StepTrace
+from .candidateIndex import CandidateIndex
+from .edgeEventReplay import EdgeEventReplay
 
 
 class DynamicSocialNetwork(gym.Env):
@@ -15,6 +21,7 @@ class DynamicSocialNetwork(gym.Env):
 
         Raises:
             ValueError: invalid influence_model
+            ValueError: invalid observation
         """
         super(DynamicSocialNetwork, self).__init__()
         # set data from settings
@@ -23,40 +30,88 @@ class DynamicSocialNetwork(gym.Env):
         self.initial_budget = settings['budget']
         self.budget = settings['budget']
         self.l = settings['lambda']
+        # load the compiled instance when a cache directory is given
+        graph, node_labels = None, None
+        if settings.get('instance_cache') is not None:
+            graph, node_labels = load_instance(settings, settings['instance_cache'])
         # create the Social Network
         if settings['influence_model']['type'] == 'LTM':
             self.social_net = LTModel(
-                settings
+                settings, graph, node_labels
             )
         elif settings['influence_model']['type'] == 'ICM':
             self.social_net = ICModel(
-                settings
+                settings, graph, node_labels
             )
         elif settings['influence_model']['type'] == 'CTM': 
             self.social_net = CTModel(
-                self, settings
+                self, settings, graph, node_labels
             )
         else:
             raise ValueError('invalid influence_model')
+        # uninfluenced nodes sorted by cost
+        self.candidates = CandidateIndex(self.social_net)
+        # observation: 'set' (influenced nodes set and budget), 'numpy' (bitmask) or 'packed' (bit-packed bitmask)
+        self.observation = settings.get('observation', 'set')
+        if self.observation not in ['set', 'numpy', 'packed']:
+            raise ValueError("invalid observation")
+        self._build_spaces()
+        # influenced nodes bitmask, updated at each step in the numpy observation modes
+        self.influenced = np.zeros(self.social_net.graph.n_nodes, dtype=bool)
         # Initialize quantities
         self.current_time = 0
         self.total_reward = 0
         self.old_n_nodes_influenced = 0
+        # optional step instrumentation, e.g. {"trace_path": "./results/trace.jsonl", "buffer_size": 1000}
+        instrumentation = settings.get('instrumentation')
+        self.instrumented = instrumentation is not None
+        self.trace = None
+        self.episode = 0
+        if self.instrumented and instrumentation.get('trace_path') is not None:
+            self.trace = StepTrace(instrumentation['trace_path'], instrumentation.get('buffer_size', 1000))
+        # optional edge-event file replayed between the steps, one decision epoch per step of any episode
+        self.epoch = 0
+        self.replay = None
+        if settings.get('edge_events') is not None:
+            self.replay = EdgeEventReplay(settings['edge_events'])
+        # optional plotter settings, e.g. {"layout_cache": "./results/layouts", "size": 1024}
+        if settings.get('plot') is not None:
+            self.social_net.plotter = GraphPlotter(self.social_net, key=instance_key(settings), **settings['plot'])
 
+    def _build_spaces(self):
+        """Function to define the observation and action spaces on the current number of nodes
+        """
+        n_nodes = self.social_net.graph.n_nodes
+        if self.observation == 'packed':
+            state_space = spaces.Box(low=0, high=255, shape=((n_nodes + 7) // 8,), dtype=np.uint8)
+        else:
+            state_space = spaces.MultiBinary(n_nodes)
+        self.observation_space = spaces.Dict({
+            'state': state_space,
+            'budget': spaces.Box(low=-np.inf, high=np.inf, shape=(), dtype=np.float64),
+            'time': spaces.Discrete(self.time_horizon + 1),
+            'action_mask': spaces.MultiBinary(n_nodes)
+        })
+        self.action_space = spaces.MultiBinary(n_nodes)
 
     def reset(self):
-        """Function to reset the status attribute of the nodes and the budget to the initial one
+        """Function to reset the status attribute of the nodes and the budget to the initial one.
+        Only the nodes influenced in the last episode are touched.
 
         Returns:
             list: a set of nodes
             float: initial budget
-
+            (or the dict of the numpy observation modes, see _get_observation())
         """
         self.current_time = 0
-        for node in self.social_net.g.nodes:
-            self.social_net.g.nodes[node]['status'] = 0
+        self.episode += 1
+        self.social_net.reset()
+        self.candidates.reset()
         self.budget = self.initial_budget
-        return (self.social_net.state, self.budget)
+        self.total_reward = 0
+        self.old_n_nodes_influenced = 0
+        self.influenced[:] = False
+        return self._get_observation()
     
     def set_state(self, state : np.array):
         """Function to set the attribute status of the nodes
@@ -65,41 +120,265 @@ class DynamicSocialNetwork(gym.Env):
             state (np.array): graph nodes set of the influenced nodes
         """
         self.social_net.set_state(state)
+        self.candidates.reset()
+        self._sync_influenced()
+
+    def snapshot(self):
+        """Function to save the environment, e.g. before a lookahead rollout.
+        The cost is proportional to the number of influenced nodes, the graph is never copied.
+
+        Returns:
+            dict: snapshot of the influence model, budget, time, episode, rewards and numpy random state
+        """
+        return {
+            'social_net': self.social_net.snapshot(),
+            'budget': self.budget,
+            'current_time': self.current_time,
+            'total_reward': self.total_reward,
+            'old_n_nodes_influenced': self.old_n_nodes_influenced,
+            'epoch': self.epoch,
+            'episode': self.episode,
+            'random_state': np.random.get_state()
+        }
+
+    def restore(self, snapshot : dict):
+        """Function to restore the environment saved by snapshot(). The same snapshot can be restored many times.
+
+        Args:
+            snapshot (dict): data returned by snapshot()
+        """
+        self.social_net.restore(snapshot['social_net'])
+        self.candidates.reset()
+        self._sync_influenced()
+        self.budget = snapshot['budget']
+        self.current_time = snapshot['current_time']
+        self.total_reward = snapshot['total_reward']
+        self.old_n_nodes_influenced = snapshot['old_n_nodes_influenced']
+        self.epoch = snapshot['epoch']
+        self.episode = snapshot['episode']
+        np.random.set_state(snapshot['random_state'])
+
+    def mutate(self, **mutations):
+        """Function to apply a batch of graph mutations between two steps, see SocialNetwork.mutate().
+        The candidate index is repaired for the nodes whose cost changed, and the spaces grow with the new nodes.
+        The graph is not part of the snapshots: restore() does not undo the mutations.
+
+        Args:
+            mutations: arguments of SocialNetwork.mutate()
+
+        Returns:
+            dict: report of SocialNetwork.mutate()
+        """
+        n_nodes = len(self.influenced)
+        report = self.social_net.mutate(**mutations)
+        self._after_mutation(n_nodes, report['touched'])
+        return report
+
+    def _after_mutation(self, n_nodes : int, touched : np.array):
+        """Function to repair the candidate index, the bitmask and the spaces after a graph mutation
+
+        Args:
+            n_nodes (int): number of nodes before the mutation
+            touched (np.array): nodes whose cost changed
+        """
+        n_added = self.social_net.graph.n_nodes - n_nodes
+        if n_added > 0:
+            touched = np.union1d(touched, np.arange(n_nodes, n_nodes + n_added))
+            self.influenced = np.concatenate([self.influenced, np.zeros(n_added, dtype=bool)])
+            self._build_spaces()
+        self.candidates.update(touched)
+
+    def _replay_events(self):
+        """Function to apply the edge events of the replay file with timestamp at most the current epoch.
+        Unknown node labels add new nodes, and only the last event of each edge in the batch is applied.
+        """
+        events = self.replay.pending(self.epoch)
+        if events is None:
+            return
+        n_nodes = len(self.influenced)
+        nodes = self.social_net.node_index(np.concatenate([events['sources'], events['targets']]), add_missing=True)
+        sources, targets = np.split(nodes, 2)
+        # last event of each edge
+        keys = sources * self.social_net.graph.n_nodes + targets
+        _, last = np.unique(keys[::-1], return_index=True)
+        last = np.sort(len(keys) - 1 - last)
+        added = events['added'][last]
+        edges = np.stack([sources[last], targets[last]], axis=1)
+        report = self.social_net.mutate(
+            add_edges=edges[added],
+            edge_values=events['values'][last][added],
+            remove_edges=edges[~added]
+        )
+        self._after_mutation(n_nodes, report['touched'])
 
     def step(self, action : list):
         """Advances the state of the environment given the action from the agent(s)
         Returns the state of the environment, the reward value, whether the simulation is done, current time
 
         Args:
-            action (list): graph node set of the chosen nodes from the agent with get_action() function
+            action (list): graph node set of the chosen nodes from the agent with get_action() function,
+                or boolean vector of length n_nodes, as in action_space
 
         Returns:
-            list: new set of influenced nodes
+            list: new set of influenced nodes (or the dict of the numpy observation modes, see _get_observation())
             float: reward obtained from the action chosen 
             bool: set to true if the current time is equal to the time horizon
-            dict: {'current_time': current_time} 
+            dict: {'current_time': current_time}, plus the 'instrumentation' of the step if enabled
+        """
+        if isinstance(action, np.ndarray) and action.dtype == bool:
+            action = np.flatnonzero(action)
+        if self.replay is not None:
+            self._replay_events()
+        # position of the random streams of the diffusion
+        self.social_net.position = (self.episode, self.current_time)
+        if self.instrumented:
+            return self._instrumented_step(action)
+        reward = self._compute_reward(action)
+        # run influence:
+        self.social_net.apply_influence(action)
+        return self._pay(action, reward)
+
+    def _compute_reward(self, action : list):
+        """Function to compute the reward of the action and save the number of influenced nodes
+
+        Args:
+            action (list): graph node set of the chosen nodes
+
+        Returns:
+            float: reward obtained from the action chosen
         """
-        # compute reward
         action_cost = self.social_net.get_cost(action)
         new_influenced = self.social_net.get_n_influenced() - self.old_n_nodes_influenced
         reward = self.l * new_influenced - action_cost
         # update old_n_nodes_influenced
         self.old_n_nodes_influenced = self.social_net.get_n_influenced()
-        # run influence:
-        self.social_net.apply_influence(action)
+        return reward
+
+    def _pay(self, action : list, reward : float):
+        """Function to update the budget and the time after the diffusion
+
+        Args:
+            action (list): graph node set of the chosen nodes
+            reward (float): reward obtained from the action chosen
+
+        Returns:
+            tuple: the values returned by step()
+        """
         # update budget
         self.budget = self.budget - self.social_net.get_cost(action)
-        # define new state
-        new_state = (self.social_net.state, self.budget)
+        if self.observation != 'set':
+            # the diffused nodes have status 1, the seeds are added as CTM does not set their status
+            np.logical_or(self.influenced, self.social_net.graph.status, out=self.influenced)
+            self.influenced[np.asarray(action, dtype=np.int64)] = True
         # update time
         self.current_time += 1
+        self.epoch += 1
+        # define new state
+        new_state = self._get_observation()
         info = {
             'current_time': self.current_time
         }
         done = self.time_horizon == self.current_time
         return new_state, reward, done, info
 
-    def plot(self):
+    def _instrumented_step(self, action : list):
+        """step() measuring the time of the reward computation, of the diffusion and of the cost accounting,
+        and the work done by the diffusion
+
+        Args:
+            action (list): graph node set of the chosen nodes
+
+        Returns:
+            tuple: the values returned by step(), with the measures in info['instrumentation']
+        """
+        start = time.perf_counter()
+        reward = self._compute_reward(action)
+        reward_end = time.perf_counter()
+        n_influenced = self.social_net.get_n_influenced()
+        self.social_net.counters = {'frontier_size': 0, 'edges_examined': 0, 'random_draws': 0}
+        self.social_net.apply_influence(action)
+        diffusion_end = time.perf_counter()
+        counters = self.social_net.counters
+        self.social_net.counters = None
+        new_state, reward, done, info = self._pay(action, reward)
+        end = time.perf_counter()
+        counters.update({
+            'time_reward': reward_end - start,
+            'time_diffusion': diffusion_end - reward_end,
+            'time_cost': end - diffusion_end,
+            'new_activations': self.social_net.get_n_influenced() - n_influenced,
+            'state_size': self.social_net.get_n_influenced()
+        })
+        info['instrumentation'] = counters
+        if self.trace is not None:
+            record = {'episode': self.episode, 'current_time': self.current_time, 'reward': float(reward)}
+            record.update(counters)
+            self.trace.write(record)
+        return new_state, reward, done, info
+
+    def _sync_influenced(self):
+        """Function to rebuild the influenced nodes bitmask from the state of the influence model
+        """
+        if self.observation != 'set':
+            self.influenced[:] = False
+            self.influenced[self.social_net.active_nodes()] = True
+
+    def action_mask(self):
+        """Get method for the nodes which can be chosen: uninfluenced and affordable with the remaining budget.
+        In the 'set' mode the bitmask is not maintained by the steps, and the mask is built from the state.
+
+        Returns:
+            np.array: boolean vector of length n_nodes
+        """
+        influenced = self.influenced
+        if self.observation == 'set':
+            influenced = np.zeros(self.social_net.graph.n_nodes, dtype=bool)
+            influenced[self.social_net.active_nodes()] = True
+        return ~influenced & (self.social_net.graph.cost <= self.budget)
+
+    def _get_observation(self):
+        """Function to build the observation. In the numpy modes the arrays are fresh read-only copies of the
+        bitmask, so their cost depends only on n_nodes and they never change with the following steps.
+
+        Returns:
+            tuple: influenced nodes set and budget in the 'set' mode, otherwise
+            dict: 'state' (bitmask, bit-packed in the 'packed' mode), 'budget', 'time' and 'action_mask'
+        """
+        if self.observation == 'set':
+            return (self.social_net.state, self.budget)
+        state = np.packbits(self.influenced) if self.observation == 'packed' else self.influenced.copy()
+        action_mask = self.action_mask()
+        state.setflags(write=False)
+        action_mask.setflags(write=False)
+        return {
+            'state': state,
+            'budget': np.array(self.budget, dtype=np.float64),
+            'time': self.current_time,
+            'action_mask': action_mask
+        }
+
+    def close(self):
+        """Function to write the pending records of the trace
+        """
+        if self.trace is not None:
+            self.trace.close()
+        super(DynamicSocialNetwork, self).close()
+
+    def plot(self, path : str = None):
         """Plotting the social network graph, coloring influenced nodes
+
+        Args:
+            path (str, optional): image file the frame is saved to, shown if None. Defaults to None.
+        """
+        self.social_net.plot(path)
+
+    def render(self):
+        """Render the current state as an RGB image, e.g. to record the frames of an episode replayed
+        with social_net.plotter.animate()
+
+        Returns:
+            np.array: image of shape (size, size, 3), influenced nodes in red
         """
-        self.social_net.plot()
+        if self.social_net.plotter is None:
+            self.social_net.plotter = GraphPlotter(self.social_net)
+        return self.social_net.plotter.frame()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+class EdgeEventReplay():
+
+    def __init__(self, file_path : str):
+        """Base function for instantiating the replay of a timestamped edge-event file.
+        Each line is "timestamp op source target [value]", where op is + (edge added, or its value set if the edge
+        exists) or - (edge removed), source and target are original node labels and value is the edge value in the
+        influence model (probability to influence for ICM, influence power for LTM), drawn if missing.
+        Lines starting with # are comments. The events are sorted by timestamp, keeping the file order for ties.
+
+        Args:
+            file_path (str): path of the event file
+
+        Raises:
+            ValueError: invalid event line
+        """
+        self.file_path = file_path
+        timestamps, added, sources, targets, values = [], [], [], [], []
+        with open(file_path, 'r') as fp:
+            for line_number, line in enumerate(fp, start=1):
+                fields = line.split()
+                if not fields or fields[0].startswith('#'):
+                    continue
+                if len(fields) not in [4, 5] or fields[1] not in ['+', '-']:
+                    raise ValueError(f"invalid edge event at line {line_number}: expected 'timestamp op source target [value]'")
+                timestamps.append(float(fields[0]))
+                added.append(fields[1] == '+')
+                sources.append(int(fields[2]))
+                targets.append(int(fields[3]))
+                values.append(float(fields[4]) if len(fields) == 5 else np.nan)
+        order = np.argsort(np.asarray(timestamps, dtype=np.float64), kind='stable')
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)[order]
+        self.added = np.asarray(added, dtype=bool)[order]
+        self.sources = np.asarray(sources, dtype=np.int64)[order]
+        self.targets = np.asarray(targets, dtype=np.int64)[order]
+        self.values = np.asarray(values, dtype=np.float64)[order]
+        # index of the first event not replayed yet
+        self.position = 0
+
+    def __len__(self):
+        """Number of events of the file
+
+        Returns:
+            int: number of events
+        """
+        return len(self.timestamps)
+
+    def pending(self, epoch : float):
+        """Get method for the events not replayed yet with timestamp at most epoch, marking them as replayed
+
+        Args:
+            epoch (float): current decision epoch
+
+        Returns:
+            dict: 'added', 'sources', 'targets' and 'values' arrays of the events, None if there are none
+        """
+        end = int(np.searchsorted(self.timestamps, epoch, side='right'))
+        if end <= self.position:
+            return None
+        events = slice(self.position, end)
+        self.position = end
+        return {
+            'added': self.added[events],
+            'sources': self.sources[events],
+            'targets': self.targets[events],
+            'values': self.values[events]
+        }
+
+    def rewind(self):
+        """Function to replay the events again from the first one
+        """
+        self.position = 0
@@ -0,0 +1,713 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import asyncio
+import itertools
+import numpy as np
+from diffusion_models import ICModel, CTModel, LTModel, load_instance
+
+
+class Session():
+
+    def __init__(self, session_id : int, host : object, row : int):
+        """Base function for instantiating an episode session hosted by an InstanceHost. The session owns a row
+        of the batch of the host and the scalars of a DynamicSocialNetwork episode.
+
+        Args:
+            session_id (int): session identifier
+            host (object): InstanceHost of the instance
+            row (int): row of the session in the batch of the host
+        """
+        self.session_id = session_id
+        self.host = host
+        self.row = row
+        self.episode = 0
+        self.current_time = 0
+        self.budget = host.initial_budget
+        self.total_reward = 0
+        self.old_n_nodes_influenced = 0
+        self.pending = False
+        # snapshots of the session, by identifier
+        self.snapshots = {}
+        # metrics
+        self.opened = time.perf_counter()
+        self.n_steps = 0
+        self.n_episodes = 0
+        self.queue_latency = 0.0
+        self.step_latency = 0.0
+        self.max_step_latency = 0.0
+        self.batch_size = 0
+
+    def metrics(self):
+        """Get method for the metrics of the session
+
+        Returns:
+            dict: 'steps', 'episodes', mean 'queue_latency' (from the request to the start of its batch),
+                mean and max 'step_latency' (from the request to the result) in seconds, 'mean_batch_size'
+                and 'throughput' in steps per second since the session was opened
+        """
+        n_steps = max(self.n_steps, 1)
+        return {
+            'steps': self.n_steps,
+            'episodes': self.n_episodes,
+            'queue_latency': self.queue_latency / n_steps,
+            'step_latency': self.step_latency / n_steps,
+            'max_step_latency': self.max_step_latency,
+            'mean_batch_size': self.batch_size / n_steps,
+            'throughput': self.n_steps / max(time.perf_counter() - self.opened, 1e-9)
+        }
+
+
+class InstanceHost():
+
+    def __init__(self, settings : dict, capacity : int = 64):
+        """Base function for instantiating the host of an instance: the influence model is loaded once (from the
+        compiled instance when settings has instance_cache) and every session of the instance is a row of one
+        batch, as in VectorDynamicSocialNetwork. The rows are stepped together by apply_influence_batch.
+
+        Args:
+            settings (dict): dictionary with settings parameters
+            capacity (int, optional): initial number of rows, doubled when the sessions exceed it. Defaults to 64.
+
+        Raises:
+            ValueError: invalid influence_model
+        """
+        self.settings = settings
+        self.time_horizon = settings['time_horizon']
+        self.initial_budget = settings['budget']
+        self.l = settings['lambda']
+        # time read by the scalar CTM engine, not used by the batched steps
+        self.current_time = 0
+        graph, node_labels = None, None
+        if settings.get('instance_cache') is not None:
+            graph, node_labels = load_instance(settings, settings['instance_cache'])
+        # the instance is generated from settings['seed'] without moving the random stream of the process
+        state = np.random.get_state()
+        np.random.seed(settings['seed'])
+        try:
+            if settings['influence_model']['type'] == 'LTM':
+                self.social_net = LTModel(settings, graph, node_labels)
+            elif settings['influence_model']['type'] == 'ICM':
+                self.social_net = ICModel(settings, graph, node_labels)
+            elif settings['influence_model']['type'] == 'CTM':
+                self.social_net = CTModel(self, settings, graph, node_labels)
+            else:
+                raise ValueError('invalid influence_model')
+        finally:
+            np.random.set_state(state)
+        self.batch = self._new_batch(capacity)
+        self.free = list(range(capacity - 1, -1, -1))
+        # episode number of the next reset, as in VectorDynamicSocialNetwork
+        self.next_episode = 1
+        # step requests waiting for the next batch: (session, action, future, request time)
+        self.pending = []
+        self.flush_handle = None
+        self.lock = asyncio.Lock()
+        self.n_batches = 0
+        self.n_steps = 0
+
+    def _new_batch(self, n_rows : int):
+        """Empty batch of n_rows episodes
+
+        Args:
+            n_rows (int): number of rows
+
+        Returns:
+            dict: per-episode arrays of new_batch(), plus 'episode'
+        """
+        batch = self.social_net.new_batch(n_rows)
+        batch['episode'] = np.zeros(n_rows, dtype=np.int64)
+        return batch
+
+    def allocate(self):
+        """Function to take a free row, doubling the batch when all the rows are used
+
+        Returns:
+            int: row index
+        """
+        if len(self.free) == 0:
+            capacity = len(self.batch['episode'])
+            batch = self._new_batch(2 * capacity)
+            for key, values in self.batch.items():
+                batch[key][:capacity] = values
+            self.batch = batch
+            self.free = list(range(2 * capacity - 1, capacity - 1, -1))
+        return self.free.pop()
+
+    def release(self, row : int):
+        """Function to give back the row of a closed session
+
+        Args:
+            row (int): row index
+        """
+        self.free.append(row)
+
+    def reset(self, session : Session):
+        """Function to start a new episode of the session
+
+        Args:
+            session (Session): session
+        """
+        for key, values in self.batch.items():
+            # the session keeps its world
+            if key != 'world':
+                values[session.row] = 0
+        self.batch['episode'][session.row] = self.next_episode
+        self.next_episode += 1
+        session.episode = int(self.batch['episode'][session.row])
+        session.current_time = 0
+        session.budget = self.initial_budget
+        session.total_reward = 0
+        session.old_n_nodes_influenced = 0
+        session.n_episodes += 1
+
+    def observation(self, session : Session):
+        """Observation of the session, in a form that can be serialized
+
+        Args:
+            session (Session): session
+
+        Returns:
+            dict: 'state' (sorted influenced nodes), 'budget' and 'time'
+        """
+        return {
+            'state': np.flatnonzero(self.batch['state'][session.row]).tolist(),
+            'budget': float(session.budget),
+            'time': session.current_time
+        }
+
+    def step(self, sessions : list, actions : list):
+        """Advance the episodes of the given sessions by one batched diffusion step, computing the reward and
+        paying the cost as DynamicSocialNetwork.step() does
+
+        Args:
+            sessions (list): sessions, each at most once
+            actions (list): graph node set of the chosen nodes of each session
+
+        Returns:
+            list: (observation, reward, done, info) of each session
+        """
+        rows = np.array([session.row for session in sessions], dtype=np.int64)
+        batch = {key: values[rows] for key, values in self.batch.items()}
+        action_matrix = np.zeros((len(sessions), self.social_net.graph.n_nodes), dtype=bool)
+        for i, action in enumerate(actions):
+            action_matrix[i, np.asarray(action, dtype=np.int64)] = True
+        current_time = np.array([session.current_time for session in sessions], dtype=np.int64)
+        n_influenced = batch['state'].sum(axis=1)
+        self.social_net.apply_influence_batch(batch, action_matrix, current_time)
+        for key, values in batch.items():
+            self.batch[key][rows] = values
+        results = []
+        for i, session in enumerate(sessions):
+            action_cost = self.social_net.get_cost(actions[i])
+            reward = self.l * (int(n_influenced[i]) - session.old_n_nodes_influenced) - action_cost
+            session.old_n_nodes_influenced = int(n_influenced[i])
+            session.total_reward += reward
+            session.budget = session.budget - action_cost
+            session.current_time += 1
+            done = session.current_time == self.time_horizon
+            results.append((self.observation(session), reward, done, {'current_time': session.current_time}))
+        self.n_batches += 1
+        self.n_steps += len(sessions)
+        return results
+
+    def snapshot(self, session : Session):
+        """Copy of the episode of the session
+
+        Args:
+            session (Session): session
+
+        Returns:
+            dict: row of the batch and scalars of the session
+        """
+        return {
+            'batch': {key: values[session.row].copy() for key, values in self.batch.items()},
+            'current_time': session.current_time,
+            'budget': session.budget,
+            'total_reward': session.total_reward,
+            'old_n_nodes_influenced': session.old_n_nodes_influenced
+        }
+
+    def restore(self, session : Session, snapshot : dict):
+        """Function to bring the session back to a snapshot
+
+        Args:
+            session (Session): session
+            snapshot (dict): snapshot returned by snapshot()
+        """
+        for key, values in snapshot['batch'].items():
+            self.batch[key][session.row] = values
+        session.episode = int(snapshot['batch']['episode'])
+        session.current_time = snapshot['current_time']
+        session.budget = snapshot['budget']
+        session.total_reward = snapshot['total_reward']
+        session.old_n_nodes_influenced = snapshot['old_n_nodes_influenced']
+
+
+class SimulationServer():
+
+    def __init__(self, instances : dict, window : float = 0.002, max_batch : int = 256):
+        """Base function for instantiating the local simulation server. Each instance is loaded once, on the
+        first session opened on it, and hosts any number of episode sessions. The step requests of the sessions
+        of an instance arriving within window seconds are coalesced into one batched diffusion step, run in a
+        worker thread so that the server keeps accepting requests meanwhile; the requests arriving during a
+        batch form the next one. The methods are coroutines, called in-process or through serve().
+
+        Args:
+            instances (dict): settings of each instance, by name
+            window (float, optional): seconds a step request waits for other requests. Defaults to 0.002.
+            max_batch (int, optional): maximum number of steps of a batch, started at once when reached. Defaults to 256.
+        """
+        self.instances = instances
+        self.window = window
+        self.max_batch = max_batch
+        self.hosts = {}
+        self.sessions = {}
+        self._session_ids = itertools.count(1)
+        self._snapshot_ids = itertools.count(1)
+
+    def _host(self, instance : str):
+        """Get method for the host of an instance, loading it on first use
+
+        Args:
+            instance (str): instance name
+
+        Raises:
+            ValueError: unknown instance
+
+        Returns:
+            InstanceHost: host
+        """
+        if instance not in self.instances:
+            raise ValueError("unknown instance")
+        if instance not in self.hosts:
+            self.hosts[instance] = InstanceHost(self.instances[instance])
+        return self.hosts[instance]
+
+    def _session(self, session_id : int):
+        """Get method for an open session
+
+        Args:
+            session_id (int): session identifier
+
+        Raises:
+            ValueError: unknown session
+
+        Returns:
+            Session: session
+        """
+        if session_id not in self.sessions:
+            raise ValueError("unknown session")
+        return self.sessions[session_id]
+
+    async def open(self, instance : str):
+        """Open a session on an instance, with its first episode reset
+
+        Args:
+            instance (str): instance name
+
+        Returns:
+            int: session identifier
+        """
+        host = self._host(instance)
+        async with host.lock:
+            session = Session(next(self._session_ids), host, host.allocate())
+            host.reset(session)
+        self.sessions[session.session_id] = session
+        return session.session_id
+
+    async def reset(self, session_id : int):
+        """Start a new episode of the session. A step of the session still queued fails with a ValueError.
+
+        Args:
+            session_id (int): session identifier
+
+        Returns:
+            dict: observation, 'state' (sorted influenced nodes), 'budget' and 'time'
+        """
+        session = self._session(session_id)
+        async with session.host.lock:
+            self._drop_pending(session, "step cancelled by reset")
+            session.host.reset(session)
+            return session.host.observation(session)
+
+    async def step(self, session_id : int, action : list):
+        """Advance the episode of the session, in the next batch of its instance
+
+        Args:
+            session_id (int): session identifier
+            action (list): graph node set of the chosen nodes
+
+        Raises:
+            ValueError: invalid action, a step of the session is already pending, or the episode is done
+
+        Returns:
+            dict: observation
+            float: reward
+            bool: set to true if the current time is equal to the time horizon
+            dict: {'current_time': current_time}
+        """
+        session = self._session(session_id)
+        if session.pending:
+            raise ValueError("step already pending")
+        if session.current_time >= session.host.time_horizon:
+            raise ValueError("episode done: reset the session")
+        host = session.host
+        action = [int(node) for node in action]
+        if any(node < 0 or node >= host.social_net.graph.n_nodes for node in action):
+            raise ValueError("invalid action")
+        session.pending = True
+        future = asyncio.get_running_loop().create_future()
+        host.pending.append((session, action, future, time.perf_counter()))
+        if len(host.pending) >= self.max_batch:
+            self._schedule(host, 0)
+        elif host.flush_handle is None:
+            self._schedule(host, self.window)
+        return await future
+
+    def _drop_pending(self, session : Session, reason : str):
+        """Function to remove the queued step of a session before its row changes, failing its request.
+        Called with the lock of the host held, so the step is not running in a batch.
+
+        Args:
+            session (Session): session
+            reason (str): error message of the dropped request
+        """
+        if not session.pending:
+            return
+        host = session.host
+        for request in [request for request in host.pending if request[0] is session]:
+            host.pending.remove(request)
+            if not request[2].done():
+                request[2].set_exception(ValueError(reason))
+        session.pending = False
+
+    def _schedule(self, host : InstanceHost, delay : float):
+        """Function to run the pending steps of a host after delay seconds
+
+        Args:
+            host (InstanceHost): host
+            delay (float): seconds
+        """
+        if host.flush_handle is not None:
+            host.flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        host.flush_handle = loop.call_later(delay, lambda: loop.create_task(self._flush(host)))
+
+    async def _flush(self, host : InstanceHost):
+        """Run the pending steps of a host as one batch
+
+        Args:
+            host (InstanceHost): host
+        """
+        async with host.lock:
+            host.flush_handle = None
+            pending, host.pending = host.pending[:self.max_batch], host.pending[self.max_batch:]
+            if len(pending) == 0:
+                return
+            start = time.perf_counter()
+            sessions = [session for session, _, _, _ in pending]
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    None, host.step, sessions, [action for _, action, _, _ in pending]
+                )
+            except Exception as error:
+                results = [error] * len(pending)
+            end = time.perf_counter()
+            for (session, _, future, requested), result in zip(pending, results):
+                session.pending = False
+                session.n_steps += 1
+                session.batch_size += len(pending)
+                session.queue_latency += start - requested
+                session.step_latency += end - requested
+                session.max_step_latency = max(session.max_step_latency, end - requested)
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        # the requests arrived during the batch already waited
+        if len(host.pending) > 0 and host.flush_handle is None:
+            self._schedule(host, 0)
+
+    async def snapshot(self, session_id : int):
+        """Save the episode of the session on the server, e.g. before a lookahead rollout
+
+        Args:
+            session_id (int): session identifier
+
+        Returns:
+            int: snapshot identifier, valid until the session is closed
+        """
+        session = self._session(session_id)
+        async with session.host.lock:
+            snapshot_id = next(self._snapshot_ids)
+            session.snapshots[snapshot_id] = session.host.snapshot(session)
+        return snapshot_id
+
+    async def restore(self, session_id : int, snapshot_id : int):
+        """Bring the session back to one of its snapshots. A step of the session still queued fails with a ValueError.
+
+        Args:
+            session_id (int): session identifier
+            snapshot_id (int): snapshot identifier returned by snapshot()
+
+        Raises:
+            ValueError: unknown snapshot
+
+        Returns:
+            dict: observation
+        """
+        session = self._session(session_id)
+        if snapshot_id not in session.snapshots:
+            raise ValueError("unknown snapshot")
+        async with session.host.lock:
+            self._drop_pending(session, "step cancelled by restore")
+            session.host.restore(session, session.snapshots[snapshot_id])
+            return session.host.observation(session)
+
+    async def close(self, session_id : int):
+        """Close the session, giving its row back to the host. A step of the session still queued fails with a ValueError.
+
+        Args:
+            session_id (int): session identifier
+
+        Returns:
+            dict: final metrics of the session
+        """
+        session = self._session(session_id)
+        async with session.host.lock:
+            self._drop_pending(session, "step cancelled by close")
+            del self.sessions[session_id]
+            session.host.release(session.row)
+        return session.metrics()
+
+    async def metrics(self, session_id : int = None):
+        """Get method for the metrics of a session, or of the hosts
+
+        Args:
+            session_id (int, optional): session identifier. Defaults to None.
+
+        Returns:
+            dict: metrics of the session (see Session.metrics), or the 'sessions', 'batches', 'steps' and
+                'mean_batch_size' of each loaded instance
+        """
+        if session_id is not None:
+            return self._session(session_id).metrics()
+        sessions = {}
+        for session in self.sessions.values():
+            sessions[session.host] = sessions.get(session.host, 0) + 1
+        return {
+            instance: {
+                'sessions': sessions.get(host, 0),
+                'batches': host.n_batches,
+                'steps': host.n_steps,
+                'mean_batch_size': host.n_steps / max(host.n_batches, 1)
+            } for instance, host in self.hosts.items()
+        }
+
+    async def _handle(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter):
+        """Serve a connection: each line is a JSON request {"id", "op", ...arguments} answered by a line
+        {"id", "result"} or {"id", "error"}. The requests run concurrently, so the steps of the sessions of
+        a client are batched together, and the sessions opened by the connection are closed with it.
+
+        Args:
+            reader (asyncio.StreamReader): connection reader
+            writer (asyncio.StreamWriter): connection writer
+        """
+        operations = {
+            'open': self.open, 'reset': self.reset, 'step': self.step, 'snapshot': self.snapshot,
+            'restore': self.restore, 'close': self.close, 'metrics': self.metrics
+        }
+        opened = set()
+        tasks = set()
+
+        async def answer(request_id, operation, request):
+            try:
+                result = await operations[operation](**request)
+                if isinstance(result, tuple):
+                    result = list(result)
+                response = {'id': request_id, 'result': result}
+            except Exception as error:
+                response = {'id': request_id, 'error': f"{type(error).__name__}: {error}"}
+            if response.get('result') is not None and operation == 'open':
+                opened.add(response['result'])
+            elif operation == 'close':
+                opened.discard(request.get('session_id'))
+            writer.write((json.dumps(response) + '\n').encode('utf-8'))
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                task = asyncio.create_task(answer(request.pop('id', None), request.pop('op', None), request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                await writer.drain()
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            for session_id in opened:
+                if session_id in self.sessions:
+                    await self.close(session_id)
+            writer.close()
+
+    async def serve(self, path : str):
+        """Serve the requests on a Unix socket until cancelled
+
+        Args:
+            path (str): socket path, replaced if it exists
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(self._handle, path=path)
+        async with server:
+            await server.serve_forever()
+
+
+class SimulationClient():
+
+    def __init__(self, path : str):
+        """Base function for instantiating a client of a SimulationServer served on a Unix socket. It has the
+        coroutines of the server, so an agent runs the same code in-process and through the socket.
+        Concurrent requests share the connection.
+
+        Args:
+            path (str): socket path
+        """
+        self.path = path
+        self._reader = None
+        self._writer = None
+        self._futures = {}
+        self._request_ids = itertools.count(1)
+        self._listener = None
+
+    async def connect(self):
+        """Connect to the server
+        """
+        self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        """Resolve the pending requests with the responses of the server
+        """
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self._futures.pop(response['id'])
+            if 'error' in response:
+                future.set_exception(ValueError(response['error']))
+            else:
+                future.set_result(response['result'])
+        for future in self._futures.values():
+            future.set_exception(ConnectionError("connection closed"))
+
+    async def request(self, op : str, **arguments):
+        """Send a request and wait for its result
+
+        Args:
+            op (str): operation, e.g. 'step'
+            arguments: arguments of the operation
+
+        Raises:
+            ValueError: error of the server
+
+        Returns:
+            object: result
+        """
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._futures[request_id] = future
+        self._writer.write((json.dumps({'id': request_id, 'op': op, **arguments}) + '\n').encode('utf-8'))
+        await self._writer.drain()
+        return await future
+
+    async def open(self, instance : str):
+        """Open a session on an instance, see SimulationServer.open
+
+        Args:
+            instance (str): instance name
+
+        Returns:
+            int: session identifier
+        """
+        return await self.request('open', instance=instance)
+
+    async def reset(self, session_id : int):
+        """Start a new episode of the session, see SimulationServer.reset
+
+        Args:
+            session_id (int): session identifier
+
+        Returns:
+            dict: observation
+        """
+        return await self.request('reset', session_id=session_id)
+
+    async def step(self, session_id : int, action : list):
+        """Advance the episode of the session, see SimulationServer.step
+
+        Args:
+            session_id (int): session identifier
+            action (list): graph node set of the chosen nodes
+
+        Returns:
+            tuple: observation, reward, done and info
+        """
+        return tuple(await self.request('step', session_id=session_id, action=[int(node) for node in action]))
+
+    async def snapshot(self, session_id : int):
+        """Save the episode of the session on the server, see SimulationServer.snapshot
+
+        Args:
+            session_id (int): session identifier
+
+        Returns:
+            int: snapshot identifier
+        """
+        return await self.request('snapshot', session_id=session_id)
+
+    async def restore(self, session_id : int, snapshot_id : int):
+        """Bring the session back to one of its snapshots, see SimulationServer.restore
+
+        Args:
+            session_id (int): session identifier
+            snapshot_id (int): snapshot identifier
+
+        Returns:
+            dict: observation
+        """
+        return await self.request('restore', session_id=session_id, snapshot_id=snapshot_id)
+
+    async def close(self, session_id : int = None):
+        """Close a session, or the connection if session_id is None
+
+        Args:
+            session_id (int, optional): session identifier. Defaults to None.
+
+        Returns:
+            dict: final metrics of the session, None for the connection
+        """
+        if session_id is not None:
+            return await self.request('close', session_id=session_id)
+        self._writer.close()
+        await self._writer.wait_closed()
+        await self._listener
+
+    async def metrics(self, session_id : int = None):
+        """Get method for the metrics of a session, or of the hosts, see SimulationServer.metrics
+
+        Args:
+            session_id (int, optional): session identifier. Defaults to None.
+
+        Returns:
+            dict: metrics
+        """
+        return await self.request('metrics', session_id=session_id)
+
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import json
+
+
+class StepTrace():
+
+    def __init__(self, file_path : str, buffer_size : int = 1000):
+        """Base function for instantiating the JSONL trace of the environment steps.
+        The records are kept in memory and appended to the file buffer_size at a time with a single write.
+
+        Args:
+            file_path (str): path of the trace, opened in append mode
+            buffer_size (int, optional): number of records written at once. Defaults to 1000.
+        """
+        self.file_path = file_path
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.fp = open(file_path, 'a')
+
+    def write(self, record : dict):
+        """Function to add a record to the trace
+
+        Args:
+            record (dict): json serializable record
+        """
+        self.buffer.append(json.dumps(record))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Function to write the buffered records
+        """
+        if self.buffer:
+            self.fp.write('\n'.join(self.buffer) + '\n')
+            self.buffer = []
+        self.fp.flush()
+
+    def close(self):
+        """Function to write the buffered records and close the file
+        """
+        if not self.fp.closed:
+            self.flush()
+            self.fp.close()
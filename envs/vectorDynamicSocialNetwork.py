@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from gym import spaces
+from gym.vector import VectorEnv
+from diffusion_models import ICModel, CTModel, LTModel, load_instance
+
+
+class VectorDynamicSocialNetwork(VectorEnv):
+
+    def __init__(self, settings : dict, n_envs : int, social_net : object = None):
+        """Base function for instantiating n_envs dynamic social network episodes stepped in lockstep.
+        The episodes share one influence model (graph and node/edge parameters), and each of them only owns
+        a row of the state matrix and an entry of the budget, time and reward vectors.
+
+        Args:
+            settings (dict): dictionary with settings parameters
+            n_envs (int): number of episodes
+            social_net (object, optional): influence model to share, built from settings if None. Defaults to None.
+
+        Raises:
+            ValueError: invalid influence_model
+        """
+        # set data from settings
+        self.time_horizon = settings['time_horizon']
+        self.g_name = settings['graph_type']
+        self.initial_budget = settings['budget']
+        self.l = settings['lambda']
+        # load the compiled instance when a cache directory is given
+        graph, node_labels = None, None
+        if social_net is None and settings.get('instance_cache') is not None:
+            graph, node_labels = load_instance(settings, settings['instance_cache'])
+        # create the Social Network
+        if social_net is not None:
+            self.social_net = social_net
+        elif settings['influence_model']['type'] == 'LTM':
+            self.social_net = LTModel(
+                settings, graph, node_labels
+            )
+        elif settings['influence_model']['type'] == 'ICM':
+            self.social_net = ICModel(
+                settings, graph, node_labels
+            )
+        elif settings['influence_model']['type'] == 'CTM':
+            self.social_net = CTModel(
+                self, settings, graph, node_labels
+            )
+        else:
+            raise ValueError('invalid influence_model')
+        n_nodes = self.social_net.graph.n_nodes
+        # define the spaces of a single episode
+        observation_space = spaces.Dict({
+            'state': spaces.MultiBinary(n_nodes),
+            'budget': spaces.Box(low=-np.inf, high=np.inf, shape=(), dtype=np.float64),
+            'time': spaces.Discrete(self.time_horizon + 1),
+        })
+        action_space = spaces.MultiBinary(n_nodes)
+        super(VectorDynamicSocialNetwork, self).__init__(n_envs, observation_space, action_space)
+        # Initialize quantities
+        self.batch = self.social_net.new_batch(n_envs)
+        self.budget = np.full(n_envs, self.initial_budget, dtype=np.float64)
+        self.current_time = np.zeros(n_envs, dtype=np.int64)
+        self.total_reward = np.zeros(n_envs, dtype=np.float64)
+        self.old_n_nodes_influenced = np.zeros(n_envs, dtype=np.int64)
+        self._actions = None
+        # episode number of each row, numbered as the episodes of DynamicSocialNetwork so that
+        # the random streams draw the same diffusion
+        self.next_episode = 1
+        self.batch['episode'] = np.zeros(n_envs, dtype=np.int64)
+        self._number_episodes(np.ones(n_envs, dtype=bool))
+
+    def _reset_episodes(self, mask : np.array):
+        """Function to reset the episodes selected by mask
+
+        Args:
+            mask (np.array): boolean vector of the episodes to reset
+        """
+        for key, values in self.batch.items():
+            # the episodes keep their world
+            if key != 'world':
+                values[mask] = 0
+        self.budget[mask] = self.initial_budget
+        self.current_time[mask] = 0
+        self.total_reward[mask] = 0
+        self.old_n_nodes_influenced[mask] = 0
+        self._number_episodes(mask)
+
+    def _number_episodes(self, mask : np.array):
+        """Function to give the next episode numbers to the episodes selected by mask, in row order
+
+        Args:
+            mask (np.array): boolean vector of the starting episodes
+        """
+        n_started = int(mask.sum())
+        self.batch['episode'][mask] = np.arange(self.next_episode, self.next_episode + n_started)
+        self.next_episode += n_started
+
+    def _get_obs(self):
+        """Function to build the batched observation, as a copy of the internal arrays
+
+        Returns:
+            dict: state matrix, budget and time vectors
+        """
+        return {
+            'state': self.batch['state'].astype(np.int8),
+            'budget': self.budget.copy(),
+            'time': self.current_time.copy(),
+        }
+
+    def _to_action_matrix(self, actions):
+        """Function to convert the actions to a boolean matrix of shape (n_envs, n_nodes)
+
+        Args:
+            actions: a matrix of shape (n_envs, n_nodes), or n_envs lists of chosen nodes
+
+        Returns:
+            np.array: boolean matrix of the chosen nodes
+        """
+        if isinstance(actions, np.ndarray) and actions.ndim == 2:
+            return actions.astype(bool)
+        matrix = np.zeros((self.num_envs, self.social_net.graph.n_nodes), dtype=bool)
+        episodes = np.repeat(np.arange(self.num_envs), [len(action) for action in actions])
+        nodes = np.fromiter((node for action in actions for node in action), dtype=np.int64, count=episodes.shape[0])
+        matrix[episodes, nodes] = True
+        return matrix
+
+    def reset_wait(self, seed : int = None, options : dict = None):
+        """Function to reset all the episodes, numbering them again from 1
+
+        Args:
+            seed (int, optional): numpy seed. Defaults to None.
+            options (dict, optional): not used. Defaults to None.
+
+        Returns:
+            dict: batched observation
+            dict: batched info
+        """
+        if seed is not None:
+            np.random.seed(seed)
+        self.next_episode = 1
+        self._reset_episodes(np.ones(self.num_envs, dtype=bool))
+        return self._get_obs(), {}
+
+    def step_async(self, actions):
+        """Function to store the actions of the next step
+
+        Args:
+            actions: a matrix of shape (n_envs, n_nodes), or n_envs lists of chosen nodes
+        """
+        self._actions = self._to_action_matrix(actions)
+
+    def step_wait(self):
+        """Advances all the episodes given the stored actions. Finished episodes are reset automatically:
+        their final observation is returned in info['final_observation'].
+
+        Returns:
+            dict: batched observation
+            np.array: rewards
+            np.array: terminated flags, set to true if the current time is equal to the time horizon
+            np.array: truncated flags, always false
+            dict: batched info with 'current_time'
+        """
+        actions = self._actions
+        # compute reward
+        action_cost = actions.astype(np.float64) @ self.social_net.graph.cost
+        n_influenced = self.batch['state'].sum(axis=1)
+        reward = self.l * (n_influenced - self.old_n_nodes_influenced) - action_cost
+        self.total_reward += reward
+        # update old_n_nodes_influenced
+        self.old_n_nodes_influenced = n_influenced
+        # run influence:
+        self.social_net.apply_influence_batch(self.batch, actions, self.current_time)
+        # update budget
+        self.budget = self.budget - action_cost
+        # update time
+        self.current_time += 1
+        terminated = self.current_time == self.time_horizon
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        infos = {
+            'current_time': self.current_time.copy(),
+            '_current_time': np.ones(self.num_envs, dtype=bool),
+        }
+        if terminated.any():
+            # save the final observations and restart the finished episodes
+            final_obs = self._get_obs()
+            infos['final_observation'] = np.array([
+                {key: values[i] for key, values in final_obs.items()} if terminated[i] else None
+                for i in range(self.num_envs)
+            ], dtype=object)
+            infos['_final_observation'] = terminated.copy()
+            self._reset_episodes(terminated)
+        return self._get_obs(), reward, terminated, truncated, infos
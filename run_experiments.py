@@ -0,0 +1,279 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+import itertools
+import traceback
+import numpy as np
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from agents import DummyAgent, CELFAgent
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+
+# agents available in the sweeps
+AGENTS = {
+    'dummy': DummyAgent,
+    'celf': CELFAgent
+}
+# columns of the results file, one row per job
+COLUMNS = [
+    'job_id', 'template', 'seed', 'budget', 'diffusion', 'agent', 'status',
+    'n_episodes', 'mean_reward', 'mean_influenced', 'mean_spent', 'time', 'error'
+]
+
+
+def expand_sweep(sweep : dict):
+    """Expand a sweep spec into the list of its jobs: cfg templates x seeds x budgets x diffusion models x agents.
+    The budgets and diffusion models default to the ones of the template.
+
+    Args:
+        sweep (dict): sweep spec, with 'templates', 'seeds', 'agents' and optional 'budgets', 'diffusions', 'n_episodes',
+            'oracle_workers'
+
+    Returns:
+        list: jobs, each one a dict with its settings and a 'job_id' hashing them
+    """
+    jobs = []
+    for template, seed, budget, diffusion, agent in itertools.product(
+        sweep['templates'],
+        sweep['seeds'],
+        sweep.get('budgets', [None]),
+        sweep.get('diffusions', [None]),
+        sweep['agents']
+    ):
+        with open(template, 'r') as fp:
+            settings = json.load(fp)
+        settings['seed'] = seed
+        if budget is not None:
+            settings['budget'] = budget
+        if diffusion is not None:
+            settings['influence_model'] = diffusion
+        job = {
+            'template': template,
+            'agent': agent,
+            'n_episodes': sweep.get('n_episodes', 1),
+            'settings': settings
+        }
+        job['job_id'] = hashlib.sha256(json.dumps(job, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        # processes of the agent oracles, they do not change the results so they are not part of the job id
+        if sweep.get('oracle_workers') is not None:
+            job['oracle_workers'] = sweep['oracle_workers']
+        jobs.append(job)
+    return jobs
+
+
+def run_job(job : dict):
+    """Run the episodes of a job
+
+    Args:
+        job (dict): job returned by expand_sweep()
+
+    Returns:
+        dict: results row
+    """
+    start = time.time()
+    settings = job['settings']
+    np.random.seed(settings['seed'])
+    env = DynamicSocialNetwork(settings)
+    kwargs = {}
+    if job['agent'] == 'celf':
+        # the jobs already run in parallel processes: the oracle runs in the job process unless the sweep sets oracle_workers
+        kwargs['n_workers'] = job.get('oracle_workers', 0)
+    agent = AGENTS[job['agent']](env, settings, **kwargs)
+    rewards, influenced, spent = [], [], []
+    try:
+        for _ in range(job['n_episodes']):
+            state = env.reset()
+            if hasattr(agent, 'reset'):
+                agent.reset()
+            done = False
+            total_reward = 0
+            while not done:
+                action = agent.get_action(state)
+                state, reward, done, _ = env.step(action)
+                total_reward += reward
+            rewards.append(total_reward)
+            influenced.append(env.social_net.get_n_influenced())
+            spent.append(env.initial_budget - env.budget)
+    finally:
+        # the agents with workers, as the CELF++ oracles, stop them
+        if hasattr(agent, 'close'):
+            agent.close()
+        env.close()
+    return {
+        'status': 'done',
+        'mean_reward': float(np.mean(rewards)),
+        'mean_influenced': float(np.mean(influenced)),
+        'mean_spent': float(np.mean(spent)),
+        'time': time.time() - start,
+        'error': ''
+    }
+
+
+def _job_process(job : dict, conn : object):
+    """Process target: run the job and send back its results row
+
+    Args:
+        job (dict): job returned by expand_sweep()
+        conn (object): sending end of the pipe to the runner
+    """
+    try:
+        row = run_job(job)
+    except Exception:
+        row = {'status': 'error', 'error': traceback.format_exc(limit=3).replace('\n', ' | ')}
+    conn.send(row)
+    conn.close()
+
+
+class ResultsFile():
+
+    def __init__(self, file_path : str):
+        """Base function for instantiating the results file of a sweep.
+        Each row is appended with a single write on a file opened in append mode and synced to disk,
+        so a killed sweep leaves at most one truncated last line, which is ignored.
+
+        Args:
+            file_path (str): csv file
+        """
+        self.file_path = file_path
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+            self._append(','.join(COLUMNS) + '\n')
+        else:
+            # terminate the line truncated by a kill, so it is not merged with the next row
+            with open(file_path, 'rb') as fp:
+                fp.seek(-1, os.SEEK_END)
+                if fp.read(1) != b'\n':
+                    self._append('\n')
+
+    def completed(self):
+        """Get method for the jobs already done
+
+        Returns:
+            set: job ids with status done
+        """
+        with open(self.file_path, 'r', newline='') as fp:
+            # a truncated row misses its last columns
+            return {
+                row['job_id'] for row in csv.DictReader(fp)
+                if row.get('status') == 'done' and row.get('error') is not None
+            }
+
+    def append(self, row : dict):
+        """Function to append a results row
+
+        Args:
+            row (dict): values of the columns
+        """
+        line = []
+        for column in COLUMNS:
+            value = str(row.get(column, ''))
+            if any(char in value for char in ',"\n'):
+                value = '"' + value.replace('"', '""') + '"'
+            line.append(value)
+        self._append(','.join(line) + '\n')
+
+    def _append(self, text : str):
+        """Function to write text at the end of the file with one system call
+
+        Args:
+            text (str): text to write
+        """
+        fd = os.open(self.file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, text.encode('utf-8'))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def run_sweep(sweep : dict, n_workers : int = None):
+    """Run the jobs of a sweep not completed yet, n_workers processes at a time, killing the ones
+    running longer than sweep['timeout'] seconds
+
+    Args:
+        sweep (dict): sweep spec, see expand_sweep(), plus 'output' (csv file) and optional 'timeout'
+        n_workers (int, optional): number of concurrent jobs. Defaults to the number of cpus.
+
+    Returns:
+        int: number of jobs run
+    """
+    n_workers = mp.cpu_count() if n_workers is None else n_workers
+    timeout = sweep.get('timeout')
+    results = ResultsFile(sweep['output'])
+    completed = results.completed()
+    jobs = [job for job in expand_sweep(sweep) if job['job_id'] not in completed]
+    print(f"{len(completed)} jobs completed, {len(jobs)} to run")
+    # receiving end of the pipe -> (process, job, start time)
+    running = {}
+    n_run = 0
+    while jobs or running:
+        while jobs and len(running) < n_workers:
+            job = jobs.pop(0)
+            receiver, sender = mp.Pipe(duplex=False)
+            process = mp.Process(target=_job_process, args=(job, sender))
+            process.start()
+            sender.close()
+            running[receiver] = (process, job, time.time())
+        # wake up when a job ends or the first deadline expires
+        deadline = None
+        if timeout is not None:
+            deadline = max(min(start for _, _, start in running.values()) + timeout - time.time(), 0)
+        for receiver in wait(list(running), timeout=deadline):
+            process, job, start = running.pop(receiver)
+            try:
+                row = receiver.recv()
+            except EOFError:
+                row = {'status': 'error', 'error': f"process exited with code {process.exitcode}"}
+            process.join()
+            receiver.close()
+            _write_row(results, job, row)
+            n_run += 1
+        if timeout is not None:
+            for receiver, (process, job, start) in list(running.items()):
+                if time.time() - start > timeout:
+                    process.kill()
+                    process.join()
+                    receiver.close()
+                    del running[receiver]
+                    _write_row(results, job, {'status': 'timeout', 'time': time.time() - start, 'error': ''})
+                    n_run += 1
+    return n_run
+
+
+def _write_row(results : ResultsFile, job : dict, row : dict):
+    """Function to append the results row of a job, with the columns identifying it
+
+    Args:
+        results (ResultsFile): results file
+        job (dict): job returned by expand_sweep()
+        row (dict): results of the job
+    """
+    settings = job['settings']
+    row.update({
+        'job_id': job['job_id'],
+        'template': job['template'],
+        'seed': settings['seed'],
+        'budget': settings['budget'],
+        'diffusion': settings['influence_model']['type'],
+        'agent': job['agent'],
+        'n_episodes': job['n_episodes']
+    })
+    results.append(row)
+    print(f"{row['status']:8} {job['job_id']} {job['template']} seed {row['seed']} budget {row['budget']} {row['diffusion']} {job['agent']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a sweep of experiments, skipping the jobs already in the results file")
+    parser.add_argument('sweep', help="json sweep spec, e.g. ./cfg/sweep_example.json")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.sweep, 'r') as fp:
+        sweep = json.load(fp)
+    run_sweep(sweep, args.workers)
@@ -0,0 +1,24 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import asyncio
+import argparse
+from envs.simulationServer import SimulationServer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the episodes of the given instances on a Unix socket")
+    parser.add_argument('settings', nargs='+', help="json settings files, the instance name is the file name without extension")
+    parser.add_argument('--socket', default="./results/simulation.sock")
+    parser.add_argument('--window', type=float, default=0.002, help="seconds a step request waits for other requests")
+    parser.add_argument('--max-batch', type=int, default=256)
+    args = parser.parse_args()
+
+    instances = {}
+    for file_path in args.settings:
+        with open(file_path, 'r') as fp:
+            instances[os.path.splitext(os.path.basename(file_path))[0]] = json.load(fp)
+    server = SimulationServer(instances, window=args.window, max_batch=args.max_batch)
+    print(f"serving {', '.join(instances)} on {args.socket}")
+    asyncio.run(server.serve(args.socket))
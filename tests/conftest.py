@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import copy
+import pytest
+
+# the tests import the packages of the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INFLUENCE_MODELS = {
+    'ICM': {'type': 'ICM', 'max_influence_prob': 0.1},
+    'LTM': {'type': 'LTM', 'max_influence_power': 0.1},
+    'CTM': {
+        'type': 'CTM',
+        'percentage': [0.1, 0.2, 0.35, 0.35],
+        'a': [5, 4, 3, 2],
+        'b': [1, 2, 3, 4],
+        'decays': [0.8, 0.6, 0.5, 0.1],
+        'lambda': [0.7, 0.5, 0.4, 0.1],
+        'resistance_noises': [0.05, 0.05, 0.05, 0.05]
+    }
+}
+
+
+@pytest.fixture
+def make_settings():
+    """Factory of the settings of a small Barabasi-Albert instance
+
+    Returns:
+        function: (diffusion, n_nodes, seed, engine) -> settings dictionary
+    """
+    def build(diffusion : str = 'ICM', n_nodes : int = 200, seed : int = 0, engine : str = 'vectorized'):
+        influence_model = copy.deepcopy(INFLUENCE_MODELS[diffusion])
+        influence_model['engine'] = engine
+        return {
+            'time_horizon': 5,
+            'budget': 1,
+            'lambda': 0.1,
+            'graph_type': {'name': 'barabasi_albert', 'n_nodes': n_nodes, 'stub': 3},
+            'cost_type': {'cost_name': 'proportional', 'max_price': 1},
+            'influence_model': influence_model,
+            'seed': seed
+        }
+    return build
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from diffusion_models import LTModel
+from diffusion_models.socialNetwork import CSRGraph
+
+
+def _model(make_settings, engine : str):
+    """LTM on the hand-built graph 0 -> 1, 0 -> 2, both edges with influence power 0.5.
+    Node 1 (resistance 0.4) is influenced by 0, node 2 (resistance 0.9) is not: comparing the incoming influence
+    with the resistance of the last successor visited instead of the target gets one of them wrong.
+
+    Args:
+        make_settings (function): settings factory of conftest
+        engine (str): engine of the model
+
+    Returns:
+        LTModel: influence model
+    """
+    graph = CSRGraph(np.array([0, 2, 2, 2]), np.array([1, 2]))
+    graph.influence_power = np.array([0.5, 0.5])
+    graph.resistance = np.array([1.0, 0.4, 0.9])
+    return LTModel(make_settings('LTM', engine=engine), graph)
+
+
+@pytest.mark.parametrize('engine', ['scalar', 'vectorized', 'incremental'])
+def test_threshold_of_the_target(make_settings, engine):
+    """Every engine compares the incoming influence of a node with its own resistance"""
+    model = _model(make_settings, engine)
+    model.apply_influence([0])
+    assert model.state == {0, 1}
+    assert model.graph.status.tolist() == [1, 1, 0]
+    model.apply_influence([])
+    assert model.state == {0, 1}
+
+
+def test_propagate_worlds(make_settings):
+    """propagate() uses the threshold of each node in each world"""
+    model = _model(make_settings, 'vectorized')
+    active = np.array([[True, False, False]] * 2)
+    thresholds = np.array([[1.0, 0.4, 0.9], [1.0, 0.9, 0.4]])
+    assert model.propagate(active, thresholds).tolist() == [[True, True, False], [True, False, True]]
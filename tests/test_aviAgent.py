@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from agents.aviAgent import AVIAgent
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+
+def test_learn_keeps_global_state(make_settings):
+    """learn() simulates in the calling process without moving the numpy random stream of the caller"""
+    settings = make_settings('ICM')
+    np.random.seed(settings['seed'])
+    env = DynamicSocialNetwork(settings)
+    weights = []
+    for caller_seed in [123, 7]:
+        np.random.seed(caller_seed)
+        expected = np.random.rand()
+        np.random.seed(caller_seed)
+        agent = AVIAgent(env, settings, batch_size=32)
+        agent.learn(64)
+        assert np.random.rand() == expected
+        weights.append(agent.weights)
+    # the simulations only depend on the seed of the agent
+    assert np.array_equal(weights[0], weights[1])
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from conftest import INFLUENCE_MODELS
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+
+@pytest.mark.parametrize('diffusion', list(INFLUENCE_MODELS))
+def test_affordable_and_sample(make_settings, diffusion):
+    """The index answers the uninfluenced affordable nodes along the episodes, across resets and restores"""
+    settings = make_settings(diffusion, n_nodes=300)
+    np.random.seed(settings['seed'])
+    env = DynamicSocialNetwork(settings)
+    cost = env.social_net.graph.cost
+    rng = np.random.RandomState(0)
+    for _ in range(3):
+        env.reset()
+        snapshot = None
+        for step in range(settings['time_horizon']):
+            env.step(list(rng.choice(len(cost), 40, replace=False)))
+            if step == 1:
+                snapshot = env.snapshot()
+            state = env.social_net.state
+            budget = np.median(cost)
+            expected = [node for node in np.argsort(cost, kind='stable') if node not in state and cost[node] <= budget]
+            assert sorted(env.candidates.affordable(budget).tolist()) == sorted(expected)
+            for _ in range(20):
+                node = env.candidates.sample(budget, rng=np.random.default_rng(step))
+                assert node not in state and cost[node] <= budget
+        assert len(env.candidates.nodes) < len(cost)
+        env.restore(snapshot)
+        assert set(env.candidates.affordable().tolist()) == set(range(len(cost))) - env.social_net.state
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from agents import CELFAgent
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+
+def test_index_size_and_close(make_settings):
+    """The RIS index is sized for the seeds of an episode, and closing the agent stops its workers"""
+    settings = make_settings('ICM', n_nodes=100)
+    settings['budget'] = 10
+    np.random.seed(settings['seed'])
+    env = DynamicSocialNetwork(settings)
+    with CELFAgent(env, settings, seeds_per_step=2, n_workers=1) as agent:
+        assert agent.oracle.index.k == agent.max_seeds(settings['budget']) > 1
+        assert agent.oracle.index._pool is not None
+        state = env.reset()
+        env.step(agent.get_action(state))
+    assert agent.oracle.index._pool is None
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import tracemalloc
+import numpy as np
+import pytest
+import networkx as nx
+from diffusion_models.edgeListReader import read_edge_list
+
+
+def test_same_graph_as_networkx(tmp_path):
+    """Sparse ids read in many chunks give the graph of nx.read_edgelist"""
+    rng = np.random.RandomState(0)
+    ids = np.unique(rng.randint(0, 10 ** 9, size=300))
+    edges = ids[rng.randint(0, len(ids), size=(2000, 2))]
+    file_path = tmp_path / "edges.txt"
+    file_path.write_text("# comment\n" + "".join(f"{u} {v}\n" for u, v in edges))
+    graph, node_labels, report = read_edge_list(str(file_path), chunk_size=256)
+    g = nx.read_edgelist(str(file_path), create_using=nx.DiGraph, nodetype=int)
+    assert list(node_labels) == list(g.nodes)
+    assert report['n_edges'] == g.number_of_edges()
+    index = {label: i for i, label in enumerate(g.nodes)}
+    for node in g.nodes:
+        targets = graph.indices[graph.indptr[index[node]]:graph.indptr[index[node] + 1]]
+        assert [int(node_labels[t]) for t in targets] == list(g.successors(node))
+
+
+def test_caller_trace(tmp_path):
+    """The trace of the caller keeps running with its peak"""
+    file_path = tmp_path / "edges.txt"
+    file_path.write_text("0 1\n1 2\n")
+    tracemalloc.start()
+    try:
+        block = bytearray(10 ** 7)
+        del block
+        report = read_edge_list(str(file_path), trace_memory=True)[2]
+        assert report['peak_memory'] is not None
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traced_memory()[1] >= 10 ** 7
+    finally:
+        tracemalloc.stop()
+
+
+def test_no_trace_by_default(tmp_path):
+    """The memory is only traced on request"""
+    file_path = tmp_path / "edges.txt"
+    file_path.write_text("0 1\n1 2\n")
+    report = read_edge_list(str(file_path))[2]
+    assert report['peak_memory'] is None
+    assert not tracemalloc.is_tracing()
+    assert read_edge_list(str(file_path), trace_memory=True)[2]['peak_memory'] > 0
+    assert not tracemalloc.is_tracing()
+
+
+@pytest.mark.parametrize('text, token', [
+    ("0 1\n2\n", "'2'"),
+    ("0 1 2\n3 4\n", "'0 1 2'"),
+    ("0 1\n2 x\n", "'x'"),
+    ("0 1.5\n", "'1.5'")
+])
+def test_malformed_line(tmp_path, text, token):
+    """A line without two integer node ids raises a ValueError naming it"""
+    file_path = tmp_path / "edges.txt"
+    file_path.write_text(text)
+    with pytest.raises(ValueError, match=token):
+        read_edge_list(str(file_path))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from statistics import NormalDist
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+# episodes run by each engine
+N_RUNS = 2000
+# false alarm probability of each test
+ALPHA = 1e-3
+
+
+def activations(settings : dict, seeds : list, n_runs : int):
+    """Influenced nodes at the end of n_runs seeded episodes
+
+    Args:
+        settings (dict): dictionary with settings parameters
+        seeds (list): seed nodes chosen at the first step
+        n_runs (int): number of episodes
+
+    Returns:
+        np.array: probabilities of the edges of the instance
+        np.array: boolean matrix of shape (n_runs, n_nodes), True for the influenced nodes
+    """
+    np.random.seed(settings['seed'])
+    env = DynamicSocialNetwork(settings)
+    influenced = np.zeros((n_runs, env.social_net.graph.n_nodes), dtype=bool)
+    for run in range(n_runs):
+        np.random.seed(1000 + run)
+        env.reset()
+        env.step(seeds)
+        for _ in range(settings['time_horizon'] - 1):
+            env.step([])
+        influenced[run, env.social_net.active_nodes()] = True
+    return np.asarray(env.social_net.graph.probability_to_influence), influenced
+
+
+def chi_square_quantile(q : float, degrees : int):
+    """Quantile of the chi-square distribution, Wilson-Hilferty approximation
+
+    Args:
+        q (float): probability
+        degrees (int): degrees of freedom
+
+    Returns:
+        float: quantile
+    """
+    z = NormalDist().inv_cdf(q)
+    return degrees * (1 - 2 / (9 * degrees) + z * np.sqrt(2 / (9 * degrees))) ** 3
+
+
+@pytest.fixture(scope='module')
+def runs():
+    results = {}
+    for engine in ['scalar', 'vectorized']:
+        influence_model = {'type': 'ICM', 'max_influence_prob': 0.5, 'engine': engine}
+        settings = {
+            'time_horizon': 5,
+            'budget': 1,
+            'lambda': 0.1,
+            'graph_type': {'name': 'barabasi_albert', 'n_nodes': 60, 'stub': 2},
+            'cost_type': {'cost_name': 'proportional', 'max_price': 1},
+            'influence_model': influence_model,
+            'seed': 0
+        }
+        results[engine] = activations(settings, [0, 1], N_RUNS)
+    return results
+
+
+def test_same_instance(runs):
+    assert np.array_equal(runs['scalar'][0], runs['vectorized'][0])
+
+
+def test_node_activation_frequencies(runs):
+    scalar, vectorized = runs['scalar'][1], runs['vectorized'][1]
+    p_scalar, p_vectorized = scalar.mean(axis=0), vectorized.mean(axis=0)
+    # the diffusion reaches beyond the seeds
+    assert (p_scalar > 0.1).sum() > 10
+    # two-proportion z test on each node, Bonferroni correction over the nodes
+    pooled = (p_scalar + p_vectorized) / 2
+    deviation = np.sqrt(2 * pooled * (1 - pooled) / N_RUNS)
+    z = NormalDist().inv_cdf(1 - ALPHA / (2 * scalar.shape[1]))
+    tested = deviation > 0
+    assert np.all(np.abs(p_scalar - p_vectorized)[tested] <= z * deviation[tested])
+    # a node never influenced by one engine is never influenced by the other
+    assert np.array_equal(p_scalar == 0, p_vectorized == 0)
+
+
+def test_spread_distribution(runs):
+    spreads = [values.sum(axis=1) for _, values in runs.values()]
+    # bins of the spread with enough expected counts for the chi-square homogeneity test
+    edges = np.unique(np.quantile(np.concatenate(spreads), np.linspace(0, 1, 11)))
+    counts = np.array([np.histogram(spread, bins=edges)[0] for spread in spreads])
+    expected = counts.sum(axis=0) * counts.sum(axis=1)[:, None] / counts.sum()
+    statistic = ((counts - expected) ** 2 / expected).sum()
+    degrees = counts.shape[1] - 1
+    assert degrees >= 3
+    assert statistic <= chi_square_quantile(1 - ALPHA, degrees)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+ACTIONS = [[0, 7], [], [40], [], [90, 91]]
+
+
+def _env(make_settings, diffusion : str, engine : str, converge : bool):
+    """Environment with the random streams, so that every engine draws the same values
+
+    Args:
+        make_settings (function): settings factory of conftest
+        diffusion (str): 'ICM' or 'LTM'
+        engine (str): engine of the model
+        converge (bool): converge setting of the incremental engine
+
+    Returns:
+        DynamicSocialNetwork: environment after reset
+    """
+    settings = make_settings(diffusion, n_nodes=300, engine=engine)
+    settings['time_horizon'] = len(ACTIONS)
+    settings['budget'] = 100
+    settings['random_streams'] = True
+    if engine == 'incremental':
+        settings['influence_model']['converge'] = converge
+    if diffusion == 'ICM':
+        settings['influence_model']['max_influence_prob'] = 0.3
+    else:
+        settings['influence_model']['max_influence_power'] = 0.3
+    np.random.seed(settings['seed'])
+    env = DynamicSocialNetwork(settings)
+    env.reset()
+    return env
+
+
+def _converge(social_net : object):
+    """Function to repeat the vectorized step until no node can be influenced, as the incremental engine does with converge
+
+    Args:
+        social_net (object): ICModel or LTModel with the vectorized engine
+    """
+    while True:
+        n_influenced = social_net.get_n_influenced()
+        social_net.apply_influence_vectorized([])
+        frontier = getattr(social_net, 'frontier', None)
+        if social_net.get_n_influenced() == n_influenced and (social_net.influence_type == 'LTM' or len(frontier) == 0):
+            return
+
+
+@pytest.mark.parametrize('diffusion', ['ICM', 'LTM'])
+@pytest.mark.parametrize('converge', [False, True])
+@pytest.mark.parametrize('mutate', [False, True])
+def test_incremental_matches_vectorized(make_settings, diffusion, converge, mutate):
+    """The incremental engine activates the nodes of the vectorized one, run until convergence with converge,
+    also when a mutation changes the incoming influence of the uninfluenced nodes between two steps"""
+    vectorized = _env(make_settings, diffusion, 'vectorized', converge)
+    incremental = _env(make_settings, diffusion, 'incremental', converge)
+    for step, action in enumerate(ACTIONS):
+        if mutate and step == 2:
+            active = np.sort(vectorized.social_net.active_nodes())
+            inactive = np.setdiff1d(np.arange(vectorized.social_net.graph.n_nodes), active)
+            graph = vectorized.social_net.graph
+            source = int(active[0])
+            removed = [[source, int(graph.successors(source)[0])]]
+            # edges strong enough to activate their target, from influenced nodes whose influence is accumulated
+            added = [[int(active[i]), int(inactive[i])] for i in range(3)]
+            for env in [vectorized, incremental]:
+                env.mutate(add_edges=np.array(added), edge_values=np.ones(len(added)), remove_edges=np.array(removed))
+        vectorized.step(action)
+        if converge:
+            _converge(vectorized.social_net)
+        incremental.step(action)
+        assert incremental.social_net.state == vectorized.social_net.state
+    assert vectorized.social_net.get_n_influenced() > len(sum(ACTIONS, []))
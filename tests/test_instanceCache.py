@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import os
+import numpy as np
+from diffusion_models import load_instance
+from diffusion_models.instanceCache import instance_key
+
+
+def test_global_random_state(make_settings, tmp_path):
+    """Compiling and loading an instance do not move the numpy random stream of the caller"""
+    settings = make_settings('ICM')
+    np.random.seed(123)
+    expected = np.random.random(5)
+    for _ in range(2):
+        np.random.seed(123)
+        load_instance(settings, str(tmp_path))
+        assert np.array_equal(np.random.random(5), expected)
+
+
+def test_real_graph_key(make_settings, tmp_path):
+    """An edited edge list is compiled again instead of serving the stale instance"""
+    edge_list = tmp_path / "edges.txt"
+    edge_list.write_text("0 1\n1 2\n")
+    settings = make_settings('ICM')
+    settings['graph_type'] = {'name': 'real_graph', 'file_path': str(edge_list)}
+    key = instance_key(settings)
+    graph, _ = load_instance(settings, str(tmp_path / "cache"))
+    assert graph.n_edges == 2
+    edge_list.write_text("0 1\n1 2\n2 3\n")
+    os.utime(edge_list, ns=(0, 10 ** 9))
+    assert instance_key(settings) != key
+    graph, _ = load_instance(settings, str(tmp_path / "cache"))
+    assert graph.n_edges == 3
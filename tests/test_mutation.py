@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+
+@pytest.mark.parametrize('diffusion', ['ICM', 'LTM', 'CTM'])
+def test_remove_edges_only(make_settings, diffusion):
+    np.random.seed(0)
+    env = DynamicSocialNetwork(make_settings(diffusion))
+    graph = env.social_net.graph
+    source = int(np.flatnonzero(graph.out_degree() > 0)[0])
+    target = int(graph.successors(source)[0])
+    n_edges = graph.n_edges
+    report = env.mutate(remove_edges=[[source, target]])
+    assert report['removed_edges'] == 1
+    assert env.social_net.graph.n_edges == n_edges - 1
+    assert target not in env.social_net.graph.successors(source)
+    env.reset()
+    env.step([source])
+
+
+@pytest.mark.parametrize('diffusion', ['ICM', 'LTM', 'CTM'])
+def test_remove_nodes_only(make_settings, diffusion):
+    np.random.seed(0)
+    env = DynamicSocialNetwork(make_settings(diffusion))
+    report = env.mutate(remove_nodes=[7])
+    assert report['removed_nodes'] == 1
+    graph = env.social_net.graph
+    assert len(graph.successors(7)) == 0
+    assert 7 not in graph.indices
+    assert np.isinf(graph.cost[7])
+    env.reset()
+    env.step([0])
+
+
+@pytest.mark.parametrize('diffusion', ['ICM', 'LTM'])
+def test_replay_deletion_only_step(make_settings, diffusion, tmp_path):
+    np.random.seed(0)
+    graph = DynamicSocialNetwork(make_settings(diffusion)).social_net.graph
+    source = int(np.flatnonzero(graph.out_degree() > 0)[0])
+    target = int(graph.successors(source)[0])
+    events = tmp_path / 'events.txt'
+    events.write_text(f"1 - {source} {target}\n")
+    settings = make_settings(diffusion)
+    settings['edge_events'] = str(events)
+    np.random.seed(0)
+    env = DynamicSocialNetwork(settings)
+    n_edges = env.social_net.graph.n_edges
+    env.reset()
+    env.step([0])
+    env.step([1])
+    assert env.social_net.graph.n_edges == n_edges - 1
+    assert target not in env.social_net.graph.successors(source)
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from conftest import INFLUENCE_MODELS
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+
+@pytest.mark.parametrize('diffusion', list(INFLUENCE_MODELS))
+@pytest.mark.parametrize('observation', ['set', 'numpy', 'packed'])
+def test_action_mask_after_step(make_settings, diffusion, observation):
+    """The action mask excludes the influenced nodes and the unaffordable ones in every observation mode"""
+    settings = make_settings(diffusion)
+    settings['observation'] = observation
+    settings['budget'] = 1000
+    np.random.seed(settings['seed'])
+    env = DynamicSocialNetwork(settings)
+    env.reset()
+    for _ in range(2):
+        env.step([0, 1, 2])
+        influenced = np.zeros(env.social_net.graph.n_nodes, dtype=bool)
+        influenced[env.social_net.active_nodes()] = True
+        assert influenced[[0, 1, 2]].all()
+        expected = ~influenced & (env.social_net.graph.cost <= env.budget)
+        assert expected.any()
+        assert np.array_equal(env.action_mask(), expected)
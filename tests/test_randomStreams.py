@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from conftest import INFLUENCE_MODELS
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+from envs.vectorDynamicSocialNetwork import VectorDynamicSocialNetwork
+
+# actions of each step of three episodes
+EPISODES = [
+    [[0, 7], [], [40], [], [90, 91]],
+    [[3], [12, 13], [], [60], []],
+    [[], [1], [2], [3], [4]]
+]
+
+
+def _settings(make_settings, diffusion : str, engine : str):
+    """Settings with the random streams and edges strong enough to spread over a few steps
+
+    Args:
+        make_settings (function): settings factory of conftest
+        diffusion (str): 'ICM', 'LTM' or 'CTM'
+        engine (str): engine of the model
+
+    Returns:
+        dict: settings
+    """
+    settings = make_settings(diffusion, n_nodes=300, engine=engine)
+    settings['time_horizon'] = len(EPISODES[0])
+    settings['budget'] = 100
+    settings['random_streams'] = True
+    if diffusion == 'ICM':
+        settings['influence_model']['max_influence_prob'] = 0.3
+    elif diffusion == 'LTM':
+        settings['influence_model']['max_influence_power'] = 0.3
+    return settings
+
+
+def _trajectories(settings : dict):
+    """Influenced nodes and reward after each step of the episodes, run one after the other
+
+    Args:
+        settings (dict): settings
+
+    Returns:
+        list: (influenced nodes, reward) of each step of each episode
+    """
+    # the global state must not matter with the random streams
+    np.random.seed(settings['seed'] + 1000)
+    env = DynamicSocialNetwork(settings)
+    trajectories = []
+    for actions in EPISODES:
+        env.reset()
+        trajectory = []
+        for action in actions:
+            _, reward, _, _ = env.step(action)
+            trajectory.append((sorted(env.social_net.state), round(reward, 9)))
+        trajectories.append(trajectory)
+    return trajectories
+
+
+@pytest.mark.parametrize('diffusion', list(INFLUENCE_MODELS))
+@pytest.mark.parametrize('engine', ['scalar', 'incremental'])
+def test_engines_same_trajectories(make_settings, diffusion, engine):
+    """The scalar and incremental engines run the trajectories of the vectorized one. The CTM scalar engine updates
+    the status within the step, which can change the influence of a seed reached in the same step (see the README):
+    it does not happen in these episodes."""
+    expected = _trajectories(_settings(make_settings, diffusion, 'vectorized'))
+    assert _trajectories(_settings(make_settings, diffusion, engine)) == expected
+
+
+@pytest.mark.parametrize('diffusion', list(INFLUENCE_MODELS))
+def test_batch_same_trajectories(make_settings, diffusion):
+    """The rows of apply_influence_batch, numbered as the episodes, run the trajectories of the per-episode engine"""
+    settings = _settings(make_settings, diffusion, 'vectorized')
+    expected = _trajectories(settings)
+    np.random.seed(settings['seed'] + 2000)
+    venv = VectorDynamicSocialNetwork(settings, len(EPISODES))
+    venv.reset()
+    for step in range(len(EPISODES[0])):
+        obs, reward, terminated, _, info = venv.step([actions[step] for actions in EPISODES])
+        for row in range(len(EPISODES)):
+            state = info['final_observation'][row]['state'] if terminated[row] else obs['state'][row]
+            assert (np.flatnonzero(state).tolist(), round(reward[row], 9)) == expected[row][step]
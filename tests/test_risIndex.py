@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from diffusion_models import RISIndex
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+
+@pytest.mark.parametrize('diffusion', ['ICM', 'LTM'])
+def test_mark_covered_counts(make_settings, diffusion):
+    """The uncovered set counts updated along the steps are the ones recounted from the uncovered sets"""
+    settings = make_settings(diffusion)
+    np.random.seed(settings['seed'])
+    env = DynamicSocialNetwork(settings)
+    index = RISIndex(env.social_net, k=3, n_workers=0, max_sets=5000)
+    rng = np.random.RandomState(0)
+    for _ in range(4):
+        index.mark_covered(rng.choice(env.social_net.graph.n_nodes, 5, replace=False))
+        uncovered = np.flatnonzero(~index.covered)
+        lengths = np.diff(index.set_indptr)[uncovered]
+        starts = index.set_indptr[uncovered]
+        nodes = index.set_nodes[np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())]
+        expected = np.bincount(nodes, minlength=index.n_nodes)
+        assert np.array_equal(index.uncovered_count, expected)
+    index.reset()
+    assert np.array_equal(index.uncovered_count, np.diff(index.node_indptr))
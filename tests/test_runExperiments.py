@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+import json
+from run_experiments import expand_sweep, run_job
+
+
+def test_celf_job(make_settings, tmp_path):
+    """The oracle of a CELF++ job runs in the job process, and its workers do not change the job id"""
+    template = tmp_path / "settings.json"
+    template.write_text(json.dumps(make_settings('ICM', n_nodes=100)))
+    sweep = {'templates': [str(template)], 'seeds': [0], 'agents': ['celf']}
+    job = expand_sweep(sweep)[0]
+    assert 'oracle_workers' not in job
+    assert expand_sweep(dict(sweep, oracle_workers=2))[0]['job_id'] == job['job_id']
+    row = run_job(job)
+    assert row['status'] == 'done'
+    assert row['mean_influenced'] >= 1
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import numpy as np
+import pytest
+from envs.simulationServer import SimulationServer
+
+
+@pytest.mark.parametrize('operation', ['close', 'reset', 'restore'])
+def test_queued_step_dropped(make_settings, operation):
+    settings = make_settings('ICM')
+
+    async def run():
+        server = SimulationServer({'instance': settings}, window=0.05)
+        session = await server.open('instance')
+        snapshot = await server.snapshot(session)
+        step = asyncio.create_task(server.step(session, [3, 41, 75]))
+        await asyncio.sleep(0)
+        if operation == 'close':
+            await server.close(session)
+            session = await server.open('instance')
+        elif operation == 'reset':
+            await server.reset(session)
+        else:
+            await server.restore(session, snapshot)
+        with pytest.raises(ValueError):
+            await step
+        await asyncio.sleep(0.1)
+        host = server.hosts['instance']
+        return host.observation(server.sessions[session]), host.n_steps
+
+    observation, n_steps = asyncio.run(run())
+    # the dropped step did not touch the row
+    assert observation['state'] == []
+    assert observation['time'] == 0
+    assert n_steps == 0
+
+
+def test_batched_steps_match_sessions(make_settings):
+    settings = make_settings('ICM')
+    settings['random_streams'] = True
+
+    async def run(n_sessions):
+        server = SimulationServer({'instance': settings})
+        sessions = [await server.open('instance') for _ in range(n_sessions)]
+        results = await asyncio.gather(*[server.step(session, [i]) for i, session in enumerate(sessions)])
+        return [observation['state'] for observation, _, _, _ in results], server.hosts['instance'].n_batches
+
+    states, n_batches = asyncio.run(run(4))
+    assert n_batches == 1
+    # a session alone draws the same diffusion as in the batch, with the same episode number
+    for i in range(4):
+        alone, _ = asyncio.run(run(i + 1))
+        assert alone[i] == states[i]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from conftest import INFLUENCE_MODELS
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+# (engine, converge)
+ENGINES = [('scalar', False), ('vectorized', False), ('incremental', False), ('incremental', True)]
+
+
+def _run(env : DynamicSocialNetwork, actions : list):
+    """Steps of the environment with the given actions
+
+    Args:
+        env (DynamicSocialNetwork): environment
+        actions (list): action of each step
+
+    Returns:
+        list: influenced nodes, reward, budget and time after each step
+    """
+    trajectory = []
+    for action in actions:
+        state, reward, _, info = env.step(action)
+        trajectory.append((sorted(state[0]), reward, env.budget, info['current_time']))
+    return trajectory
+
+
+@pytest.mark.parametrize('diffusion', list(INFLUENCE_MODELS))
+@pytest.mark.parametrize('engine, converge', ENGINES)
+def test_restore_replays_the_trajectory(make_settings, diffusion, engine, converge):
+    """Restoring a snapshot taken mid-episode replays the same steps, many times"""
+    settings = make_settings(diffusion, engine=engine)
+    if diffusion == 'CTM' and converge:
+        pytest.skip("converge is not defined for CTM")
+    settings['influence_model']['converge'] = converge
+    # strong edges, so that the nodes influenced before the snapshot keep spreading after it
+    if diffusion == 'ICM':
+        settings['influence_model']['max_influence_prob'] = 0.5
+    elif diffusion == 'LTM':
+        settings['influence_model']['max_influence_power'] = 0.5
+    settings['time_horizon'] = 6
+    settings['budget'] = 100
+    np.random.seed(settings['seed'])
+    env = DynamicSocialNetwork(settings)
+    env.reset()
+    _run(env, [[0, 5], [10]])
+    snapshot = env.snapshot()
+    actions = [[20, 21], [], [30]]
+    expected = _run(env, actions)
+    for _ in range(2):
+        env.restore(snapshot)
+        assert _run(env, actions) == expected
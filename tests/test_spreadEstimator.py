@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from conftest import INFLUENCE_MODELS
+from diffusion_models import SpreadEstimator
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+
+
+@pytest.mark.parametrize('diffusion', list(INFLUENCE_MODELS))
+def test_in_process_estimate_keeps_global_state(make_settings, diffusion):
+    """An estimate run in the calling process does not move the numpy random stream of the caller"""
+    settings = make_settings(diffusion)
+    np.random.seed(settings['seed'])
+    env = DynamicSocialNetwork(settings)
+    env.reset()
+    estimates = []
+    for caller_seed in [123, 7]:
+        np.random.seed(caller_seed)
+        expected = np.random.rand()
+        np.random.seed(caller_seed)
+        with SpreadEstimator(env.social_net, n_workers=0) as estimator:
+            estimates.append(estimator.estimate([5], 2, n_simulations=50))
+        assert np.random.rand() == expected
+    # the estimate does not depend on the state of the caller either
+    assert estimates[0] == estimates[1]
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import numpy as np
+import pytest
+from diffusion_models import LiveEdgeWorlds, SpreadEstimator
+from envs.dynamicSocialNetwork import DynamicSocialNetwork
+from envs.vectorDynamicSocialNetwork import VectorDynamicSocialNetwork
+from envs.simulationServer import SimulationServer
+
+
+def world_spread(env : DynamicSocialNetwork, action : list, n_steps : int):
+    """Number of influenced nodes after seeding action and running n_steps steps in the world set on the model"""
+    env.reset()
+    env.step(action)
+    for _ in range(n_steps - 1):
+        env.step([])
+    return env.social_net.get_n_influenced()
+
+
+@pytest.mark.parametrize('diffusion', ['ICM', 'LTM'])
+def test_new_batch_has_world(make_settings, diffusion):
+    np.random.seed(0)
+    social_net = DynamicSocialNetwork(make_settings(diffusion)).social_net
+    assert 'world' not in social_net.new_batch(2)
+    social_net.set_world(LiveEdgeWorlds(social_net, n_worlds=8, seed=1), 5)
+    assert social_net.new_batch(3)['world'].tolist() == [5, 5, 5]
+    assert social_net.current_batch()['world'].tolist() == [5]
+
+
+@pytest.mark.parametrize('diffusion', ['ICM', 'LTM'])
+@pytest.mark.parametrize('n_workers', [0, 1])
+def test_estimate_in_world(make_settings, diffusion, n_workers):
+    np.random.seed(0)
+    env = DynamicSocialNetwork(make_settings(diffusion))
+    social_net = env.social_net
+    social_net.set_world(LiveEdgeWorlds(social_net, n_worlds=8, seed=1), 3)
+    expected = world_spread(env, [0, 1], 3)
+    env.reset()
+    with SpreadEstimator(social_net, n_workers=n_workers, seed=0, chunk_size=8) as estimator:
+        result = estimator.estimate([0, 1], 3, n_simulations=16)
+    # every simulation runs in the same world
+    assert result['mean'] == expected
+    assert result['variance'] == 0
+
+
+@pytest.mark.parametrize('diffusion', ['ICM', 'LTM'])
+def test_vector_env_keeps_world(make_settings, diffusion):
+    settings = make_settings(diffusion)
+    np.random.seed(0)
+    env = DynamicSocialNetwork(settings)
+    env.social_net.set_world(LiveEdgeWorlds(env.social_net, n_worlds=8, seed=1), 2)
+    expected = world_spread(env, [0], settings['time_horizon'])
+    venv = VectorDynamicSocialNetwork(settings, n_envs=2, social_net=env.social_net)
+    venv.reset()
+    for episode in range(2):
+        for t in range(settings['time_horizon']):
+            _, _, terminated, _, infos = venv.step([[0] if t == 0 else [], [0] if t == 0 else []])
+        states = [observation['state'].sum() for observation in infos['final_observation']]
+        assert states == [expected, expected]
+        assert venv.batch['world'].tolist() == [2, 2]
+
+
+def test_server_in_world(make_settings):
+    settings = make_settings('ICM')
+
+    async def run():
+        server = SimulationServer({'instance': settings})
+        session = await server.open('instance')
+        host = server.hosts['instance']
+        host.social_net.set_world(LiveEdgeWorlds(host.social_net, n_worlds=8, seed=1), 4)
+        spreads = []
+        for _ in range(2):
+            await server.reset(session)
+            observation, _, _, _ = await server.step(session, [0])
+            for _ in range(settings['time_horizon'] - 1):
+                observation, _, _, _ = await server.step(session, [])
+            spreads.append(len(observation['state']))
+        return spreads, host.social_net
+
+    spreads, social_net = asyncio.run(run())
+    np.random.seed(0)
+    env = DynamicSocialNetwork(settings)
+    env.social_net.set_world(LiveEdgeWorlds(env.social_net, n_worlds=8, seed=1), 4)
+    expected = world_spread(env, [0], settings['time_horizon'])
+    assert spreads == [expected, expected]